@@ -0,0 +1,204 @@
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Avaliacao, AgregadoDepartamento, AgregadoTema, AgregadoSubtema, GeracaoRelatorio
+from relatorio import agregar_temas, agregar_subtemas, parciais_compactas, _parciais_sql_por_grupo
+
+# Manutenção das tabelas de agregados usadas pelo relatório.
+# As atualizações são feitas na mesma transação do cadastro das avaliações.
+
+
+# Expressões que mantêm a menor primeira ocorrência (avaliação, resposta) no upsert
+def _menor_ordem(tabela, novo):
+    novo_e_menor = or_(
+        novo.primeira_avaliacao_id < tabela.c.primeira_avaliacao_id,
+        and_(novo.primeira_avaliacao_id == tabela.c.primeira_avaliacao_id,
+             novo.primeira_resposta_id < tabela.c.primeira_resposta_id)
+    )
+    return {
+        'primeira_avaliacao_id': case((novo_e_menor, novo.primeira_avaliacao_id), else_=tabela.c.primeira_avaliacao_id),
+        'primeira_resposta_id': case((novo_e_menor, novo.primeira_resposta_id), else_=tabela.c.primeira_resposta_id),
+    }
+
+
+# Executa um upsert somando os contadores nas linhas já existentes
+def _somar(modelo, chaves, contadores, linhas, com_ordem=True):
+    if not linhas:
+        return
+    tabela = modelo.__table__
+    instrucao = sqlite_insert(tabela)
+    valores = {coluna: tabela.c[coluna] + instrucao.excluded[coluna] for coluna in contadores}
+    if com_ordem:
+        valores.update(_menor_ordem(tabela, instrucao.excluded))
+    db.session.execute(instrucao.on_conflict_do_update(index_elements=chaves, set_=valores), linhas)
+
+
+# Atualiza os agregados com um lote de avaliações recém-inseridas.
+# avaliacoes: [{'id', 'empresa', 'departamento'}]
+# respostas_nivel1: [{'id', 'avaliacao_id', 'tema_id', 'selecionado'}]
+# respostas_nivel2: [{'id', 'avaliacao_id', 'subtema_id', 'nivel_desconforto'}]
+def atualizar_agregados(avaliacoes, respostas_nivel1, respostas_nivel2):
+    departamentos = {}
+    origem = {}
+    for avaliacao in avaliacoes:
+        chave = (avaliacao['empresa'], avaliacao['departamento'])
+        origem[avaliacao['id']] = chave
+        departamentos[chave] = departamentos.get(chave, 0) + 1
+
+    temas = {}
+    for resposta in respostas_nivel1:
+        if not resposta['selecionado']:
+            continue
+        chave = origem[resposta['avaliacao_id']] + (resposta['tema_id'],)
+        ordem = (resposta['avaliacao_id'], resposta['id'])
+        atual = temas.setdefault(chave, {'contagem': 0, 'ordem': ordem})
+        atual['contagem'] += 1
+        atual['ordem'] = min(atual['ordem'], ordem)
+
+    subtemas = {}
+    for resposta in respostas_nivel2:
+        chave = origem[resposta['avaliacao_id']] + (resposta['subtema_id'],)
+        ordem = (resposta['avaliacao_id'], resposta['id'])
+        atual = subtemas.setdefault(chave, {'total_pontos': 0, 'contagem': 0, 'ordem': ordem})
+        atual['total_pontos'] += resposta['nivel_desconforto']
+        atual['contagem'] += 1
+        atual['ordem'] = min(atual['ordem'], ordem)
+
+    _somar(AgregadoDepartamento, ['empresa', 'departamento'], ['total_avaliacoes'], [
+        {'empresa': empresa, 'departamento': departamento, 'total_avaliacoes': total}
+        for (empresa, departamento), total in departamentos.items()
+    ], com_ordem=False)
+    _somar(AgregadoTema, ['empresa', 'departamento', 'tema_id'], ['contagem'], [
+        {'empresa': empresa, 'departamento': departamento, 'tema_id': tema_id, 'contagem': dados['contagem'],
+         'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+        for (empresa, departamento, tema_id), dados in temas.items()
+    ])
+    _somar(AgregadoSubtema, ['empresa', 'departamento', 'subtema_id'], ['total_pontos', 'contagem'], [
+        {'empresa': empresa, 'departamento': departamento, 'subtema_id': subtema_id,
+         'total_pontos': dados['total_pontos'], 'contagem': dados['contagem'],
+         'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+        for (empresa, departamento, subtema_id), dados in subtemas.items()
+    ])
+    # Nova geração dos departamentos alterados: invalida o cache do relatório
+    _somar(GeracaoRelatorio, ['empresa', 'departamento'], ['geracao'], [
+        {'empresa': empresa, 'departamento': departamento, 'geracao': 1}
+        for empresa, departamento in departamentos
+    ], com_ordem=False)
+
+
+# Desconta dos agregados de um departamento avaliações removidas (sem fazer commit), sem reler as respostas.
+# temas: {tema_id: contagem}; subtemas: {subtema_id: (total_pontos, contagem)}. A primeira ocorrência de cada
+# linha não é corrigida (pode apontar para uma avaliação removida): recalcular_agregados_departamentos a acerta
+def descontar_agregados(empresa, departamento, total, temas, subtemas):
+    tabela = AgregadoDepartamento.__table__
+    db.session.execute(
+        update(tabela).where(tabela.c.empresa == empresa, tabela.c.departamento == departamento)
+        .values(total_avaliacoes=tabela.c.total_avaliacoes - total)
+    )
+    if temas:
+        tabela = AgregadoTema.__table__
+        db.session.execute(
+            update(tabela).where(tabela.c.empresa == empresa, tabela.c.departamento == departamento,
+                                 tabela.c.tema_id == bindparam('tema'))
+            .values(contagem=tabela.c.contagem - bindparam('menos_contagem')),
+            [{'tema': tema_id, 'menos_contagem': contagem} for tema_id, contagem in temas.items()]
+        )
+    if subtemas:
+        tabela = AgregadoSubtema.__table__
+        db.session.execute(
+            update(tabela).where(tabela.c.empresa == empresa, tabela.c.departamento == departamento,
+                                 tabela.c.subtema_id == bindparam('subtema'))
+            .values(total_pontos=tabela.c.total_pontos - bindparam('menos_pontos'),
+                    contagem=tabela.c.contagem - bindparam('menos_contagem')),
+            [{'subtema': subtema_id, 'menos_pontos': pontos, 'menos_contagem': contagem}
+             for subtema_id, (pontos, contagem) in subtemas.items()]
+        )
+    _somar(GeracaoRelatorio, ['empresa', 'departamento'], ['geracao'], [
+        {'empresa': empresa, 'departamento': departamento, 'geracao': 1}
+    ], com_ordem=False)
+
+
+# Reconstrói todos os agregados a partir das tabelas de respostas e das avaliações compactas (sem fazer commit)
+def reconstruir_agregados():
+    for modelo in (AgregadoDepartamento, AgregadoTema, AgregadoSubtema):
+        db.session.execute(delete(modelo))
+
+    dimensoes = (Avaliacao.empresa, Avaliacao.departamento)
+
+    linhas = db.session.execute(
+        select(*dimensoes, func.count(Avaliacao.id)).group_by(*dimensoes)
+    ).all()
+    if linhas:
+        db.session.execute(insert(AgregadoDepartamento), [
+            {'empresa': empresa, 'departamento': departamento, 'total_avaliacoes': total}
+            for empresa, departamento, total in linhas
+        ])
+
+    # Nova geração para todos os departamentos (inclusive os que não têm mais avaliações)
+    db.session.execute(update(GeracaoRelatorio).values(geracao=GeracaoRelatorio.geracao + 1))
+    _somar(GeracaoRelatorio, ['empresa', 'departamento'], ['geracao'], [
+        {'empresa': empresa, 'departamento': departamento, 'geracao': 1} for empresa, departamento, _ in linhas
+    ], com_ordem=False)
+
+    linhas = agregar_temas(agrupar_por=dimensoes)
+    if linhas:
+        db.session.execute(insert(AgregadoTema), [
+            {'empresa': linha.empresa, 'departamento': linha.departamento, 'tema_id': linha.chave,
+             'contagem': linha.contagem, 'primeira_avaliacao_id': linha.primeira_avaliacao,
+             'primeira_resposta_id': linha.primeira_resposta}
+            for linha in linhas
+        ])
+
+    linhas = agregar_subtemas(agrupar_por=dimensoes)
+    if linhas:
+        db.session.execute(insert(AgregadoSubtema), [
+            {'empresa': linha.empresa, 'departamento': linha.departamento, 'subtema_id': linha.chave,
+             'total_pontos': linha.total_pontos, 'contagem': linha.contagem,
+             'primeira_avaliacao_id': linha.primeira_avaliacao, 'primeira_resposta_id': linha.primeira_resposta}
+            for linha in linhas
+        ])
+
+    # Avaliações compactas somadas por cima das linhas já inseridas
+    for (empresa, departamento), parciais in parciais_compactas(agrupar_por=dimensoes).items():
+        _somar(AgregadoTema, ['empresa', 'departamento', 'tema_id'], ['contagem'], [
+            {'empresa': empresa, 'departamento': departamento, 'tema_id': tema_id, 'contagem': dados['contagem'],
+             'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+            for tema_id, dados in parciais['temas'].items()
+        ])
+        _somar(AgregadoSubtema, ['empresa', 'departamento', 'subtema_id'], ['total_pontos', 'contagem'], [
+            {'empresa': empresa, 'departamento': departamento, 'subtema_id': subtema_id,
+             'total_pontos': dados['total_pontos'], 'contagem': dados['contagem'],
+             'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+            for subtema_id, dados in parciais['subtemas'].items()
+        ])
+
+
+# Recalcula os agregados de alguns departamentos a partir das avaliações restantes (sem fazer commit).
+# departamentos: [(empresa, departamento)]
+def recalcular_agregados_departamentos(departamentos):
+    dimensoes = (Avaliacao.empresa, Avaliacao.departamento)
+    for empresa, departamento in departamentos:
+        for modelo in (AgregadoDepartamento, AgregadoTema, AgregadoSubtema):
+            db.session.execute(delete(modelo).where(modelo.empresa == empresa, modelo.departamento == departamento))
+        parciais = _parciais_sql_por_grupo(dimensoes, empresa, departamento).get((empresa, departamento))
+        if parciais is None:
+            continue
+        db.session.execute(insert(AgregadoDepartamento), [
+            {'empresa': empresa, 'departamento': departamento, 'total_avaliacoes': parciais['total']}
+        ])
+        if parciais['temas']:
+            db.session.execute(insert(AgregadoTema), [
+                {'empresa': empresa, 'departamento': departamento, 'tema_id': tema_id, 'contagem': dados['contagem'],
+                 'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+                for tema_id, dados in parciais['temas'].items()
+            ])
+        if parciais['subtemas']:
+            db.session.execute(insert(AgregadoSubtema), [
+                {'empresa': empresa, 'departamento': departamento, 'subtema_id': subtema_id,
+                 'total_pontos': dados['total_pontos'], 'contagem': dados['contagem'],
+                 'primeira_avaliacao_id': dados['ordem'][0], 'primeira_resposta_id': dados['ordem'][1]}
+                for subtema_id, dados in parciais['subtemas'].items()
+            ])
+
+    _somar(GeracaoRelatorio, ['empresa', 'departamento'], ['geracao'], [
+        {'empresa': empresa, 'departamento': departamento, 'geracao': 1} for empresa, departamento in departamentos
+    ], com_ordem=False)
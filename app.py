@@ -1,17 +1,50 @@
 # Importações essenciais para a API
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_swagger_ui import get_swaggerui_blueprint
 from flask_cors import CORS
 from config import Config
-from models import db, MacroTema, Tema, Subtema, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel, Recomendacao
+from banco import preparar_banco, configurar_banco
+from models import db, MacroTema, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel, AgregadoDepartamento
+from relatorio import (ler_parametros_relatorio, ler_periodo, parametro_ativo, ParametroInvalido,
+                       calcular_tendencia, montar_tendencia, PERIODOS_TENDENCIA)
+from agregados import atualizar_agregados, reconstruir_agregados
+from catalogo import obter_catalogo, invalidar_catalogo, semear_catalogo, VERSAO_CATALOGO
+from lote import importar_lote
+from exportacao import gerar_exportacao, codificar_pedacos, FORMATOS_EXPORTACAO
+from avaliacoes import validar_avaliacao
+from empacotamento import compactar_respostas, respostas_para_agregados
+from migracoes import (atualizar_esquema, verificar_planos, converter_armazenamento, assinatura_esquema,
+                       ler_versoes, gravar_versao)
+from idempotencia import calcular_chave, buscar_avaliacao, registrar_chave, lembrar_chave
+from cache_relatorio import obter_relatorio, estatisticas_cache
+from instrumentacao import configurar_instrumentacao, metricas
+from compressao import configurar_compressao, carga_de_arquivo
+from tarefas import configurar_tarefas, enviar_tarefa, obter_tarefa, descrever_tarefa
+from deduplicacao import limpar_avaliacoes_duplicadas
+from listagem import listar_avaliacoes, LIMITE_PADRAO_LISTAGEM, LIMITE_MAXIMO_LISTAGEM
+from leitura import preparar_leitura, configurar_leitura, rotear_leitura, atualizar_copia
+from particoes import particionamento_ativo, rotear_empresa, reunir_particoes, preparar_particoes
+from coocorrencia import calcular_coocorrencia
+from relatorio_numpy import numpy_disponivel
+from fila_cadastros import (configurar_fila, fila_ativa, enfileirar_cadastro, consultar_recibo, estado_fila,
+                            drenar_fila)
 import json
+import os
 import time
-_ultima_submissao = {'timestamp': 0, 'chave': None}
+import click
 
 # Inicialização da aplicação Flask e suas extensões
 app = Flask(__name__)
 app.config.from_object(Config)
+preparar_banco(app)
+preparar_leitura(app)
 db.init_app(app)
+configurar_banco(app)
+configurar_leitura(app)
+configurar_tarefas(app)
+configurar_instrumentacao(app)
+configurar_compressao(app)
+configurar_fila(app)
 CORS(app)
 
 # Configuração da documentação da API usando Swagger
@@ -27,49 +60,34 @@ app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 # Rota para obter a estrutura do questionário
 @app.route('/obter_questionario', methods=['GET'])
 def obter_questionario():
-    macrotemas = MacroTema.query.all()
-    resultado = []
-    
-    for macrotema in macrotemas:
-        temas_data = []
-        for tema in macrotema.temas:
-            subtemas_data = []
-            for subtema in tema.subtemas:
-                subtemas_data.append({
-                    'id': subtema.id,
-                    'letra': subtema.letra,
-                    'descricao': subtema.descricao
-                })
-            
-            temas_data.append({
-                'id': tema.id,
-                'numero': tema.numero,
-                'descricao': tema.descricao,
-                'subtemas': subtemas_data
-            })
-        
-        resultado.append({
-            'id': macrotema.id,
-            'codigo': macrotema.codigo,
-            'titulo': macrotema.titulo,
-            'temas': temas_data
-        })
-    
-    return jsonify({'questionario': resultado})
+    # JSON pré-serializado do catálogo em cache, com ETag (304 quando não mudou) e variantes comprimidas
+    return obter_catalogo().questionario.responder()
 
 # Rota para cadastrar uma nova avaliação
 @app.route('/cadastrar_avaliacao', methods=['POST'])
 def cadastrar_avaliacao():
-    global _ultima_submissao
     dados = request.json
-    chave_atual = f"{dados['empresa']}_{dados['departamento']}"
+    erro = validar_avaliacao(dados)
+    if erro is not None:
+        return jsonify({'erro': erro}), 400
     
-    # Verificar se é duplicação nos últimos 3 segundos
-    if time.time() - _ultima_submissao['timestamp'] < 3 and _ultima_submissao['chave'] == chave_atual:
-        return jsonify({'mensagem': 'Avaliação já registrada recentemente.'}), 200
+    # Com particionamento, a avaliação (e a chave de idempotência) vai para a partição da empresa
+    rotear_empresa(dados['empresa'], criar=True)
     
-    # Registrar esta submissão
-    _ultima_submissao = {'timestamp': time.time(), 'chave': chave_atual}
+    # Idempotência: chave enviada pelo cliente ou hash do conteúdo
+    chave, ttl = calcular_chave(dados, request.headers.get('Idempotency-Key'))
+    if chave is not None:
+        avaliacao_id = buscar_avaliacao(chave)
+        if avaliacao_id is not None:
+            return jsonify({'mensagem': 'Avaliação já registrada recentemente.', 'id': avaliacao_id}), 200
+    
+    # Modo fila: a avaliação vai para a fila em disco e é gravada no banco pela ingestão, em lotes
+    if fila_ativa():
+        recibo = enfileirar_cadastro(dados, chave, ttl)
+        resposta = jsonify({'mensagem': 'Avaliação recebida; a gravação será concluída em instantes.', 'recibo': recibo})
+        resposta.status_code = 202
+        resposta.headers['Location'] = f'/recibos_cadastro/{recibo}'
+        return resposta
     
     # Criar avaliação
     nova_avaliacao = Avaliacao(
@@ -77,532 +95,421 @@ def cadastrar_avaliacao():
         departamento=dados['departamento'],
         funcao=dados.get('funcao', '')
     )
-    db.session.add(nova_avaliacao)
-    db.session.flush()
     
-    # Processar respostas do primeiro nível
-    for resposta_nivel1 in dados['respostas_nivel1']:
-        nova_resposta = RespostaPrimeiroNivel(
-            avaliacao_id=nova_avaliacao.id,
-            tema_id=resposta_nivel1['tema_id'],
-            selecionado=resposta_nivel1['selecionado']
+    # Armazenamento compacto: respostas na própria avaliação, sem linhas de respostas
+    if app.config['ARMAZENAMENTO_RESPOSTAS'] == 'compacto':
+        catalogo = obter_catalogo()
+        nova_avaliacao.temas_selecionados, nova_avaliacao.niveis_subtemas = compactar_respostas(
+            dados['respostas_nivel1'], dados['respostas_nivel2'], catalogo
         )
-        db.session.add(nova_resposta)
-    
-    # Processar respostas do segundo nível
-    for resposta_nivel2 in dados['respostas_nivel2']:
-        nova_resposta = RespostaSegundoNivel(
-            avaliacao_id=nova_avaliacao.id,
-            subtema_id=resposta_nivel2['subtema_id'],
-            nivel_desconforto=resposta_nivel2['nivel_desconforto']
+        db.session.add(nova_avaliacao)
+        db.session.flush()
+        atualizar_agregados(
+            [{'id': nova_avaliacao.id, 'empresa': nova_avaliacao.empresa, 'departamento': nova_avaliacao.departamento}],
+            *respostas_para_agregados(
+                nova_avaliacao.id, nova_avaliacao.temas_selecionados, nova_avaliacao.niveis_subtemas, catalogo
+            )
+        )
+    else:
+        db.session.add(nova_avaliacao)
+        db.session.flush()
+        
+        # Processar respostas do primeiro nível
+        respostas_nivel1 = []
+        for resposta_nivel1 in dados['respostas_nivel1']:
+            nova_resposta = RespostaPrimeiroNivel(
+                avaliacao_id=nova_avaliacao.id,
+                tema_id=resposta_nivel1['tema_id'],
+                selecionado=resposta_nivel1['selecionado']
+            )
+            db.session.add(nova_resposta)
+            respostas_nivel1.append(nova_resposta)
+        
+        # Processar respostas do segundo nível
+        respostas_nivel2 = []
+        for resposta_nivel2 in dados['respostas_nivel2']:
+            nova_resposta = RespostaSegundoNivel(
+                avaliacao_id=nova_avaliacao.id,
+                subtema_id=resposta_nivel2['subtema_id'],
+                nivel_desconforto=resposta_nivel2['nivel_desconforto']
+            )
+            db.session.add(nova_resposta)
+            respostas_nivel2.append(nova_resposta)
+        
+        # Atualizar os agregados do relatório na mesma transação
+        db.session.flush()
+        atualizar_agregados(
+            [{'id': nova_avaliacao.id, 'empresa': nova_avaliacao.empresa, 'departamento': nova_avaliacao.departamento}],
+            [{'id': r.id, 'avaliacao_id': r.avaliacao_id, 'tema_id': r.tema_id, 'selecionado': r.selecionado}
+             for r in respostas_nivel1],
+            [{'id': r.id, 'avaliacao_id': r.avaliacao_id, 'subtema_id': r.subtema_id, 'nivel_desconforto': r.nivel_desconforto}
+             for r in respostas_nivel2]
         )
-        db.session.add(nova_resposta)
+    
+    # Registrar a chave na mesma transação; se outro processo chegou antes, devolve a avaliação dele
+    if chave is not None and not registrar_chave(chave, nova_avaliacao.id, ttl):
+        db.session.rollback()
+        return jsonify({'mensagem': 'Avaliação já registrada recentemente.', 'id': buscar_avaliacao(chave)}), 200
     
     db.session.commit()
+    if chave is not None:
+        lembrar_chave(chave, nova_avaliacao.id, ttl)
     
     return jsonify({'mensagem': 'Avaliação cadastrada com sucesso', 'id': nova_avaliacao.id}), 201
 
+# Rota para consultar o recibo de um cadastro recebido pela fila: pendente, gravada (com o id da avaliação),
+# duplicada (com o id da avaliação já registrada) ou erro
+@app.route('/recibos_cadastro/<recibo>', methods=['GET'])
+def consultar_recibo_cadastro(recibo):
+    descricao = consultar_recibo(recibo)
+    if descricao is None:
+        return jsonify({'erro': 'Recibo não encontrado ou expirado.'}), 404
+    return jsonify(descricao)
+
+# Com particionamento, as rotas que leem ou removem avaliações individuais (ids únicos só dentro de cada
+# partição) recebem a empresa e trabalham na partição dela; retorna a resposta de erro quando falta a empresa
+def _rotear_por_empresa(empresa):
+    if particionamento_ativo() and not empresa:
+        return jsonify({'erro': "Parâmetro 'empresa' é obrigatório com o particionamento ativo."}), 400
+    if empresa:
+        rotear_empresa(empresa)
+    return None
+
+# Rota para importar avaliações em lote (NDJSON ou array JSON, lido em fluxo)
+@app.route('/cadastrar_avaliacoes_lote', methods=['POST'])
+def cadastrar_avaliacoes_lote():
+    tamanho_bloco = request.args.get('tamanho_bloco', app.config['LOTE_TAMANHO_BLOCO'], type=int)
+    if tamanho_bloco < 1:
+        return jsonify({'erro': 'tamanho_bloco deve ser maior que zero.'}), 400
+    
+    resultado = importar_lote(request.stream, tamanho_bloco)
+    return jsonify(resultado), 200
+
+# Rota para remover avaliações duplicadas (mesmo conteúdo), mantendo a mais recente de cada grupo.
+# simular=true só conta os grupos; a remoção é feita em blocos de tamanho_bloco avaliações por transação
+@app.route('/limpar_avaliacoes_duplicadas', methods=['DELETE'])
+def limpar_duplicadas():
+    tamanho_bloco = request.args.get('tamanho_bloco', app.config['DEDUPLICACAO_TAMANHO_BLOCO'], type=int)
+    if tamanho_bloco < 1:
+        return jsonify({'erro': 'tamanho_bloco deve ser maior que zero.'}), 400
+    
+    erro = _rotear_por_empresa(request.args.get('empresa'))
+    if erro is not None:
+        return erro
+    
+    simular = parametro_ativo(request.args, 'simular')
+    resultado = limpar_avaliacoes_duplicadas(
+        request.args.get('empresa'), request.args.get('departamento'), simular, tamanho_bloco
+    )
+    if simular:
+        mensagem = f"{resultado['avaliacoes_duplicadas']} avaliações duplicadas seriam removidas."
+    else:
+        mensagem = f"{resultado['avaliacoes_removidas']} avaliações duplicadas foram removidas."
+    return jsonify({'mensagem': mensagem, **resultado}), 200
+
 # Rota para gerar relatório
 @app.route('/gerar_relatorio', methods=['GET'])
+@rotear_leitura
 def gerar_relatorio():
-    empresa = request.args.get('empresa')
-    departamento = request.args.get('departamento')
-    
-    # Consulta base para avaliacoes
-    query = Avaliacao.query
-    if empresa:
-        query = query.filter_by(empresa=empresa)
-    if departamento:
-        query = query.filter_by(departamento=departamento)
+    try:
+        parametros = ler_parametros_relatorio(request.args)
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
     
-    avaliacoes = query.all()
-    total_avaliacoes = len(avaliacoes)
-    
-    if total_avaliacoes == 0:
-        return jsonify({
-            'total_avaliacoes': 0,
-            'mensagem': 'Nenhuma avaliação encontrada com os filtros informados.'
-        })
+    # Resposta do cache enquanto a geração do recorte não muda; If-None-Match com o mesmo ETag recebe 304
+    return obter_relatorio(parametros).responder()
+
+# Rota para consultar os acertos e falhas do cache do relatório (contadores deste processo)
+@app.route('/cache_relatorio', methods=['GET'])
+def cache_relatorio():
+    return jsonify(estatisticas_cache())
+
+# Rota para enviar um relatório para execução assíncrona (mesmos parâmetros do /gerar_relatorio, em JSON).
+# Pedidos iguais ainda em andamento recebem a mesma tarefa.
+@app.route('/tarefas_relatorio', methods=['POST'])
+def enviar_tarefa_relatorio():
+    dados = request.get_json(silent=True)
+    if dados is None:
+        dados = {}
+    if not isinstance(dados, dict):
+        return jsonify({'erro': 'O corpo deve ser um objeto JSON com os parâmetros do relatório.'}), 400
+    try:
+        parametros = ler_parametros_relatorio(dados)
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
     
-    # Estatísticas por tema
-    estatisticas_temas = {}
-    for avaliacao in avaliacoes:
-        for resposta in avaliacao.respostas_nivel1:
-            if resposta.selecionado:
-                tema_id = resposta.tema_id
-                if tema_id not in estatisticas_temas:
-                    tema = Tema.query.get(tema_id)
-                    estatisticas_temas[tema_id] = {
-                        'tema': tema.numero,
-                        'descricao': tema.descricao,
-                        'contagem': 0,
-                        'percentual': 0,
-                        'nivel_medio': 0,
-                        'subtemas': {}
-                    }
-                estatisticas_temas[tema_id]['contagem'] += 1
+    tarefa, coalescida = enviar_tarefa(parametros)
+    resposta = jsonify({'id': tarefa.id, 'estado': tarefa.estado, 'coalescida': coalescida})
+    resposta.status_code = 202
+    resposta.headers['Location'] = f'/tarefas_relatorio/{tarefa.id}'
+    return resposta
+
+# Rota para consultar o estado de uma tarefa do relatório
+@app.route('/tarefas_relatorio/<tarefa_id>', methods=['GET'])
+def consultar_tarefa_relatorio(tarefa_id):
+    tarefa = obter_tarefa(tarefa_id)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada ou expirada.'}), 404
+    return jsonify(descrever_tarefa(tarefa))
+
+# Rota para obter o resultado de uma tarefa concluída (o mesmo JSON do /gerar_relatorio)
+@app.route('/tarefas_relatorio/<tarefa_id>/resultado', methods=['GET'])
+def resultado_tarefa_relatorio(tarefa_id):
+    tarefa = obter_tarefa(tarefa_id)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada ou expirada.'}), 404
+    if tarefa.estado == 'erro':
+        return jsonify(descrever_tarefa(tarefa)), 500
+    if tarefa.estado != 'concluida':
+        return jsonify(descrever_tarefa(tarefa)), 202
+    return app.response_class(response=tarefa.resultado, status=200, mimetype='application/json')
+
+# Rota para a série temporal do relatório: estatísticas por tema em cada semana, mês ou trimestre
+@app.route('/tendencia_relatorio', methods=['GET'])
+@rotear_leitura
+def tendencia_relatorio():
+    empresa = request.args.get('empresa')
+    departamento = request.args.get('departamento')
+    periodo = request.args.get('periodo', 'mes')
+    if periodo not in PERIODOS_TENDENCIA:
+        return jsonify({'erro': f"Parâmetro 'periodo' deve ser {', '.join(PERIODOS_TENDENCIA)}."}), 400
+    try:
+        desde, ate = ler_periodo(request.args)
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
     
-    # Calcular percentuais
-    for tema_id in estatisticas_temas:
-        estatisticas_temas[tema_id]['percentual'] = round((estatisticas_temas[tema_id]['contagem'] / total_avaliacoes) * 100, 1)
+    series = calcular_tendencia(periodo, empresa, departamento, desde, ate)
+    return jsonify(montar_tendencia(series, periodo, empresa, departamento))
+
+# Rota para a coocorrência dos temas selecionados (contagens e lift de cada par) no recorte;
+# subtemas=true acrescenta a correlação dos níveis de desconforto entre os subtemas (requer numpy)
+@app.route('/coocorrencia_temas', methods=['GET'])
+@rotear_leitura
+def coocorrencia_temas():
+    subtemas = parametro_ativo(request.args, 'subtemas')
+    if subtemas and not numpy_disponivel():
+        return jsonify({'erro': "O parâmetro 'subtemas' requer o pacote numpy."}), 400
+    try:
+        desde, ate = ler_periodo(request.args)
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
     
-    # Estatísticas por subtema
-    for avaliacao in avaliacoes:
-        for resposta in avaliacao.respostas_nivel2:
-            subtema = Subtema.query.get(resposta.subtema_id)
-            tema_id = subtema.tema_id
-            
-            if tema_id in estatisticas_temas:
-                if subtema.id not in estatisticas_temas[tema_id]['subtemas']:
-                    estatisticas_temas[tema_id]['subtemas'][subtema.id] = {
-                        'letra': subtema.letra,
-                        'descricao': subtema.descricao,
-                        'total_pontos': 0,
-                        'contagem': 0,
-                        'nivel_medio': 0
-                    }
-                
-                estatisticas_temas[tema_id]['subtemas'][subtema.id]['total_pontos'] += resposta.nivel_desconforto
-                estatisticas_temas[tema_id]['subtemas'][subtema.id]['contagem'] += 1
+    return jsonify(calcular_coocorrencia(
+        request.args.get('empresa'), request.args.get('departamento'), desde, ate, subtemas
+    ))
+
+# Rota para listar as avaliações (auditoria), da mais recente para a mais antiga, paginada por cursor:
+# a resposta traz proximo_cursor, enviado no parâmetro cursor para buscar a página seguinte
+@app.route('/listar_avaliacoes', methods=['GET'])
+@rotear_leitura
+def listar_avaliacoes_rota():
+    limite = request.args.get('limite', LIMITE_PADRAO_LISTAGEM, type=int)
+    if not 1 <= limite <= LIMITE_MAXIMO_LISTAGEM:
+        return jsonify({'erro': f"Parâmetro 'limite' deve estar entre 1 e {LIMITE_MAXIMO_LISTAGEM}."}), 400
+    erro = _rotear_por_empresa(request.args.get('empresa'))
+    if erro is not None:
+        return erro
+    try:
+        desde, ate = ler_periodo(request.args)
+        pagina = listar_avaliacoes(
+            request.args.get('empresa'), request.args.get('departamento'), request.args.get('funcao'),
+            desde, ate, limite, request.args.get('cursor'), parametro_ativo(request.args, 'incluir_respostas')
+        )
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
+    return jsonify(pagina)
+
+# Rota para exportar as respostas brutas (uma linha por avaliação) em CSV ou NDJSON, gerada em fluxo
+@app.route('/exportar_avaliacoes', methods=['GET'])
+@rotear_leitura
+def exportar_avaliacoes():
+    empresa = request.args.get('empresa')
+    departamento = request.args.get('departamento')
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'erro': f"Parâmetro 'formato' deve ser {', '.join(FORMATOS_EXPORTACAO)}."}), 400
+    try:
+        desde, ate = ler_periodo(request.args)
+    except ParametroInvalido as erro:
+        return jsonify({'erro': str(erro)}), 400
+    erro = _rotear_por_empresa(empresa)
+    if erro is not None:
+        return erro
     
-    # Calcular médias dos subtemas
-    for tema_id in estatisticas_temas:
-        total_pontos_tema = 0
-        total_respostas_tema = 0
+    gzip = parametro_ativo(request.args, 'gzip')
+    nome_arquivo = f'avaliacoes.{formato}' + ('.gz' if gzip else '')
+    if gzip:
+        tipo = 'application/gzip'
+    elif formato == 'csv':
+        tipo = 'text/csv; charset=utf-8'
+    else:
+        tipo = 'application/x-ndjson; charset=utf-8'
+    pedacos = gerar_exportacao(formato, empresa, departamento, desde, ate)
+    return Response(
+        stream_with_context(codificar_pedacos(pedacos, gzip)),
+        content_type=tipo,
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
+    )
+
+# Rota para as métricas das requisições deste processo no formato texto do Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    cache = estatisticas_cache()
+    contadores = [
+        ('rp_cache_relatorio_acertos_total', 'Acertos do cache do relatório.', cache['acertos']),
+        ('rp_cache_relatorio_falhas_total', 'Falhas do cache do relatório.', cache['falhas']),
+    ]
+    medidores = []
+    if fila_ativa():
+        fila = estado_fila()
+        contadores += [
+            ('rp_fila_cadastros_recebidos_total', 'Cadastros acrescentados à fila.', fila['recebidos']),
+            ('rp_fila_cadastros_sincronizacoes_total', 'Sincronizações (fsync) da fila.', fila['sincronizacoes']),
+            ('rp_fila_cadastros_gravados_total', 'Cadastros da fila gravados no banco.', fila['gravados']),
+            ('rp_fila_cadastros_duplicados_total', 'Cadastros da fila descartados como repetidos.', fila['duplicados']),
+            ('rp_fila_cadastros_erros_total', 'Cadastros da fila que falharam na gravação.', fila['erros']),
+        ]
+        # Medidos no diretório da fila: incluem os segmentos de todos os processos
+        medidores = [
+            ('rp_fila_cadastros_pendentes_bytes', 'Bytes da fila ainda não gravados no banco.', fila['pendentes_bytes']),
+            ('rp_fila_cadastros_defasagem_segundos', 'Idade do cadastro mais antigo ainda não gravado no banco.',
+             fila['defasagem_segundos']),
+        ]
+    texto = metricas.exportar(contadores, medidores)
+    return Response(texto, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/static/swagger.json')
+def swagger_spec():
+    # Lido uma vez por processo e servido da memória, comprimido conforme o Accept-Encoding
+    carga = carga_de_arquivo(os.path.join(app.static_folder, 'swagger.json'), 'application/json')
+    return carga.responder(cache_control='public, max-age=300')
+
+# Inicializa o banco. O esquema só é criado/atualizado e o catálogo só é semeado quando as versões
+# gravadas no banco diferem das da aplicação; em um banco já atualizado, custa uma consulta.
+# Retorna as etapas executadas e a duração, também registradas no log.
+def inicializar_db():
+    inicio = time.perf_counter()
+    etapas = []
+    with app.app_context():
+        versoes = ler_versoes()
         
-        for subtema_id in estatisticas_temas[tema_id]['subtemas']:
-            subtema_data = estatisticas_temas[tema_id]['subtemas'][subtema_id]
-            if subtema_data['contagem'] > 0:
-                subtema_data['nivel_medio'] = round(subtema_data['total_pontos'] / subtema_data['contagem'], 2)
-                total_pontos_tema += subtema_data['total_pontos']
-                total_respostas_tema += subtema_data['contagem']
+        esquema = assinatura_esquema()
+        if versoes.get('esquema') != esquema:
+            db.create_all()
+            atualizar_esquema()
+            # Bancos já existentes: constrói os agregados do relatório a partir das respostas
+            if AgregadoDepartamento.query.count() == 0 and Avaliacao.query.count() > 0:
+                reconstruir_agregados()
+            gravar_versao('esquema', esquema)
+            db.session.commit()
+            etapas.append('esquema')
         
-        # Calcular média do tema
-        if total_respostas_tema > 0:
-            estatisticas_temas[tema_id]['nivel_medio'] = round(total_pontos_tema / total_respostas_tema, 2)
-    
-    # Preparar dados para retorno
-    temas_resultado = []
-    for tema_id, dados in estatisticas_temas.items():
-        # Busca o tema para obter seu macrotema (MOVIDO PARA AQUI)
-        tema_obj = Tema.query.get(tema_id)
-        macrotema_codigo = tema_obj.macro_tema.codigo if tema_obj and tema_obj.macro_tema else "?"
-        dados['macrotema'] = macrotema_codigo
+        if versoes.get('catalogo') != VERSAO_CATALOGO:
+            if MacroTema.query.count() == 0:
+                semear_catalogo()
+                gravar_versao('catalogo', VERSAO_CATALOGO)
+                etapas.append('catalogo')
+            elif 'catalogo' not in versoes:
+                # Banco semeado antes das versões gravadas: catálogo da versão 1
+                gravar_versao('catalogo', '1')
+            else:
+                # O catálogo de um banco já em uso não é substituído automaticamente
+                app.logger.warning('Catálogo do banco na versão %s; a aplicação usa a versão %s',
+                                   versoes['catalogo'], VERSAO_CATALOGO)
+            db.session.commit()
+            invalidar_catalogo()
         
-        subtemas_lista = []
-        for subtema_id, subtema_dados in dados['subtemas'].items():
-            subtemas_lista.append({
-                'letra': subtema_dados['letra'],
-                'descricao': subtema_dados['descricao'],
-                'nivel_medio': subtema_dados['nivel_medio']
-            })
+        # A cópia de leitura precisa do esquema e do catálogo recém-criados
+        if etapas and app.config['LEITURA_MODO'] == 'copia':
+            atualizar_copia()
         
-        # Obter recomendações com base no nível médio
-        nivel_medio = dados['nivel_medio']
-        faixa_nivel = 0  # Ausência de Risco (padrão)
+        # Partições: esquema e catálogo iguais aos do banco principal
+        particoes = preparar_particoes()
+    
+    resultado = {'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2), 'etapas': etapas}
+    if particoes:
+        resultado['particoes'] = particoes
+    app.logger.info('Banco inicializado', extra={'campos': resultado})
+    return resultado
 
-        # Classificação simplificada
-        if nivel_medio >= 0.5 and nivel_medio < 1.5:
-            faixa_nivel = 1  # Risco Baixo
-        elif nivel_medio >= 1.5 and nivel_medio < 2.5:
-            faixa_nivel = 2  # Risco Moderado
-        elif nivel_medio >= 2.5 and nivel_medio < 3.5:
-            faixa_nivel = 3  # Risco Alto
-        elif nivel_medio >= 3.5:
-            faixa_nivel = 4  # Risco Crítico
-        
-        # Adicionar print para debug
-        print(f"Tema {dados['tema']}: nivel_medio={nivel_medio}, faixa_nivel={faixa_nivel}")
-        
-        recomendacoes = Recomendacao.query.filter_by(tema_id=tema_id, faixa_nivel=faixa_nivel).all()
-        recomendacoes_lista = [rec.descricao for rec in recomendacoes]
-        
-        # Verificar se recomendações foram encontradas
-        print(f"Tema {dados['tema']}: {len(recomendacoes_lista)} recomendações encontradas")
+# Comando para inicializar o banco e medir a inicialização (usado na CI):
+# flask --app app inicializar-banco --limite-ms 50
+@app.cli.command('inicializar-banco')
+@click.option('--limite-ms', type=float, default=None, help='Falha se a inicialização demorar mais que isso.')
+def inicializar_banco_comando(limite_ms):
+    resultado = inicializar_db()
+    print(json.dumps(resultado, ensure_ascii=False))
+    if limite_ms is not None and resultado['duracao_ms'] > limite_ms:
+        raise SystemExit(1)
 
-        # Adiciona dados consolidados do tema ao resultado final
-        temas_resultado.append({
-            'tema': dados['tema'],
-            'descricao': dados['descricao'],
-            'contagem': dados['contagem'],
-            'macrotema': dados['macrotema'],
-            'percentual': dados['percentual'],
-            'nivel_medio': dados['nivel_medio'],
-            'subtemas': subtemas_lista,
-            'recomendacoes': recomendacoes_lista
-        })
-        
-    # Ordenar por percentual (decrescente)
-    temas_resultado.sort(key=lambda x: x['percentual'], reverse=True)
-        
-    return jsonify({
-        'total_avaliacoes': total_avaliacoes,
-        'empresa': empresa if empresa else 'Todas',
-         'departamento': departamento if departamento else 'Todos',
-           'temas': temas_resultado
-    })
+# Comando para reconstruir os agregados do relatório: flask --app app reconstruir-agregados
+@app.cli.command('reconstruir-agregados')
+def reconstruir_agregados_comando():
+    def reconstruir():
+        reconstruir_agregados()
+        db.session.commit()
+        return AgregadoDepartamento.query.count()
+    
+    with app.app_context():
+        print(f"Agregados reconstruídos: {sum(reunir_particoes(reconstruir))} departamentos")
 
-@app.route('/static/swagger.json')
-def swagger_spec():
-    with open('static/swagger.json', 'r', encoding='utf-8') as f:
-        content = f.read()
-    # Não use jsonify, retorne a resposta diretamente
-    response = app.response_class(
-        response=content,
-        status=200,
-        mimetype='application/json'
-    )
-    return response
+# Comando para remover avaliações duplicadas com o progresso de cada bloco:
+# flask --app app limpar-duplicadas --simular
+@app.cli.command('limpar-duplicadas')
+@click.option('--simular', is_flag=True, help='Só conta as duplicadas, sem remover.')
+@click.option('--empresa', default=None)
+@click.option('--departamento', default=None)
+@click.option('--tamanho-bloco', type=int, default=None, help='Avaliações por bloco (padrão DEDUPLICACAO_TAMANHO_BLOCO).')
+def limpar_duplicadas_comando(simular, empresa, departamento, tamanho_bloco):
+    def progresso(fase, resultado):
+        print(f"{fase}: {resultado['avaliacoes_analisadas']} analisadas, "
+              f"{resultado['avaliacoes_removidas']}/{resultado['avaliacoes_duplicadas']} removidas", flush=True)
+    
+    with app.app_context():
+        if particionamento_ativo() and not empresa:
+            raise click.UsageError('--empresa é obrigatório com o particionamento ativo.')
+        if empresa:
+            rotear_empresa(empresa)
+        resultado = limpar_avaliacoes_duplicadas(
+            empresa, departamento, simular, tamanho_bloco or app.config['DEDUPLICACAO_TAMANHO_BLOCO'], progresso
+        )
+        print(json.dumps(resultado, ensure_ascii=False))
 
-# Aqui está a função modificada (sem o decorador @app.before_first_request)
-def inicializar_db():
+# Comando para criar índices que faltam em bancos existentes: flask --app app atualizar-esquema
+@app.cli.command('atualizar-esquema')
+def atualizar_esquema_comando():
     with app.app_context():
         db.create_all()
-        
-        # Verifica se já existem dados
-        if MacroTema.query.count() == 0:
-            # Cria os macro temas
-            macro_a = MacroTema(codigo="A", titulo="Sobre diferentes cargas de trabalho")
-            macro_b = MacroTema(codigo="B", titulo="Sobre aspectos sociais no trabalho")
-            macro_c = MacroTema(codigo="C", titulo="Sobre suporte organizacional")
-            macro_d = MacroTema(codigo="D", titulo="Sobre saúde no trabalho")
-            macro_e = MacroTema(codigo="E", titulo="Sobre outros aspectos")
-            
-            db.session.add_all([macro_a, macro_b, macro_c, macro_d, macro_e])
-            db.session.flush()
-            
-            temas = [
-                # Macro tema A - Sobre diferentes cargas de trabalho
-                {"macro": macro_a, "numero": 1, "descricao": "Meu trabalho é caracterizado por alta intensidade e um ritmo acelerado de trabalho.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Preciso trabalhar muito rápido ou com muito esforço ao longo do dia"},
-                    {"letra": "b", "descricao": "Frequentemente não tenho tempo para concluir todas as minhas tarefas ou preciso fazer horas extras"},
-                    {"letra": "c", "descricao": "Frequentemente sou pressionado(a) a fazer horas extras"},
-                    {"letra": "d", "descricao": "Tenho muitas demandas no trabalho com metas ou prazos difíceis de cumprir"}
-                ]},
-                {"macro": macro_a, "numero": 2, "descricao": "Meu trabalho é caracterizado por variações extremamente baixas (monotonia) ou excessivas.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Meu trabalho não é variado e faço a mesma coisa repetidamente"},
-                    {"letra": "b", "descricao": "O trabalho não exige que eu utilize diferentes habilidades"},
-                    {"letra": "c", "descricao": "Tenho que repetir o mesmo procedimento em intervalos curtos"},
-                    {"letra": "d", "descricao": "Minha carga de trabalho é distribuída de forma desigual ou aumenta repentinamente"}
-                ]},
-                {"macro": macro_a, "numero": 3, "descricao": "Meu trabalho é difícil (em termos de tarefas, decisões, objetivos, habilidades e conhecimentos exigidos, etc.).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Meu trabalho exige um alto nível de conhecimento e habilidades técnicas"},
-                    {"letra": "b", "descricao": "Meu trabalho exige que eu tome decisões difíceis, rápidas ou complexas"},
-                    {"letra": "c", "descricao": "Preciso me esforçar muito para alcançar o nível de desempenho exigido"},
-                ]},
-                {"macro": macro_a, "numero": 4, "descricao": "Preciso pensar e raciocinar muito no meu trabalho.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Meu trabalho exige que eu memorize ou preste atenção a muitas informações ao mesmo tempo"},
-                    {"letra": "b", "descricao": "Meu trabalho exige muita concentração"},
-                    {"letra": "c", "descricao": "Preciso pensar constantemente sobre o trabalho durante o expediente"},
-                ]},
-                {"macro": macro_a, "numero": 5, "descricao": "Meu trabalho causa alguma perturbação emocional em algumas situações.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Tenho que lidar com problemas pessoais de outras pessoas no trabalho"},
-                    {"letra": "b", "descricao": "Meu trabalho é emocionalmente exigente ou perturbador"},
-                    {"letra": "c", "descricao": "Preciso esconder meus sentimentos ou não posso expressar minha opinião"},
-                    {"letra": "d", "descricao": "Sou obrigado(a) a ser gentil com todos, independente de como se comportem comigo"},
-                    {"letra": "e", "descricao": "Tenho responsabilidade sobre o futuro, segurança, moral, bem-estar ou vida de outras pessoas"}
-                ]},
+        print(json.dumps(atualizar_esquema(), ensure_ascii=False))
 
-                # Macro tema B - Sobre aspectos sociais no trabalho
-                {"macro": macro_b, "numero": 6, "descricao": "No meu trabalho, o relacionamento com meus colegas é desafiador.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Trabalhar com certos colegas é difícil ou frustrante e drena minha energia"},
-                    {"letra": "b", "descricao": "Há pouca cooperação entre os colegas"},
-                    {"letra": "c", "descricao": "Existe atrito, raiva ou falta de respeito entre colegas"},
-                    {"letra": "d", "descricao": "Os colegas não estão dispostos a ouvir meus problemas ou ideias"},
-                    {"letra": "e", "descricao": "Não tenho oportunidade de desenvolver relações sociais com colegas"}
-                ]},
-                {"macro": macro_b, "numero": 7, "descricao": "No meu trabalho, o relacionamento com meus superiores (em qualquer nível) é desafiador.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Trabalhar com meus superiores é difícil ou frustrante e drena minha energia"},
-                    {"letra": "b", "descricao": "Meus superiores não sabem administrar bem a equipe"},
-                    {"letra": "c", "descricao": "Meus superiores dão pouca importância à satisfação, segurança e bem-estar dos trabalhadores"},
-                    {"letra": "d", "descricao": "Não posso contar com a ajuda dos superiores ou liderança da empresa em caso de necessidade"},
-                    {"letra": "e", "descricao": "Os funcionários não conseguem expressar suas opiniões, sentimentos e ideias"},
-                    {"letra": "f", "descricao": "Meus superiores não estão dispostos a ouvir meus problemas relacionados ao trabalho ou pessoais"}
-                ]},
-                {"macro": macro_b, "numero": 8, "descricao": "Meu trabalho impacta negativamente minha vida pessoal.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Preciso alterar meus planos pessoais ou familiares por causa do trabalho"},
-                    {"letra": "b", "descricao": "Pessoas próximas dizem que sacrifico demais pelo trabalho"},
-                    {"letra": "c", "descricao": "É difícil tirar um tempo durante o trabalho para cuidar de assuntos pessoais ou familiares"},
-                    {"letra": "d", "descricao": "As demandas do trabalho interferem na minha vida pessoal e familiar (ou vice-versa)"},
-                    {"letra": "e", "descricao": "Não me sinto à vontade ou confiante para conversar sobre meus problemas de trabalho com meu cônjuge ou pessoa próxima"}
-                ]},
-                {"macro": macro_b, "numero": 9, "descricao": "No meu trabalho, há falta de confiança entre os trabalhadores e entre trabalhadores e superiores.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Funcionários ou gestores retêm informações entre si"},
-                    {"letra": "b", "descricao": "Em geral, os funcionários não confiam uns nos outros"},
-                    {"letra": "c", "descricao": "A gestão não confia que os funcionários realizem bem seu trabalho"},
-                    {"letra": "d", "descricao": "Os funcionários não confiam nas informações que vêm da gestão"},
-                    {"letra": "e", "descricao": "A gestão retém informações importantes dos funcionários (ou vice-versa)"}
-                ]},
-               
-                # Macro tema C - Sobre suporte organizacional
-                {"macro": macro_c, "numero": 10, "descricao": "Não tenho clareza sobre o que preciso fazer e quais metas alcançar (ou não recebo feedback sobre meu desempenho).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Meu trabalho não possui objetivos claros ou não sei o que se espera de mim"},
-                    {"letra": "b", "descricao": "Demandas contraditórias são colocadas sobre mim no trabalho"},
-                    {"letra": "c", "descricao": "Não recebo informações sobre meu desempenho dos gestores ou colegas"},
-                    {"letra": "d", "descricao": "Os funcionários não são informados sobre os objetivos ou políticas atuais da empresa"}
-                ]},
-                {"macro": macro_c, "numero": 11, "descricao": "Meu desempenho no trabalho é negativamente impactado por aspectos fora do meu alcance.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Minhas atividades de trabalho são muito afetadas pelo trabalho de outras pessoas"},
-                    {"letra": "b", "descricao": "Sofro muitas interrupções e distrações durante o trabalho"},
-                    {"letra": "c", "descricao": "Tenho dificuldade em realizar meu trabalho com qualidade por falta de apoio organizacional"},
-                    {"letra": "d", "descricao": "Não recebo os recursos ou ajuda necessária para fazer meu trabalho bem"}
-                ]},
-                {"macro": macro_c, "numero": 12, "descricao": "No trabalho, percebo algumas situações que considero injustas.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "O trabalho não é distribuído de forma justa"},
-                    {"letra": "b", "descricao": "As sugestões dos funcionários não são levadas a sério pela gestão"},
-                    {"letra": "c", "descricao": "Os conflitos não são resolvidos de forma justa ou satisfatória"},
-                    {"letra": "d", "descricao": "Não sou tratado(a) com respeito ou justiça no trabalho"}
-                ]},
-                {"macro": macro_c, "numero": 13, "descricao": "Meu trabalho não permite desenvolvimento profissional (carreira e treinamento).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Não há boas perspectivas de promoção ou desenvolvimento no trabalho"},
-                    {"letra": "b", "descricao": "Não tenho a possibilidade de desenvolver novos conhecimentos ou habilidades no trabalho"},
-                    {"letra": "c", "descricao": "Não posso aplicar minhas habilidades ou conhecimentos no trabalho, ou trabalho abaixo da minha capacidade"},
-                    {"letra": "d", "descricao": "Não me sinto certo(a) ou confiante sobre minha trajetória profissional"},
-                    {"letra": "e", "descricao": "Meu trabalho não me estimula a encontrar soluções criativas ou pensar fora da caixa"}
-                ]},
-                {"macro": macro_c, "numero": 14, "descricao": "No meu trabalho, a participação e/ou autonomia dos trabalhadores não é incentivada.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Meu trabalho não me dá chance de usar minha iniciativa pessoal ou julgamento próprio"},
-                    {"letra": "b", "descricao": "Às vezes preciso fazer coisas que parecem desnecessárias ou que poderiam ser feitas de outra forma"},
-                    {"letra": "c", "descricao": "Não tenho poder de decisão sobre meu trabalho (o que fazer, ritmo, com quem, quantidade de tarefas, etc.)"},
-                    {"letra": "d", "descricao": "Não posso decidir quando tirar pausas ou férias, ou não posso interromper o trabalho para conversar com um colega"},
-                    {"letra": "e", "descricao": "Meu trabalho é frequentemente controlado (supervisores, auditorias, inspeções, etc.)"},
-                    {"letra": "f", "descricao": "Os trabalhadores não são incentivados a pensar em maneiras de melhorar o trabalho"}
-                ]},
+# Comando para conferir os planos das consultas críticas (usado na CI): flask --app app verificar-indices
+@app.cli.command('verificar-indices')
+def verificar_indices_comando():
+    with app.app_context():
+        problemas = verificar_planos()
+        for problema in problemas:
+            print(problema)
+        if problemas:
+            raise SystemExit(1)
+        print('Todas as consultas críticas usam os índices esperados.')
 
-                # Macro tema D - Sobre saúde no trabalho
-                {"macro": macro_d, "numero": 15, "descricao": "No meu trabalho, há situações de comportamento prejudicial (bullying, agressão, assédio, discriminação, etc.).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Ameaças, agressões físicas ou violência"},
-                    {"letra": "b", "descricao": "Discriminação por gênero, idade, religião, filiação política, nacionalidade, raça, orientação sexual, saúde, estado civil, etc."},
-                    {"letra": "c", "descricao": "Abuso verbal, conflitos, insultos, provocações, assédio nas redes sociais relacionado ao trabalho"},
-                    {"letra": "d", "descricao": "Assédio sexual ou atenção sexual indesejada"},
-                    {"letra": "e", "descricao": "Palavras ou atitudes humilhantes, bullying, boatos prejudiciais, hostilidade"}
-                ]},
-                {"macro": macro_d, "numero": 16, "descricao": "Minha saúde mental é negativamente afetada pelo trabalho (estresse, exaustão, depressão, etc.).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Frequentemente acho que não suporto mais meu trabalho"},
-                    {"letra": "b", "descricao": "Tenho estado frequentemente física ou emocionalmente exausto(a)"},
-                    {"letra": "c", "descricao": "Frequentemente sinto tristeza ou falta de interesse nas coisas do dia a dia"},
-                    {"letra": "d", "descricao": "Frequentemente me sinto sem confiança ou com culpa/remorso"},
-                    {"letra": "e", "descricao": "Tenho dificuldade em me concentrar ou pensar com clareza"},
-                    {"letra": "f", "descricao": "Tenho dificuldade em tomar decisões ou em lembrar das coisas"},
-                    {"letra": "g", "descricao": "Frequentemente fico irritado(a) ou tenso(a)"},
-                    {"letra": "h", "descricao": "Frequentemente tenho dores de estômago, dor de cabeça, palpitações ou tensão muscular"}
-                ]},
-                
-                # Macro tema D - Sobre saúde no trabalho
-                {"macro": macro_d, "numero": 17, "descricao": "A qualidade do meu sono é negativamente impactada pelo trabalho.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "O trabalho não me deixa em paz, penso nele mesmo ao ir dormir"},
-                    {"letra": "b", "descricao": "Se deixo de fazer algo no trabalho, tenho dificuldade para dormir"},
-                    {"letra": "c", "descricao": "Assim que acordo, já começo a pensar nos problemas do trabalho"},
-                    {"letra": "d", "descricao": "A rotina de trabalho afeta a qualidade do meu sono (trabalho noturno, turnos, etc.)"}
-                ]},
+# Comando para converter as avaliações gravadas entre os armazenamentos de respostas:
+# flask --app app converter-armazenamento compacto (ou linhas)
+@app.cli.command('converter-armazenamento')
+@click.argument('destino', type=click.Choice(['compacto', 'linhas']))
+def converter_armazenamento_comando(destino):
+    with app.app_context():
+        convertidas = sum(
+            resultado['avaliacoes_convertidas'] for resultado in reunir_particoes(lambda: converter_armazenamento(destino))
+        )
+        print(json.dumps({'destino': destino, 'avaliacoes_convertidas': convertidas}, ensure_ascii=False))
 
-                # Macro tema E - Sobre outros aspectos
-                {"macro": macro_e, "numero": 18, "descricao": "Estou preocupado(a) com meu futuro profissional (desemprego, mudanças indesejadas, etc.).", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Tenho medo de ser demitido ou de ser substituído por tecnologia"},
-                    {"letra": "b", "descricao": "Tenho medo de ser transferido de função sem aviso prévio ou contra minha vontade"},
-                    {"letra": "c", "descricao": "Tenho receio de mudanças no cronograma/horários contra minha vontade"},
-                    {"letra": "d", "descricao": "Tenho medo de redução salarial ou introdução de salário variável"},
-                    {"letra": "e", "descricao": "Me preocupo com a dificuldade de encontrar outro bom emprego se ficar desempregado"}
-                ]},
-                {"macro": macro_e, "numero": 19, "descricao": "Considero meu trabalho sem importância ou não devidamente reconhecido.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Sinto que meu trabalho é sem sentido ou pouco importante"},
-                    {"letra": "b", "descricao": "Meu trabalho não é reconhecido pela gestão, mesmo quando faço um bom trabalho"},
-                    {"letra": "c", "descricao": "Sinto que meu local de trabalho tem pouca importância para mim / Penso frequentemente em procurar outro emprego"},
-                    {"letra": "d", "descricao": "O resultado do meu trabalho não afeta significativamente a vida de outras pessoas ou o mundo"},
-                    {"letra": "e", "descricao": "Na organização, não sou recompensado(a) (dinheiro, incentivo, etc.) por um bom desempenho"}
-                ]},
-                {"macro": macro_e, "numero": 20, "descricao": "Estou insatisfeito(a) com meu trabalho em geral.", 
-                "subtemas": [
-                    {"letra": "a", "descricao": "Não estou satisfeito com a qualidade do trabalho realizado na empresa"},
-                    {"letra": "b", "descricao": "Considerando meus esforços e conquistas, não estou satisfeito com minhas perspectivas/salário"},
-                    {"letra": "c", "descricao": "Não me sinto inspirado nem satisfeito com meu trabalho, de modo geral"},
-                    {"letra": "d", "descricao": "Tenho vergonha de falar sobre meu trabalho ou não recomendaria meu emprego a outras pessoas"},
-                    {"letra": "e", "descricao": "No trabalho, não me sinto energizado ou imerso no que faço"}
-                ]}
-            
-            ]
-                  
-            for tema_data in temas:
-                tema = Tema(numero=tema_data["numero"], descricao=tema_data["descricao"], macro_tema=tema_data["macro"])
-                db.session.add(tema)
-                db.session.flush()
-                
-                for subtema_data in tema_data["subtemas"]:
-                    subtema = Subtema(letra=subtema_data["letra"], descricao=subtema_data["descricao"], tema=tema)
-                    db.session.add(subtema)     
-            
-            recomendacoes = [
-                # Tema 1 - Intensidade e ritmo
-                {"tema_numero": 1, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O ritmo de trabalho está adequado, mantenha o monitoramento regular."},
-                {"tema_numero": 1, "faixa_nivel": 1, "descricao": "Implementar check-ins periódicos para avaliar percepções sobre o ritmo de trabalho. Analisar distribuição de tarefas."},
-                {"tema_numero": 1, "faixa_nivel": 2, "descricao": "Revisar a distribuição de tarefas e prazos. Considerar ajustes de cronograma e implementar pausas programadas."},
-                {"tema_numero": 1, "faixa_nivel": 3, "descricao": "Redistribuir urgentemente a carga de trabalho, limitar horas extras e implementar apoio adicional para equipes sobrecarregadas."},
-                {"tema_numero": 1, "faixa_nivel": 4, "descricao": "Intervenção imediata: redesenhar processos de trabalho, contratar pessoal adicional e implementar política de limite máximo de horas trabalhadas."},
-                
-                # Tema 2 - Variações no trabalho
-                {"tema_numero": 2, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. As variações nas atividades de trabalho estão equilibradas."},
-                {"tema_numero": 2, "faixa_nivel": 1, "descricao": "Iniciar pequenas modificações nas rotinas para introduzir mais variedade nas tarefas diárias."},
-                {"tema_numero": 2, "faixa_nivel": 2, "descricao": "Implementar rotação de funções e diversificar tarefas dentro da equipe para reduzir monotonia."},
-                {"tema_numero": 2, "faixa_nivel": 3, "descricao": "Reorganizar fluxos de trabalho, adicionar novas responsabilidades e implementar sistema formal de rotação de tarefas."},
-                {"tema_numero": 2, "faixa_nivel": 4, "descricao": "Reestruturação completa das funções, com redesenho dos cargos para garantir variação adequada e prevenção de lesões por esforço repetitivo."},
-                
-                # Tema 3 - Dificuldade do trabalho
-                {"tema_numero": 3, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O nível de dificuldade está bem ajustado às capacidades da equipe."},
-                {"tema_numero": 3, "faixa_nivel": 1, "descricao": "Oferecer materiais de referência e pequenos treinamentos para apoiar a execução de tarefas mais complexas."},
-                {"tema_numero": 3, "faixa_nivel": 2, "descricao": "Implementar treinamentos técnicos regulares e criar procedimentos de suporte para tarefas complexas."},
-                {"tema_numero": 3, "faixa_nivel": 3, "descricao": "Desenvolver sistema estruturado de mentoria, simplificar processos decisórios e revisar requisitos técnicos excessivos."},
-                {"tema_numero": 3, "faixa_nivel": 4, "descricao": "Redesenhar completamente os requisitos do cargo, implementar suporte técnico constante e estabelecer equipes multidisciplinares para decisões complexas."},
-                
-                # Tema 4 - Demanda mental
-                {"tema_numero": 4, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. A carga mental está bem equilibrada."},
-                {"tema_numero": 4, "faixa_nivel": 1, "descricao": "Sugerir técnicas de organização mental e implementar pequenas pausas ao longo do dia."},
-                {"tema_numero": 4, "faixa_nivel": 2, "descricao": "Introduzir pausas cognitivas programadas e implementar checklists para reduzir sobrecarga mental."},
-                {"tema_numero": 4, "faixa_nivel": 3, "descricao": "Desenvolver ferramentas de suporte para tomada de decisão, reduzir multitarefas e estabelecer períodos protegidos para trabalho concentrado."},
-                {"tema_numero": 4, "faixa_nivel": 4, "descricao": "Redesenhar completamente processos cognitivos, introduzir sistemas de IA de suporte, implementar pausas mandatórias e revezamento em funções de alta exigência mental."},
-                
-                # Tema 5 - Perturbação emocional
-                {"tema_numero": 5, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O ambiente emocional parece saudável."},
-                {"tema_numero": 5, "faixa_nivel": 1, "descricao": "Disponibilizar materiais sobre inteligência emocional e técnicas de autocuidado para situações desafiadoras."},
-                {"tema_numero": 5, "faixa_nivel": 2, "descricao": "Oferecer workshops sobre gestão emocional e estabelecer espaços seguros para expressão de sentimentos e opiniões."},
-                {"tema_numero": 5, "faixa_nivel": 3, "descricao": "Implementar programa estruturado de suporte psicológico, rodízio em funções emocionalmente desgastantes e treinamento avançado em resiliência."},
-                {"tema_numero": 5, "faixa_nivel": 4, "descricao": "Intervenção emergencial com suporte terapêutico contínuo, redesenho completo de funções com alta carga emocional e implementação de equipes de suporte dedicadas."},
-                
-                # Tema 6 - Relacionamento com colegas
-                {"tema_numero": 6, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. As relações entre colegas são saudáveis e cooperativas."},
-                {"tema_numero": 6, "faixa_nivel": 1, "descricao": "Promover momentos informais de integração e reconhecer publicamente comportamentos colaborativos."},
-                {"tema_numero": 6, "faixa_nivel": 2, "descricao": "Implementar atividades estruturadas de team building e estabelecer normas claras de comunicação respeitosa."},
-                {"tema_numero": 6, "faixa_nivel": 3, "descricao": "Realizar treinamentos específicos em comunicação não-violenta, implementar mediação de conflitos e reorganizar equipes problemáticas."},
-                {"tema_numero": 6, "faixa_nivel": 4, "descricao": "Intervenção imediata com consultoria especializada em clima organizacional, possível remanejo de pessoas e implementação de política rigorosa anti-assédio moral."},
-                
-                # Tema 7 - Relacionamento com superiores
-                {"tema_numero": 7, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. A relação com a liderança é transparente e construtiva."},
-                {"tema_numero": 7, "faixa_nivel": 1, "descricao": "Implementar reuniões periódicas de feedback e canais simples para sugestões."},
-                {"tema_numero": 7, "faixa_nivel": 2, "descricao": "Oferecer treinamento básico em liderança e estabelecer canais seguros para feedback anônimo."},
-                {"tema_numero": 7, "faixa_nivel": 3, "descricao": "Implementar programa intensivo de desenvolvimento de lideranças, coaching para gestores e reestruturar canais de comunicação hierárquica."},
-                {"tema_numero": 7, "faixa_nivel": 4, "descricao": "Intervenção emergencial na cultura de liderança, possível substituição de gestores problemáticos e implementação de programa de transformação de liderança com acompanhamento externo."},
-                
-                # Tema 8 - Impacto na vida pessoal
-                {"tema_numero": 8, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há bom equilíbrio entre vida profissional e pessoal."},
-                {"tema_numero": 8, "faixa_nivel": 1, "descricao": "Oferecer dicas de gestão do tempo e reforçar a importância de respeitar horários de descanso."},
-                {"tema_numero": 8, "faixa_nivel": 2, "descricao": "Implementar política de flexibilidade de horários e desconexão digital após o expediente."},
-                {"tema_numero": 8, "faixa_nivel": 3, "descricao": "Revisar cargas de trabalho, estabelecer limites rígidos para contatos fora do horário e oferecer suporte para questões de conciliação familiar."},
-                {"tema_numero": 8, "faixa_nivel": 4, "descricao": "Redesenhar completamente a jornada de trabalho, implementar banco de horas obrigatório, oferecer suporte especializado para casos graves e revisar metas inatingíveis."},
-                
-                # Tema 9 - Confiança no ambiente de trabalho
-                {"tema_numero": 9, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há cultura de confiança mútua na organização."},
-                {"tema_numero": 9, "faixa_nivel": 1, "descricao": "Aumentar a transparência nas comunicações básicas e reconhecer comportamentos que demonstrem confiança."},
-                {"tema_numero": 9, "faixa_nivel": 2, "descricao": "Implementar práticas de comunicação transparente e incentivar a colaboração entre departamentos."},
-                {"tema_numero": 9, "faixa_nivel": 3, "descricao": "Realizar diagnóstico detalhado de clima, reorganizar processos que geram desconfiança e implementar gestão participativa."},
-                {"tema_numero": 9, "faixa_nivel": 4, "descricao": "Intervenção profunda na cultura organizacional, com facilitadores externos, reformulação de políticas de transparência e possível mudança na liderança sênior."},
-                
-                # Tema 10 - Clareza sobre papéis e metas
-                {"tema_numero": 10, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Os papéis e metas são claros e bem comunicados."},
-                {"tema_numero": 10, "faixa_nivel": 1, "descricao": "Revisar e atualizar descrições de cargo e clarificar expectativas de desempenho individual."},
-                {"tema_numero": 10, "faixa_nivel": 2, "descricao": "Implementar sistema regular de feedback e desenvolvimento de competências alinhadas às descrições de cargo."},
-                {"tema_numero": 10, "faixa_nivel": 3, "descricao": "Reestruturar o sistema de gestão de desempenho, com objetivos SMART e acompanhamento constante de progresso."},
-                {"tema_numero": 10, "faixa_nivel": 4, "descricao": "Redesenhar completamente os cargos e responsabilidades, implementar metodologia OKR e cascateamento claro de objetivos com verificações frequentes."},
-                
-                # Tema 11 - Impacto negativo por fatores externos
-                {"tema_numero": 11, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Os fatores externos são bem gerenciados."},
-                {"tema_numero": 11, "faixa_nivel": 1, "descricao": "Mapear principais interrupções e implementar soluções simples para minimizá-las."},
-                {"tema_numero": 11, "faixa_nivel": 2, "descricao": "Definir protocolos de comunicação entre equipes e estabelecer períodos sem interrupções."},
-                {"tema_numero": 11, "faixa_nivel": 3, "descricao": "Redesenhar interfaces entre departamentos, implementar gestão de recursos mais eficiente e criar espaços protegidos para trabalho concentrado."},
-                {"tema_numero": 11, "faixa_nivel": 4, "descricao": "Reestruturação completa dos fluxos de trabalho, revisão dos recursos disponíveis e implementação de métodos ágeis para gerenciamento de interdependências."},
-                
-                # Tema 12 - Percepção de injustiça
-                {"tema_numero": 12, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há percepção de justiça organizacional."},
-                {"tema_numero": 12, "faixa_nivel": 1, "descricao": "Aumentar a transparência nos critérios de distribuição de trabalho e reconhecimento."},
-                {"tema_numero": 12, "faixa_nivel": 2, "descricao": "Implementar sistema de sugestões com feedback obrigatório e treinar líderes em justiça organizacional."},
-                {"tema_numero": 12, "faixa_nivel": 3, "descricao": "Revisar políticas de promoção e remuneração, estabelecer comitê de avaliação imparcial e criar canal seguro para denúncias."},
-                {"tema_numero": 12, "faixa_nivel": 4, "descricao": "Reformulação completa das políticas de gestão de pessoas, com auditoria externa de equidade, implementação de ombudsman e revisão de casos históricos."},
-                
-                # Tema 13 - Desenvolvimento profissional
-                {"tema_numero": 13, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há boas oportunidades de desenvolvimento."},
-                {"tema_numero": 13, "faixa_nivel": 1, "descricao": "Comunicar melhor as oportunidades existentes e incentivar o desenvolvimento autodirigido."},
-                {"tema_numero": 13, "faixa_nivel": 2, "descricao": "Implementar planos de desenvolvimento individual e disponibilizar recursos de aprendizagem."},
-                {"tema_numero": 13, "faixa_nivel": 3, "descricao": "Desenvolver trilhas claras de carreira, estabelecer programa formal de mentoria e criar projetos para aplicação de novas competências."},
-                {"tema_numero": 13, "faixa_nivel": 4, "descricao": "Redesenhar completamente a estratégia de desenvolvimento, com orçamento dedicado, parcerias educacionais e tempo protegido para aprendizagem."},
-                
-                # Tema 14 - Participação e autonomia
-                {"tema_numero": 14, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há bom nível de autonomia e participação."},
-                {"tema_numero": 14, "faixa_nivel": 1, "descricao": "Incentivar pequenas decisões autônomas e reconhecer iniciativas individuais."},
-                {"tema_numero": 14, "faixa_nivel": 2, "descricao": "Reduzir níveis de aprovação desnecessários e criar espaços regulares para contribuições dos colaboradores."},
-                {"tema_numero": 14, "faixa_nivel": 3, "descricao": "Implementar gestão participativa estruturada, delegar responsabilidades significativas e reduzir controles excessivos."},
-                {"tema_numero": 14, "faixa_nivel": 4, "descricao": "Transformar o modelo de gestão para abordagens como sociocracia ou holocracia, com equipes autogeridas e empoderamento radical."},
-                
-                # Tema 15 - Comportamentos prejudiciais
-                {"tema_numero": 15, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O ambiente está livre de comportamentos prejudiciais."},
-                {"tema_numero": 15, "faixa_nivel": 1, "descricao": "Reforçar os valores organizacionais e oferecer treinamento básico sobre respeito no ambiente de trabalho."},
-                {"tema_numero": 15, "faixa_nivel": 2, "descricao": "Implementar política clara de consequências para comportamentos inadequados e treinar gestores para identificá-los."},
-                {"tema_numero": 15, "faixa_nivel": 3, "descricao": "Criar canal de denúncias com proteção ao denunciante, implementar programa intensivo sobre diversidade e respeito e investigar casos existentes."},
-                {"tema_numero": 15, "faixa_nivel": 4, "descricao": "Intervenção imediata com consultoria externa especializada, afastamento temporário dos agressores, suporte psicológico às vítimas e reformulação completa das políticas de conduta."},
-                
-                # Tema 16 - Saúde mental
-                {"tema_numero": 16, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Os indicadores de saúde mental são positivos."},
-                {"tema_numero": 16, "faixa_nivel": 1, "descricao": "Promover conscientização sobre saúde mental e oferecer recursos de autocuidado."},
-                {"tema_numero": 16, "faixa_nivel": 2, "descricao": "Implementar programa regular de práticas de bem-estar e disponibilizar suporte psicológico básico."},
-                {"tema_numero": 16, "faixa_nivel": 3, "descricao": "Oferecer suporte psicológico profissional, identificar e reduzir fatores de estresse organizacional e treinar líderes em saúde mental."},
-                {"tema_numero": 16, "faixa_nivel": 4, "descricao": "Intervenção emergencial com programa abrangente de saúde mental, redesenho de funções de alto impacto emocional e parceria com especialistas para casos graves."},
-                
-                # Tema 17 - Qualidade do sono
-                {"tema_numero": 17, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O trabalho não afeta negativamente o sono dos colaboradores."},
-                {"tema_numero": 17, "faixa_nivel": 1, "descricao": "Oferecer informações sobre higiene do sono e descanso adequado."},
-                {"tema_numero": 17, "faixa_nivel": 2, "descricao": "Implementar política de desconexão digital e evitar agendamento de tarefas próximo aos horários de descanso."},
-                {"tema_numero": 17, "faixa_nivel": 3, "descricao": "Revisar escalas de trabalho, eliminar expectativas de resposta fora do horário e oferecer programa de saúde do sono."},
-                {"tema_numero": 17, "faixa_nivel": 4, "descricao": "Redesenhar completamente turnos e escalas, proibir comunicações fora do horário, oferecer suporte especializado e ajustar metas para reduzir preocupações constantes."},
-                
-                # Tema 18 - Preocupação com futuro profissional
-                {"tema_numero": 18, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há segurança e perspectivas claras de futuro profissional."},
-                {"tema_numero": 18, "faixa_nivel": 1, "descricao": "Melhorar a comunicação sobre estabilidade organizacional e perspectivas de carreira."},
-                {"tema_numero": 18, "faixa_nivel": 2, "descricao": "Implementar comunicações regulares sobre o direcionamento da empresa e oferecer workshops de desenvolvimento de carreira."},
-                {"tema_numero": 18, "faixa_nivel": 3, "descricao": "Desenvolver programa estruturado de planejamento de carreira, aumentar a transparência sobre mudanças e oferecer suporte para adaptação a transformações."},
-                {"tema_numero": 18, "faixa_nivel": 4, "descricao": "Implementar programa abrangente de segurança profissional, com requalificação contínua, comunicação transparente sobre o futuro da organização e planos de contingência individuais."},
-                
-                # Tema 19 - Reconhecimento e importância do trabalho
-                {"tema_numero": 19, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. O trabalho é reconhecido e valorizado adequadamente."},
-                {"tema_numero": 19, "faixa_nivel": 1, "descricao": "Implementar práticas simples de reconhecimento e destacar o impacto do trabalho individual."},
-                {"tema_numero": 19, "faixa_nivel": 2, "descricao": "Criar programa formal de reconhecimento e conectar o trabalho individual à missão e valor da organização."},
-                {"tema_numero": 19, "faixa_nivel": 3, "descricao": "Revisar sistema de recompensas, implementar reconhecimento estruturado em múltiplos níveis e redesenhar cargos para aumentar significado."},
-                {"tema_numero": 19, "faixa_nivel": 4, "descricao": "Transformação completa da cultura de reconhecimento, com revisão do sistema de remuneração, redesenho profundo dos cargos e implementação de práticas de trabalho com propósito."},
-                
-                # Tema 20 - Satisfação geral com o trabalho
-                {"tema_numero": 20, "faixa_nivel": 0, "descricao": "Nenhum risco identificado. Há alto nível de satisfação geral com o trabalho."},
-                {"tema_numero": 20, "faixa_nivel": 1, "descricao": "Realizar pesquisas específicas para identificar pequenos pontos de melhoria na satisfação."},
-                {"tema_numero": 20, "faixa_nivel": 2, "descricao": "Implementar melhorias nos fatores mais citados de insatisfação e estabelecer grupos de trabalho para soluções."},
-                {"tema_numero": 20, "faixa_nivel": 3, "descricao": "Conduzir diagnóstico organizacional completo, implementar plano estruturado de melhoria e monitorar indicadores de engajamento."},
-                {"tema_numero": 20, "faixa_nivel": 4, "descricao": "Transformação organizacional profunda, com redesenho de processos, cultura, liderança e condições de trabalho, guiada por consultoria especializada."}
-            ]
-            
-            for rec_data in recomendacoes:
-                tema = Tema.query.filter_by(numero=rec_data["tema_numero"]).first()
-                if tema:
-                    recomendacao = Recomendacao(
-                        tema_id=tema.id, 
-                        faixa_nivel=rec_data["faixa_nivel"], 
-                        descricao=rec_data["descricao"]
-                        )
-                    db.session.add(recomendacao)
-            
-            db.session.commit()
+# Comando para gravar no banco tudo o que está na fila de cadastros, inclusive os segmentos de processos
+# encerrados (ex.: antes de voltar para CADASTRO_MODO=direto): flask --app app drenar-fila
+@app.cli.command('drenar-fila')
+def drenar_fila_comando():
+    with app.app_context():
+        print(json.dumps(drenar_fila(), ensure_ascii=False))
 
 if __name__ == '__main__':
     inicializar_db()  # Esta linha chama a função para inicializar o banco de dados
@@ -0,0 +1,277 @@
+import asyncio
+import io
+import sys
+from app import app, inicializar_db
+from banco import configurar_engine, opcoes_engine, pragmas_configurados
+from catalogo import obter_catalogo
+from instrumentacao import instrumentar_engine
+from models import db, CONEXAO_DA_REQUISICAO
+from particoes import obter_particao
+
+try:
+    import aiosqlite  # noqa: F401 (driver do engine assíncrono)
+    import greenlet  # noqa: F401 (usado pelo SQLAlchemy para executar código síncrono sobre o driver assíncrono)
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:
+    raise RuntimeError('O modo ASGI requer os pacotes aiosqlite e greenlet: pip install aiosqlite greenlet uvicorn')
+
+# Modo de serviço ASGI (asyncio), para rajadas de cadastros. Produção:
+#   uvicorn asgi:aplicacao --host 0.0.0.0 --port 5000 --workers 4
+# As rotas e os contratos JSON são os mesmos da aplicação Flask, que continua atendendo todas as rotas:
+# - POST /cadastrar_avaliacao roda a própria view do Flask no laço de eventos, sobre uma conexão do engine
+#   assíncrono (sqlite+aiosqlite) obtida com AsyncConnection.run_sync: a SessaoRoteada usa essa conexão
+#   (CONEXAO_DA_REQUISICAO no environ) e cada instrução SQL cede o laço enquanto o SQLite trabalha. Uma
+#   requisição à espera de conexão ou de trava do banco não ocupa thread; o número de threads fica limitado
+#   ao pool (uma thread do aiosqlite por conexão).
+# - GET /obter_questionario é servido no laço de eventos, da memória (catálogo carregado na inicialização).
+# - As demais rotas (relatórios, exportação, lote...) rodam na aplicação WSGI em threads do executor padrão,
+#   com o corpo da requisição e da resposta em fluxo.
+# Com particionamento, o cadastro usa o engine assíncrono da partição da empresa.
+
+# Engines assíncronos por arquivo do banco (principal e partições), criados no laço de eventos, cada um
+# com uma trava de escrita: o SQLite aceita um escritor por vez, e os cadastros de um processo esperam a
+# vez na trava (sem ocupar thread) em vez de disputar a trava do banco com busy_timeout
+_motores = {}
+_travas_escrita = {}
+
+_TAMANHO_PEDACO_RESPOSTA = 64 * 1024
+
+
+# Engine assíncrono equivalente ao engine síncrono (mesmo arquivo, pool, PRAGMAs e instrumentação) e a sua trava
+def _motor_assincrono(engine):
+    url = engine.url.set(drivername='sqlite+aiosqlite')
+    chave = url.render_as_string(hide_password=False)
+    motor = _motores.get(chave)
+    if motor is None:
+        motor = create_async_engine(url, **opcoes_engine(app.config, url))
+        configurar_engine(motor.sync_engine, pragmas_configurados(app.config))
+        instrumentar_engine(motor.sync_engine)
+        _motores[chave] = motor
+        _travas_escrita[chave] = asyncio.Lock()
+    return motor, _travas_escrita[chave]
+
+
+def _engine_do_cadastro(empresa):
+    with app.app_context():
+        if empresa is None:
+            return db.engines[None]
+        return obter_particao(empresa, criar=True)
+
+
+# Engine assíncrono (e a sua trava de escrita) onde o cadastro será gravado (a partição da empresa, com particionamento)
+async def _motor_do_cadastro(corpo):
+    empresa = None
+    if app.config['PARTICIONAMENTO'] != 'desativado':
+        try:
+            dados = app.json.loads(corpo)
+        except ValueError:
+            dados = None
+        if isinstance(dados, dict) and isinstance(dados.get('empresa'), str) and dados['empresa']:
+            empresa = dados['empresa']
+    # A criação de uma partição nova grava um arquivo; fora do laço de eventos
+    engine = await asyncio.to_thread(_engine_do_cadastro, empresa)
+    return _motor_assincrono(engine)
+
+
+# Environ WSGI da requisição ASGI
+def _environ(scope, entrada):
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': cliente[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': entrada,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1')
+        valor = valor.decode('latin-1')
+        if nome == 'content-type':
+            environ['CONTENT_TYPE'] = valor
+        elif nome == 'content-length':
+            environ['CONTENT_LENGTH'] = valor
+        else:
+            chave = 'HTTP_' + nome.upper().replace('-', '_')
+            environ[chave] = f'{environ[chave]},{valor}' if chave in environ else valor
+    return environ
+
+
+# Corpo da requisição lido do ASGI sob demanda, por uma thread do executor (rotas delegadas)
+class _CorpoDaRequisicao(io.RawIOBase):
+    def __init__(self, receive, laco):
+        self._receive = receive
+        self._laco = laco
+        self._pendente = b''
+        self._fim = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self._pendente and not self._fim:
+            mensagem = asyncio.run_coroutine_threadsafe(self._receive(), self._laco).result()
+            if mensagem['type'] == 'http.disconnect':
+                self._fim = True
+                break
+            self._pendente = mensagem.get('body', b'')
+            self._fim = not mensagem.get('more_body', False)
+        quantidade = min(len(destino), len(self._pendente))
+        destino[:quantidade] = self._pendente[:quantidade]
+        self._pendente = self._pendente[quantidade:]
+        return quantidade
+
+
+async def _ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'http.disconnect':
+            break
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body', False):
+            break
+    return b''.join(partes)
+
+
+# Chama a aplicação WSGI; retorna (status, cabeçalhos ASGI, iterável do corpo)
+def _chamar_wsgi(environ):
+    inicio = {}
+
+    def start_response(status, cabecalhos, exc_info=None):
+        inicio['status'] = int(status.split(' ', 1)[0])
+        inicio['cabecalhos'] = [
+            (nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos
+        ]
+
+    corpo = app(environ, start_response)
+    return inicio['status'], inicio['cabecalhos'], corpo
+
+
+# Executa a requisição inteira e devolve o corpo em memória (respostas pequenas das rotas assíncronas)
+def _despachar(environ):
+    status, cabecalhos, corpo = _chamar_wsgi(environ)
+    try:
+        return status, cabecalhos, b''.join(corpo)
+    finally:
+        if hasattr(corpo, 'close'):
+            corpo.close()
+
+
+# Executado por AsyncConnection.run_sync: as instruções da sessão usam a conexão do engine assíncrono
+def _despachar_na_conexao(conexao, environ):
+    environ[CONEXAO_DA_REQUISICAO] = conexao
+    return _despachar(environ)
+
+
+async def _responder(send, status, cabecalhos, corpo):
+    await send({'type': 'http.response.start', 'status': status, 'headers': cabecalhos})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+async def _cadastrar_avaliacao(scope, receive, send):
+    # Com CADASTRO_MODO=fila, o cadastro espera o fsync da fila (bloqueante) em vez do banco: roda em uma thread
+    if app.config['CADASTRO_MODO'] == 'fila':
+        await _delegar(scope, receive, send)
+        return
+    corpo = await _ler_corpo(receive)
+    environ = _environ(scope, io.BytesIO(corpo))
+    environ['CONTENT_LENGTH'] = str(len(corpo))
+    motor, trava = await _motor_do_cadastro(corpo)
+    async with trava, motor.connect() as conexao:
+        resposta = await conexao.run_sync(_despachar_na_conexao, environ)
+    await _responder(send, *resposta)
+
+
+async def _obter_questionario(scope, receive, send):
+    await _ler_corpo(receive)
+    await _responder(send, *_despachar(_environ(scope, io.BytesIO())))
+
+
+# Demais rotas: aplicação WSGI em uma thread, com a resposta enviada em pedaços enquanto é gerada
+async def _delegar(scope, receive, send):
+    laco = asyncio.get_running_loop()
+    environ = _environ(scope, _CorpoDaRequisicao(receive, laco))
+
+    def enviar(mensagem):
+        asyncio.run_coroutine_threadsafe(send(mensagem), laco).result()
+
+    def executar():
+        status, cabecalhos, corpo = _chamar_wsgi(environ)
+        try:
+            enviar({'type': 'http.response.start', 'status': status, 'headers': cabecalhos})
+            pendente = []
+            tamanho = 0
+            for parte in corpo:
+                pendente.append(parte)
+                tamanho += len(parte)
+                if tamanho >= _TAMANHO_PEDACO_RESPOSTA:
+                    enviar({'type': 'http.response.body', 'body': b''.join(pendente), 'more_body': True})
+                    pendente = []
+                    tamanho = 0
+            enviar({'type': 'http.response.body', 'body': b''.join(pendente)})
+        finally:
+            if hasattr(corpo, 'close'):
+                corpo.close()
+
+    await asyncio.to_thread(executar)
+
+
+ROTAS_ASSINCRONAS = {
+    ('GET', '/obter_questionario'): _obter_questionario,
+    ('POST', '/cadastrar_avaliacao'): _cadastrar_avaliacao,
+}
+
+
+# Inicializa o banco (e as partições) e carrega o catálogo antes de aceitar requisições
+def _iniciar():
+    inicializar_db()
+    with app.app_context():
+        obter_catalogo()
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            try:
+                await asyncio.to_thread(_iniciar)
+            except Exception as erro:
+                await send({'type': 'lifespan.startup.failed', 'message': str(erro)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            for motor in _motores.values():
+                await motor.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# Aplicação ASGI
+async def aplicacao(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise RuntimeError(f"Tipo de conexão não suportado: {scope['type']}")
+    rota = ROTAS_ASSINCRONAS.get((scope['method'], scope['path']))
+    if rota is None:
+        await _delegar(scope, receive, send)
+    else:
+        await rota(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:aplicacao', host='0.0.0.0', port=5000)
@@ -0,0 +1,152 @@
+from flask import current_app
+from sqlalchemy import func, insert, select
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel
+from agregados import atualizar_agregados
+from catalogo import obter_catalogo
+from empacotamento import compactar_respostas, respostas_para_agregados
+
+# Validação e gravação em lote de avaliações
+
+# 0=Sem impacto, 1=Desconforto leve, 2=Desconforto moderado, 3=Dor leve, 4=Dor intensa
+NIVEL_DESCONFORTO_MAXIMO = 4
+
+
+# Valores de 'selecionado' aceitos além de true/false, convertidos como na gravação pelo ORM das primeiras
+# versões da API (0/1, nulo e os textos "true"/"false")
+SELECIONADO_EQUIVALENTES = {0: False, 1: True, 'false': False, 'true': True, '0': False, '1': True}
+
+
+def _selecionado(valor):
+    if isinstance(valor, bool):
+        return valor
+    if valor is None:
+        return False
+    if isinstance(valor, str):
+        valor = valor.strip().lower()
+    elif not isinstance(valor, int):
+        return None
+    return SELECIONADO_EQUIVALENTES.get(valor)
+
+
+# Valida uma avaliação recebida; retorna a mensagem de erro ou None se estiver válida.
+# Normaliza as respostas da avaliação válida: 'selecionado' passa a booleano e, quando um tema ou subtema é
+# respondido mais de uma vez, vale a primeira resposta (as repetições são descartadas)
+def validar_avaliacao(dados):
+    if not isinstance(dados, dict):
+        return 'A avaliação deve ser um objeto JSON.'
+    for campo in ('empresa', 'departamento'):
+        valor = dados.get(campo)
+        if not isinstance(valor, str) or not valor.strip() or len(valor) > 100:
+            return f"Campo '{campo}' obrigatório (texto de até 100 caracteres)."
+    funcao = dados.get('funcao')
+    if funcao is not None and (not isinstance(funcao, str) or len(funcao) > 100):
+        return "Campo 'funcao' deve ser um texto de até 100 caracteres."
+
+    catalogo = obter_catalogo()
+    respostas_nivel1 = dados.get('respostas_nivel1')
+    if not isinstance(respostas_nivel1, list):
+        return "Campo 'respostas_nivel1' deve ser uma lista."
+    normalizadas_nivel1 = {}
+    for resposta in respostas_nivel1:
+        if not isinstance(resposta, dict) or resposta.get('tema_id') not in catalogo.temas:
+            return 'Resposta de primeiro nível com tema_id inválido.'
+        selecionado = _selecionado(resposta.get('selecionado'))
+        if selecionado is None:
+            return "Resposta de primeiro nível com 'selecionado' inválido."
+        normalizadas_nivel1.setdefault(resposta['tema_id'], {**resposta, 'selecionado': selecionado})
+
+    respostas_nivel2 = dados.get('respostas_nivel2')
+    if not isinstance(respostas_nivel2, list):
+        return "Campo 'respostas_nivel2' deve ser uma lista."
+    normalizadas_nivel2 = {}
+    for resposta in respostas_nivel2:
+        if not isinstance(resposta, dict) or resposta.get('subtema_id') not in catalogo.subtemas:
+            return 'Resposta de segundo nível com subtema_id inválido.'
+        nivel = resposta.get('nivel_desconforto')
+        if isinstance(nivel, bool) or not isinstance(nivel, int) or not 0 <= nivel <= NIVEL_DESCONFORTO_MAXIMO:
+            return f"Resposta de segundo nível com 'nivel_desconforto' fora do intervalo 0-{NIVEL_DESCONFORTO_MAXIMO}."
+        normalizadas_nivel2.setdefault(resposta['subtema_id'], resposta)
+
+    dados['respostas_nivel1'] = list(normalizadas_nivel1.values())
+    dados['respostas_nivel2'] = list(normalizadas_nivel2.values())
+    return None
+
+
+# Linha da tabela avaliacao; sem `data`, data_avaliacao recebe o padrão do modelo (o momento da gravação)
+def _linha_avaliacao(dados, data):
+    linha = {'empresa': dados['empresa'], 'departamento': dados['departamento'], 'funcao': dados.get('funcao') or ''}
+    if data is not None:
+        linha['data_avaliacao'] = data
+    return linha
+
+
+# Insere um bloco de avaliações já validadas com executemany (sem commit); retorna os ids na mesma ordem.
+# `datas` (opcional, na ordem das avaliações) define data_avaliacao, como o momento do recebimento na fila
+def inserir_avaliacoes(avaliacoes, datas=None):
+    datas = datas or [None] * len(avaliacoes)
+    if current_app.config['ARMAZENAMENTO_RESPOSTAS'] == 'compacto':
+        return _inserir_compactas(avaliacoes, datas)
+
+    tabela = Avaliacao.__table__
+    ids = db.session.execute(
+        insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True),
+        [_linha_avaliacao(dados, data) for dados, data in zip(avaliacoes, datas)]
+    ).scalars().all()
+
+    respostas_nivel1 = [
+        {'avaliacao_id': avaliacao_id, 'tema_id': resposta['tema_id'], 'selecionado': resposta['selecionado']}
+        for avaliacao_id, dados in zip(ids, avaliacoes)
+        for resposta in dados['respostas_nivel1']
+    ]
+    respostas_nivel2 = [
+        {'avaliacao_id': avaliacao_id, 'subtema_id': resposta['subtema_id'],
+         'nivel_desconforto': resposta['nivel_desconforto']}
+        for avaliacao_id, dados in zip(ids, avaliacoes)
+        for resposta in dados['respostas_nivel2']
+    ]
+    # A inserção das avaliações já garantiu a trava de escrita do SQLite, então os ids das
+    # respostas podem ser atribuídos a partir do maior id atual (executemany sem RETURNING)
+    for modelo, linhas in ((RespostaPrimeiroNivel, respostas_nivel1), (RespostaSegundoNivel, respostas_nivel2)):
+        if linhas:
+            maior_id = db.session.execute(select(func.coalesce(func.max(modelo.id), 0))).scalar()
+            for deslocamento, linha in enumerate(linhas, start=1):
+                linha['id'] = maior_id + deslocamento
+            db.session.execute(insert(modelo.__table__), linhas)
+
+    # Agregados do relatório atualizados na mesma transação
+    atualizar_agregados(
+        [{'id': avaliacao_id, 'empresa': dados['empresa'], 'departamento': dados['departamento']}
+         for avaliacao_id, dados in zip(ids, avaliacoes)],
+        respostas_nivel1,
+        respostas_nivel2
+    )
+    return ids
+
+
+# Variante de inserir_avaliacoes para o armazenamento compacto (sem linhas de respostas)
+def _inserir_compactas(avaliacoes, datas):
+    catalogo = obter_catalogo()
+    linhas = []
+    for dados, data in zip(avaliacoes, datas):
+        mascara, blob = compactar_respostas(dados['respostas_nivel1'], dados['respostas_nivel2'], catalogo)
+        linhas.append({**_linha_avaliacao(dados, data), 'temas_selecionados': mascara, 'niveis_subtemas': blob})
+    tabela = Avaliacao.__table__
+    ids = db.session.execute(
+        insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas
+    ).scalars().all()
+
+    respostas_nivel1 = []
+    respostas_nivel2 = []
+    for avaliacao_id, linha in zip(ids, linhas):
+        nivel1, nivel2 = respostas_para_agregados(
+            avaliacao_id, linha['temas_selecionados'], linha['niveis_subtemas'], catalogo
+        )
+        respostas_nivel1.extend(nivel1)
+        respostas_nivel2.extend(nivel2)
+    atualizar_agregados(
+        [{'id': avaliacao_id, 'empresa': linha['empresa'], 'departamento': linha['departamento']}
+         for avaliacao_id, linha in zip(ids, linhas)],
+        respostas_nivel1,
+        respostas_nivel2
+    )
+    return ids
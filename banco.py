@@ -0,0 +1,81 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models import db
+
+# Perfis do SQLite aplicados no momento da conexão.
+# 'producao': WAL (leituras não bloqueiam escritas), sincronização NORMAL, espera em vez de
+# "database is locked", mmap e cache maiores e tabelas temporárias em memória.
+# 'compatibilidade': mantém o journal padrão do SQLite e só define a espera por travas.
+PERFIS_SQLITE = {
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,          # milissegundos
+        'mmap_size': 256 * 1024 * 1024,  # bytes
+        'cache_size': -64 * 1024,      # negativo = KiB
+        'temp_store': 'MEMORY',
+    },
+    'compatibilidade': {
+        'busy_timeout': 5000,
+    },
+}
+
+
+# Opções de create_engine para a URL: o dimensionamento do pool (POOL_CONEXOES) só vale para bancos em
+# arquivo; os bancos SQLite em memória usam um StaticPool, que não aceita essas opções
+def opcoes_engine(config, url):
+    opcoes = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        for nome in config['POOL_CONEXOES']:
+            opcoes.pop(nome, None)
+    else:
+        opcoes.update(config['POOL_CONEXOES'])
+    return opcoes
+
+
+# Opções do engine principal conforme a URL do banco; deve ser chamada antes de db.init_app
+def preparar_banco(app):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+# Combina o perfil escolhido com os PRAGMAs sobrescritos na configuração
+def pragmas_configurados(config):
+    perfil = config.get('SQLITE_PERFIL', 'producao')
+    if perfil not in PERFIS_SQLITE:
+        raise ValueError(f"Perfil do SQLite desconhecido: {perfil}")
+    pragmas = dict(PERFIS_SQLITE[perfil])
+    pragmas.update(config.get('SQLITE_PRAGMAS') or {})
+    return pragmas
+
+
+# Executa os PRAGMAs em uma conexão DB-API recém-aberta
+def aplicar_pragmas(conexao_dbapi, pragmas, em_memoria=False):
+    cursor = conexao_dbapi.cursor()
+    try:
+        for nome, valor in pragmas.items():
+            # Bancos em memória não têm journal em arquivo nem mmap
+            if em_memoria and nome in ('journal_mode', 'mmap_size'):
+                continue
+            cursor.execute(f'PRAGMA {nome}={valor}')
+    finally:
+        cursor.close()
+
+
+# Registra a aplicação dos PRAGMAs em um engine SQLite
+def configurar_engine(engine, pragmas):
+    if engine.dialect.name != 'sqlite':
+        return
+    em_memoria = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(conexao_dbapi, _registro):
+        aplicar_pragmas(conexao_dbapi, pragmas, em_memoria)
+
+
+# Aplica o perfil do SQLite a todos os engines da aplicação
+def configurar_banco(app):
+    pragmas = pragmas_configurados(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            configurar_engine(engine, pragmas)
@@ -0,0 +1,79 @@
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Utilitários compartilhados pelos benchmarks: aplicação sobre um banco temporário,
+# contagem de consultas SQL, percentis e descrição do ambiente da execução.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Importa a aplicação de novo apontando para o banco informado; `configuracoes` viram variáveis
+# de ambiente lidas por config.py (ex.: ARMAZENAMENTO_RESPOSTAS='compacto')
+def criar_aplicacao(caminho, **configuracoes):
+    os.environ['DATABASE_URL'] = f'sqlite:///{caminho}'
+    for nome, valor in configuracoes.items():
+        os.environ[nome] = str(valor)
+    for modulo in [nome for nome in sys.modules if nome in ('app', 'config')]:
+        del sys.modules[modulo]
+    from app import app, inicializar_db
+    inicializar_db()
+    return app
+
+
+# Tamanho do banco somando o arquivo de WAL (perfil 'producao')
+def tamanho_banco(caminho):
+    return sum(os.path.getsize(arquivo) for arquivo in (caminho, caminho + '-wal') if os.path.exists(arquivo))
+
+
+# Conta as instruções SQL executadas no engine enquanto o bloco está ativo
+class ContadorConsultas:
+    def __init__(self):
+        self.total = 0
+
+    def _contar(self, *_argumentos):
+        self.total += 1
+
+
+@contextmanager
+def contar_consultas(engine):
+    contador = ContadorConsultas()
+    event.listen(engine, 'before_cursor_execute', contador._contar)
+    try:
+        yield contador
+    finally:
+        event.remove(engine, 'before_cursor_execute', contador._contar)
+
+
+# Percentil com interpolação linear sobre valores já ordenados
+def percentil(ordenados, fracao):
+    if not ordenados:
+        return None
+    posicao = (len(ordenados) - 1) * fracao
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Identifica a execução para a comparação entre rodadas
+def descrever_ambiente():
+    return {
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+    }
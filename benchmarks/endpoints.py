@@ -0,0 +1,159 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from benchmarks.comum import criar_aplicacao, contar_consultas, descrever_ambiente, percentil, tamanho_banco
+from benchmarks.gerador import gerar_avaliacoes, nomes_departamentos, nomes_empresas, popular_banco
+
+# Benchmark dos endpoints principais (obter_questionario, cadastrar_avaliacao e gerar_relatorio)
+# sobre um banco SQLite temporário populado pelo gerador sintético. Uso, a partir da raiz do projeto:
+#   python -m benchmarks.endpoints --avaliacoes 100000 --requisicoes 200 --saida resultado.json
+#   python -m benchmarks.endpoints --avaliacoes 100000 --comparar resultado.json
+# Para cada endpoint: percentis de latência (ms), vazão (requisições/s) e consultas SQL por requisição.
+
+ENDPOINTS = ('obter_questionario', 'cadastrar_avaliacao', 'gerar_relatorio')
+
+
+# Requisições de cada endpoint; o relatório alterna entre todas as avaliações, uma empresa e um departamento
+def _requisicoes(endpoint, quantidade, argumentos):
+    if endpoint == 'obter_questionario':
+        return [('GET', '/obter_questionario', None)] * quantidade
+    if endpoint == 'cadastrar_avaliacao':
+        return [
+            ('POST', '/cadastrar_avaliacao', dados)
+            for dados in gerar_avaliacoes(quantidade, argumentos.empresas, argumentos.departamentos,
+                                          semente=argumentos.semente + 1)
+        ]
+    empresas = nomes_empresas(argumentos.empresas)
+    departamentos = nomes_departamentos(argumentos.departamentos)
+    filtros = [''] + [f'?empresa={empresa}' for empresa in empresas] + [
+        f'?empresa={empresa}&departamento={departamento}' for empresa in empresas for departamento in departamentos
+    ]
+    return [('GET', '/gerar_relatorio' + filtros[indice % len(filtros)], None) for indice in range(quantidade)]
+
+
+def _medir_endpoint(app, cliente, requisicoes):
+    latencias = []
+    consultas = []
+    estados = {}
+    with app.app_context():
+        from models import db
+        engine = db.engine
+    inicio_total = time.perf_counter()
+    for metodo, caminho, dados in requisicoes:
+        with contar_consultas(engine) as contador, redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            resposta = cliente.open(caminho, method=metodo, json=dados)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        if resposta.status_code >= 500:
+            raise RuntimeError(f'{metodo} {caminho} retornou {resposta.status_code}: {resposta.get_data(as_text=True)}')
+        estados[resposta.status_code] = estados.get(resposta.status_code, 0) + 1
+        consultas.append(contador.total)
+    duracao = time.perf_counter() - inicio_total
+
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias),
+        'respostas_por_status': {str(estado): total for estado, total in sorted(estados.items())},
+        'latencia_ms': {
+            'media': round(sum(latencias) / len(latencias), 3),
+            'p50': round(percentil(latencias, 0.50), 3),
+            'p90': round(percentil(latencias, 0.90), 3),
+            'p95': round(percentil(latencias, 0.95), 3),
+            'p99': round(percentil(latencias, 0.99), 3),
+            'max': round(latencias[-1], 3),
+        },
+        'vazao_rps': round(len(latencias) / duracao, 1),
+        'consultas_sql': {
+            'media': round(sum(consultas) / len(consultas), 2),
+            'max': max(consultas),
+        },
+    }
+
+
+def executar(argumentos, diretorio):
+    caminho = os.path.join(diretorio, 'benchmark_endpoints.db')
+    app = criar_aplicacao(
+        caminho,
+        ARMAZENAMENTO_RESPOSTAS=argumentos.armazenamento,
+        RELATORIO_MOTOR=argumentos.motor,
+        RELATORIO_CACHE_TAMANHO=argumentos.cache_relatorio,
+        # Avaliações geradas podem coincidir; o benchmark mede cadastros, não a deduplicação
+        IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS=0,
+    )
+    with app.app_context():
+        inicio = time.perf_counter()
+        popular_banco(argumentos.avaliacoes, argumentos.empresas, argumentos.departamentos, argumentos.semente)
+        carga = time.perf_counter() - inicio
+
+    cliente = app.test_client()
+    resultado = {
+        'ambiente': descrever_ambiente(),
+        'parametros': vars(argumentos) | {'saida': None, 'comparar': None},
+        'carga': {'segundos': round(carga, 2), 'tamanho_banco_mb': round(tamanho_banco(caminho) / 2 ** 20, 1)},
+        'endpoints': {},
+    }
+    for endpoint in argumentos.endpoints:
+        # Aquecimento (catálogo em memória, cache de instruções do SQLAlchemy) fora da medição
+        _medir_endpoint(app, cliente, _requisicoes(endpoint, argumentos.aquecimento, argumentos))
+        resultado['endpoints'][endpoint] = _medir_endpoint(
+            app, cliente, _requisicoes(endpoint, argumentos.requisicoes, argumentos)
+        )
+    with app.app_context():
+        from models import db
+        db.engine.dispose()
+    return resultado
+
+
+# Razões entre a execução atual e uma anterior (abaixo de 1 = mais rápido / menos consultas)
+def comparar(atual, anterior):
+    comparacao = {}
+    for endpoint, medidas in atual['endpoints'].items():
+        base = anterior.get('endpoints', {}).get(endpoint)
+        if base is None:
+            continue
+        comparacao[endpoint] = {
+            'p50': round(medidas['latencia_ms']['p50'] / base['latencia_ms']['p50'], 2),
+            'p95': round(medidas['latencia_ms']['p95'] / base['latencia_ms']['p95'], 2),
+            'vazao': round(medidas['vazao_rps'] / base['vazao_rps'], 2),
+            'consultas_sql': round(medidas['consultas_sql']['media'] / base['consultas_sql']['media'], 2)
+            if base['consultas_sql']['media'] else None,
+        }
+    return {'base': anterior.get('ambiente', {}).get('commit'), 'razoes': comparacao}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints principais')
+    parser.add_argument('--avaliacoes', type=int, default=10000, help='avaliações geradas antes da medição')
+    parser.add_argument('--empresas', type=int, default=5)
+    parser.add_argument('--departamentos', type=int, default=10, help='departamentos por empresa')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições medidas por endpoint')
+    parser.add_argument('--aquecimento', type=int, default=10)
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--armazenamento', choices=['linhas', 'compacto'], default='linhas')
+    parser.add_argument('--motor', choices=['agregados', 'sql', 'numpy'], default='agregados')
+    parser.add_argument('--cache-relatorio', type=int, default=0,
+                        help='entradas do cache do relatório (0 mede o cálculo a cada requisição)')
+    parser.add_argument('--saida', help='grava o resultado em JSON neste arquivo')
+    parser.add_argument('--comparar', help='resultado JSON de uma execução anterior')
+    argumentos = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        resultado = executar(argumentos, diretorio)
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as arquivo:
+            resultado['comparacao'] = comparar(resultado, json.load(arquivo))
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+    print(texto)
+
+
+if __name__ == '__main__':
+    main()
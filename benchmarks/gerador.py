@@ -0,0 +1,81 @@
+import random
+from models import db
+from catalogo import obter_catalogo
+from avaliacoes import inserir_avaliacoes, NIVEL_DESCONFORTO_MAXIMO
+
+# Gerador determinístico de avaliações sintéticas sobre o catálogo real (criado por inicializar_db).
+# Cada empresa e cada departamento têm um fator de risco, e cada tema tem uma prevalência própria:
+# departamentos mais expostos selecionam mais temas e respondem níveis de desconforto mais altos.
+# Os subtemas são respondidos apenas nos temas selecionados, como no questionário.
+
+FUNCOES = ('Analista', 'Assistente', 'Coordenador', 'Gerente', 'Operador', 'Técnico')
+
+# Pesos dos níveis de desconforto (0 a 4) para um respondente de risco baixo e de risco alto
+PESOS_NIVEIS_BAIXO = (0.40, 0.30, 0.18, 0.09, 0.03)
+PESOS_NIVEIS_ALTO = (0.10, 0.20, 0.30, 0.25, 0.15)
+
+
+def nomes_empresas(empresas):
+    return [f'Empresa {numero}' for numero in range(1, empresas + 1)]
+
+
+def nomes_departamentos(departamentos):
+    return [f'Departamento {numero}' for numero in range(1, departamentos + 1)]
+
+
+# Gera `quantidade` avaliações no formato do /cadastrar_avaliacao; a mesma semente gera as mesmas avaliações
+def gerar_avaliacoes(quantidade, empresas=5, departamentos=10, semente=0):
+    catalogo = obter_catalogo()
+    aleatorio = random.Random(semente)
+    subtemas_por_tema = {tema_id: [] for tema_id in catalogo.temas}
+    for subtema_id, subtema in catalogo.subtemas.items():
+        subtemas_por_tema[subtema['tema_id']].append(subtema_id)
+
+    prevalencia = {tema_id: aleatorio.uniform(0.1, 0.5) for tema_id in catalogo.temas}
+    fator_empresa = {nome: aleatorio.uniform(0.6, 1.4) for nome in nomes_empresas(empresas)}
+    fator_departamento = {
+        (empresa, departamento): aleatorio.uniform(0.7, 1.3)
+        for empresa in fator_empresa for departamento in nomes_departamentos(departamentos)
+    }
+    # Empresas e departamentos de tamanhos diferentes (distribuição de Zipf aproximada)
+    recortes = list(fator_departamento)
+    pesos_recortes = [1 / posicao for posicao in range(1, len(recortes) + 1)]
+    aleatorio.shuffle(recortes)
+
+    for _ in range(quantidade):
+        empresa, departamento = aleatorio.choices(recortes, pesos_recortes)[0]
+        risco = min(fator_empresa[empresa] * fator_departamento[(empresa, departamento)] * aleatorio.uniform(0.7, 1.3), 2.0)
+        mistura = min(max((risco - 0.5) / 1.5, 0.0), 1.0)
+        pesos_niveis = [baixo + (alto - baixo) * mistura for baixo, alto in zip(PESOS_NIVEIS_BAIXO, PESOS_NIVEIS_ALTO)]
+
+        respostas_nivel1 = []
+        respostas_nivel2 = []
+        for tema_id in catalogo.temas:
+            selecionado = aleatorio.random() < min(prevalencia[tema_id] * risco, 0.95)
+            respostas_nivel1.append({'tema_id': tema_id, 'selecionado': selecionado})
+            if selecionado:
+                for subtema_id in subtemas_por_tema[tema_id]:
+                    nivel = aleatorio.choices(range(NIVEL_DESCONFORTO_MAXIMO + 1), pesos_niveis)[0]
+                    respostas_nivel2.append({'subtema_id': subtema_id, 'nivel_desconforto': nivel})
+
+        yield {
+            'empresa': empresa,
+            'departamento': departamento,
+            'funcao': aleatorio.choice(FUNCOES),
+            'respostas_nivel1': respostas_nivel1,
+            'respostas_nivel2': respostas_nivel2,
+        }
+
+
+# Grava as avaliações geradas em blocos (um commit por bloco); requer o contexto da aplicação
+def popular_banco(quantidade, empresas=5, departamentos=10, semente=0, tamanho_bloco=5000):
+    bloco = []
+    for dados in gerar_avaliacoes(quantidade, empresas, departamentos, semente):
+        bloco.append(dados)
+        if len(bloco) == tamanho_bloco:
+            inserir_avaliacoes(bloco)
+            db.session.commit()
+            bloco = []
+    if bloco:
+        inserir_avaliacoes(bloco)
+        db.session.commit()
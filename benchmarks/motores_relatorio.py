@@ -0,0 +1,74 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from benchmarks.comum import criar_aplicacao, tamanho_banco
+from benchmarks.gerador import popular_banco
+
+# Benchmark dos motores do relatório (agregados, sql e numpy) em bancos sintéticos.
+# Uso, a partir da raiz do projeto:
+#   python -m benchmarks.motores_relatorio --tamanhos 10000 100000 1000000 --armazenamento linhas
+# Cada tamanho gera um banco novo em um diretório temporário; o resultado sai em JSON.
+
+MOTORES = ('agregados', 'sql', 'numpy')
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return round(min(tempos), 4)
+
+
+def executar(tamanho, armazenamento, repeticoes, diretorio):
+    caminho = os.path.join(diretorio, f'benchmark_{tamanho}.db')
+    # Sem o cache do relatório: cada repetição mede o cálculo
+    app = criar_aplicacao(caminho, ARMAZENAMENTO_RESPOSTAS=armazenamento, RELATORIO_CACHE_TAMANHO=0)
+    from models import db
+
+    with app.app_context():
+        inicio = time.perf_counter()
+        popular_banco(tamanho, semente=tamanho)
+        carga = time.perf_counter() - inicio
+
+    cliente = app.test_client()
+    resultado = {'avaliacoes': tamanho, 'armazenamento': armazenamento, 'carga_segundos': round(carga, 2),
+                 'tamanho_banco_mb': round(tamanho_banco(caminho) / 2 ** 20, 1), 'relatorio_segundos': {}}
+    for filtro in ('', '?empresa=Empresa 1', '?empresa=Empresa 1&departamento=Departamento 1'):
+        tempos = {}
+        for motor in MOTORES:
+            app.config['RELATORIO_MOTOR'] = motor
+            tempos[motor] = _medir(lambda: cliente.get('/gerar_relatorio' + filtro), repeticoes)
+        tempos['ganho_numpy_sobre_sql'] = round(tempos['sql'] / tempos['numpy'], 1)
+        resultado['relatorio_segundos'][filtro or 'todas'] = tempos
+    with app.app_context():
+        db.engine.dispose()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos motores do relatório')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--armazenamento', choices=['linhas', 'compacto'], default='linhas')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    argumentos = parser.parse_args()
+    from relatorio_numpy import numpy_disponivel
+    if not numpy_disponivel():
+        parser.error('o motor numpy requer o pacote numpy (pip install numpy).')
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        resultados = [
+            executar(tamanho, argumentos.armazenamento, argumentos.repeticoes, diretorio)
+            for tamanho in argumentos.tamanhos
+        ]
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from benchmarks.comum import RAIZ, criar_aplicacao, descrever_ambiente, percentil
+from benchmarks.gerador import gerar_avaliacoes
+
+# Teste de carga local de uma rajada de cadastros: sobe o servidor em um subprocesso, sobre um banco
+# SQLite temporário, e envia POST /cadastrar_avaliacao por `--conexoes` conexões HTTP/1.1 simultâneas
+# (keep-alive), intercalados com GET /obter_questionario. Uso, a partir da raiz do projeto:
+#   python -m benchmarks.rajada_cadastros --servidor asgi --cadastros 5000 --conexoes 200
+#   python -m benchmarks.rajada_cadastros --servidor flask --cadastros 5000 --conexoes 200
+# 'asgi' usa uvicorn asgi:aplicacao; 'flask' usa o servidor de desenvolvimento (python app.py, uma thread
+# por conexão). O resultado traz vazão, percentis de latência, respostas por status, avaliações gravadas
+# e o pico de threads do processo servidor durante a rajada. Com --cadastro fila (CADASTRO_MODO=fila), o
+# teste espera a fila ser gravada no banco e informa também o tempo até a última avaliação ser gravada.
+
+PORTA = 5057
+
+
+def _comando_servidor(servidor, argumentos):
+    if servidor == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:aplicacao', '--port', str(PORTA), '--log-level', 'warning',
+                '--workers', str(argumentos.processos), '--backlog', str(max(argumentos.conexoes * 2, 2048))]
+    codigo = f'from app import app; app.run(port={PORTA}, threaded=True)'
+    return [sys.executable, '-c', codigo]
+
+
+def _esperar_servidor(processo, limite=60):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError('O servidor terminou durante a inicialização.')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{PORTA}/obter_questionario', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('O servidor não respondeu a tempo.')
+
+
+# Soma das threads do servidor e dos seus processos filhos (workers do uvicorn)
+def _threads(pid):
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children', encoding='ascii') as arquivo:
+            pids += [int(filho) for filho in arquivo.read().split()]
+    except OSError:
+        pass
+    for atual in pids:
+        try:
+            with open(f'/proc/{atual}/status', encoding='ascii') as arquivo:
+                total += next(int(linha.split()[1]) for linha in arquivo if linha.startswith('Threads:'))
+        except (OSError, StopIteration):
+            pass
+    return total
+
+
+async def _requisicao(leitor, escritor, metodo, caminho, corpo):
+    cabecalhos = f'{metodo} {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n'
+    if corpo is not None:
+        cabecalhos += f'Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n'
+    escritor.write(cabecalhos.encode('ascii') + b'\r\n' + (corpo or b''))
+    await escritor.drain()
+    linha = await leitor.readline()
+    if not linha:
+        raise ConnectionError('Conexão encerrada pelo servidor.')
+    status = int(linha.split()[1])
+    tamanho = 0
+    fechar = False
+    while True:
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        if nome.lower() == 'content-length':
+            tamanho = int(valor)
+        elif nome.lower() == 'connection' and valor.strip().lower() == 'close':
+            fechar = True
+    await leitor.readexactly(tamanho)
+    return status, fechar
+
+
+async def _cliente(fila, resultados):
+    conexao = None
+    while True:
+        try:
+            metodo, caminho, corpo = fila.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        inicio = time.perf_counter()
+        try:
+            if conexao is None:
+                conexao = await asyncio.open_connection('127.0.0.1', PORTA)
+            status, fechar = await _requisicao(*conexao, metodo, caminho, corpo)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as erro:
+            status, fechar = type(erro).__name__, True
+        resultados.append((caminho, status, (time.perf_counter() - inicio) * 1000))
+        if fechar and conexao is not None:
+            conexao[1].close()
+            conexao = None
+    if conexao is not None:
+        conexao[1].close()
+
+
+# Espera a ingestão gravar a fila inteira (medidor do /metrics, calculado sobre o diretório da fila)
+def _esperar_fila(limite=600):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        with urllib.request.urlopen(f'http://127.0.0.1:{PORTA}/metrics', timeout=10) as resposta:
+            if 'rp_fila_cadastros_pendentes_bytes 0\n' in resposta.read().decode('utf-8'):
+                return
+        time.sleep(0.1)
+    raise RuntimeError('A fila não foi gravada a tempo.')
+
+
+async def _rajada(requisicoes, conexoes, pid):
+    fila = asyncio.Queue()
+    for requisicao in requisicoes:
+        fila.put_nowait(requisicao)
+    resultados = []
+    pico_threads = _threads(pid)
+
+    async def amostrar():
+        nonlocal pico_threads
+        while True:
+            await asyncio.sleep(0.1)
+            pico_threads = max(pico_threads, _threads(pid))
+
+    amostragem = asyncio.create_task(amostrar())
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente(fila, resultados) for _ in range(conexoes)))
+    duracao = time.perf_counter() - inicio
+    amostragem.cancel()
+    return resultados, duracao, pico_threads
+
+
+def _resumo(resultados, caminho):
+    latencias = sorted(latencia for atual, _, latencia in resultados if atual == caminho)
+    estados = {}
+    for atual, status, _ in resultados:
+        if atual == caminho:
+            estados[str(status)] = estados.get(str(status), 0) + 1
+    if not latencias:
+        return None
+    return {
+        'requisicoes': len(latencias),
+        'respostas_por_status': dict(sorted(estados.items())),
+        'latencia_ms': {
+            'p50': round(percentil(latencias, 0.50), 1),
+            'p95': round(percentil(latencias, 0.95), 1),
+            'p99': round(percentil(latencias, 0.99), 1),
+            'max': round(latencias[-1], 1),
+        },
+    }
+
+
+def executar(argumentos, diretorio):
+    caminho = os.path.join(diretorio, 'rajada.db')
+    configuracoes = {'IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS': 0, 'LOG_NIVEL': 'WARNING', 'CADASTRO_MODO': argumentos.cadastro}
+    app = criar_aplicacao(caminho, **configuracoes)
+    with app.app_context():
+        corpos = [json.dumps(dados).encode('utf-8') for dados in gerar_avaliacoes(argumentos.cadastros, semente=7)]
+    requisicoes = []
+    for indice, corpo in enumerate(corpos):
+        requisicoes.append(('POST', '/cadastrar_avaliacao', corpo))
+        if argumentos.questionarios and indice % argumentos.questionarios == 0:
+            requisicoes.append(('GET', '/obter_questionario', None))
+
+    ambiente = dict(os.environ, DATABASE_URL=f'sqlite:///{caminho}', **{nome: str(valor) for nome, valor in configuracoes.items()})
+    processo = subprocess.Popen(_comando_servidor(argumentos.servidor, argumentos), cwd=RAIZ, env=ambiente)
+    try:
+        _esperar_servidor(processo)
+        threads_antes = _threads(processo.pid)
+        inicio = time.perf_counter()
+        resultados, duracao, pico_threads = asyncio.run(_rajada(requisicoes, argumentos.conexoes, processo.pid))
+        if argumentos.cadastro == 'fila':
+            _esperar_fila()
+        gravacao = time.perf_counter() - inicio
+    finally:
+        processo.terminate()
+        processo.wait(30)
+
+    import sqlite3
+    with sqlite3.connect(caminho) as conexao:
+        gravadas = conexao.execute('SELECT count(*) FROM avaliacao').fetchone()[0]
+    return {
+        'ambiente': descrever_ambiente(),
+        'parametros': vars(argumentos),
+        'duracao_s': round(duracao, 2),
+        'cadastros_por_segundo': round(sum(1 for caminho_, _, _ in resultados if caminho_ == '/cadastrar_avaliacao') / duracao, 1),
+        'avaliacoes_gravadas': gravadas,
+        'gravacao_completa_s': round(gravacao, 2),
+        'threads_servidor': {'antes': threads_antes, 'pico': pico_threads},
+        'cadastrar_avaliacao': _resumo(resultados, '/cadastrar_avaliacao'),
+        'obter_questionario': _resumo(resultados, '/obter_questionario'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de uma rajada de cadastros')
+    parser.add_argument('--servidor', choices=['asgi', 'flask'], default='asgi')
+    parser.add_argument('--cadastros', type=int, default=2000)
+    parser.add_argument('--conexoes', type=int, default=200, help='conexões simultâneas dos clientes')
+    parser.add_argument('--questionarios', type=int, default=1,
+                        help='um GET /obter_questionario a cada N cadastros (0 desativa)')
+    parser.add_argument('--cadastro', choices=['direto', 'fila'], default='direto',
+                        help='CADASTRO_MODO do servidor')
+    parser.add_argument('--processos', type=int, default=1, help='workers do uvicorn (modo asgi)')
+    parser.add_argument('--saida', help='grava o resultado em JSON neste arquivo')
+    argumentos = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        resultado = executar(argumentos, diretorio)
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+    print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Cache em memória com limite de tamanho (LRU) e expiração opcional por item (TTL),
+# seguro para uso concorrente entre threads.
+
+
+class CacheLRU:
+    def __init__(self, tamanho_maximo):
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    # Retorna o valor guardado ou None (itens expirados são descartados)
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                valor, expira_em = item
+                if expira_em is None or expira_em > time.monotonic():
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self._itens[chave]
+            self.falhas += 1
+            return None
+
+    # Guarda um valor; ttl em segundos (None = sem expiração)
+    def guardar(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + ttl if ttl is not None else None
+        with self._trava:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
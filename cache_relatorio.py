@@ -0,0 +1,67 @@
+import hashlib
+import json
+from flask import current_app
+from sqlalchemy import func, select
+from models import db, GeracaoRelatorio
+from cache import CacheLRU
+from compressao import CargaImutavel
+from relatorio import _filtrar, executar_relatorio
+from particoes import reunir_particoes
+
+# Cache das respostas do /gerar_relatorio, já serializadas, em cada processo.
+# A chave combina os parâmetros normalizados com a geração dos departamentos do recorte
+# (tabela geracao_relatorio, incrementada na mesma transação de cada cadastro), então uma
+# escrita feita por qualquer processo invalida as entradas afetadas em todos os outros.
+
+_cache = None
+
+
+def _obter_cache():
+    global _cache
+    if _cache is None:
+        _cache = CacheLRU(current_app.config['RELATORIO_CACHE_TAMANHO'])
+    return _cache
+
+
+# Soma das gerações dos departamentos do recorte; só cresce quando algum deles é alterado
+def geracao_recorte(empresa=None, departamento=None):
+    consulta = _filtrar(select(func.coalesce(func.sum(GeracaoRelatorio.geracao), 0)), empresa, departamento,
+                        modelo=GeracaoRelatorio)
+    # Com particionamento, a soma das gerações de todas as partições consultadas pelo relatório
+    return sum(reunir_particoes(lambda: db.session.execute(consulta).scalar(), empresa))
+
+
+# Retorna o relatório serializado (CargaImutavel com ETag do conteúdo), do cache quando a geração
+# do recorte não mudou; as variantes comprimidas ficam guardadas junto com a entrada
+def obter_relatorio(parametros):
+    chave = (
+        json.dumps(parametros, sort_keys=True, separators=(',', ':'), ensure_ascii=False),
+        geracao_recorte(parametros['empresa'], parametros['departamento'])
+    )
+    ativo = current_app.config['RELATORIO_CACHE_TAMANHO'] > 0
+    if ativo:
+        guardado = _obter_cache().obter(chave)
+        if guardado is not None:
+            return guardado
+
+    corpo = current_app.json.response(executar_relatorio(parametros)).get_data()
+    guardado = CargaImutavel(corpo, 'application/json', hashlib.sha256(corpo).hexdigest()[:32], duradoura=ativo)
+    if ativo:
+        _obter_cache().guardar(chave, guardado)
+    return guardado
+
+
+# Acertos e falhas do cache neste processo
+def estatisticas_cache():
+    if current_app.config['RELATORIO_CACHE_TAMANHO'] <= 0:
+        return {'ativo': False, 'itens': 0, 'tamanho_maximo': 0, 'acertos': 0, 'falhas': 0, 'taxa_acertos': None}
+    cache = _obter_cache()
+    consultas = cache.acertos + cache.falhas
+    return {
+        'ativo': True,
+        'itens': len(cache),
+        'tamanho_maximo': cache.tamanho_maximo,
+        'acertos': cache.acertos,
+        'falhas': cache.falhas,
+        'taxa_acertos': round(cache.acertos / consultas, 4) if consultas else None
+    }
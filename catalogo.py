@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+from flask import current_app
+from sqlalchemy import insert, select
+from models import db, MacroTema, Tema, Subtema, Recomendacao
+from compressao import CargaImutavel
+
+# Cache do catálogo do questionário (macrotemas, temas, subtemas e recomendações).
+# O catálogo só muda quando inicializar_db semeia o banco, então ele é carregado
+# uma vez por processo, junto com o JSON já serializado de /obter_questionario.
+
+# Versão dos dados semeados por inicializar_db: incrementar sempre que o catálogo mudar
+VERSAO_CATALOGO = '1'
+
+# Dados do catálogo (macrotemas, temas com subtemas e recomendações por tema e faixa de risco)
+ARQUIVO_CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados', 'catalogo.json')
+
+_catalogo = None
+_trava = threading.Lock()
+
+
+# Retrato imutável do catálogo carregado do banco
+class Catalogo:
+    def __init__(self, versao, macrotemas, temas, subtemas, recomendacoes, questionario_json):
+        self.versao = versao
+        self.macrotemas = macrotemas          # {id: {'id', 'codigo', 'titulo'}}
+        self.temas = temas                    # {id: {'id', 'numero', 'descricao', 'macro_tema_id', 'macrotema'}}
+        self.subtemas = subtemas              # {id: {'id', 'letra', 'descricao', 'tema_id'}}
+        self.recomendacoes = recomendacoes    # {(tema_id, faixa_nivel): [descricao, ...]}
+        self.questionario_json = questionario_json
+        # Posições na ordem do catálogo, usadas pelo armazenamento compacto das respostas
+        self.ordem_temas = list(temas)
+        self.posicao_tema = {tema_id: posicao for posicao, tema_id in enumerate(self.ordem_temas)}
+        self.ordem_subtemas = list(subtemas)
+        self.posicao_subtema = {subtema_id: posicao for posicao, subtema_id in enumerate(self.ordem_subtemas)}
+        self.etag = f"{versao}-{hashlib.sha256(questionario_json).hexdigest()[:32]}"
+        # Resposta do /obter_questionario, com as variantes comprimidas guardadas em memória
+        self.questionario = CargaImutavel(questionario_json, 'application/json', self.etag)
+
+
+# Carrega o catálogo com uma consulta por tabela e pré-serializa o questionário
+def _carregar_catalogo():
+    macrotemas = {
+        linha.id: {'id': linha.id, 'codigo': linha.codigo, 'titulo': linha.titulo}
+        for linha in db.session.execute(select(MacroTema.id, MacroTema.codigo, MacroTema.titulo).order_by(MacroTema.id))
+    }
+    temas = {}
+    for linha in db.session.execute(
+        select(Tema.id, Tema.numero, Tema.descricao, Tema.macro_tema_id).order_by(Tema.id)
+    ):
+        macrotema = macrotemas.get(linha.macro_tema_id)
+        temas[linha.id] = {
+            'id': linha.id,
+            'numero': linha.numero,
+            'descricao': linha.descricao,
+            'macro_tema_id': linha.macro_tema_id,
+            'macrotema': macrotema['codigo'] if macrotema else "?"
+        }
+    subtemas = {
+        linha.id: {'id': linha.id, 'letra': linha.letra, 'descricao': linha.descricao, 'tema_id': linha.tema_id}
+        for linha in db.session.execute(
+            select(Subtema.id, Subtema.letra, Subtema.descricao, Subtema.tema_id).order_by(Subtema.id)
+        )
+    }
+    recomendacoes = {}
+    for linha in db.session.execute(
+        select(Recomendacao.tema_id, Recomendacao.faixa_nivel, Recomendacao.descricao).order_by(Recomendacao.id)
+    ):
+        recomendacoes.setdefault((linha.tema_id, linha.faixa_nivel), []).append(linha.descricao)
+
+    # Estrutura hierárquica devolvida por /obter_questionario
+    subtemas_por_tema = {}
+    for subtema in subtemas.values():
+        subtemas_por_tema.setdefault(subtema['tema_id'], []).append({
+            'id': subtema['id'],
+            'letra': subtema['letra'],
+            'descricao': subtema['descricao']
+        })
+    temas_por_macrotema = {}
+    for tema in temas.values():
+        temas_por_macrotema.setdefault(tema['macro_tema_id'], []).append({
+            'id': tema['id'],
+            'numero': tema['numero'],
+            'descricao': tema['descricao'],
+            'subtemas': subtemas_por_tema.get(tema['id'], [])
+        })
+    questionario = [
+        {
+            'id': macrotema['id'],
+            'codigo': macrotema['codigo'],
+            'titulo': macrotema['titulo'],
+            'temas': temas_por_macrotema.get(macrotema['id'], [])
+        }
+        for macrotema in macrotemas.values()
+    ]
+
+    # Mesmos bytes que jsonify produziria
+    questionario_json = current_app.json.response({'questionario': questionario}).get_data()
+
+    return Catalogo(VERSAO_CATALOGO, macrotemas, temas, subtemas, recomendacoes, questionario_json)
+
+
+# Retorna o catálogo em cache, carregando-o se ainda não existir para a versão atual
+def obter_catalogo():
+    global _catalogo
+    catalogo = _catalogo
+    if catalogo is not None and catalogo.versao == VERSAO_CATALOGO:
+        return catalogo
+    with _trava:
+        if _catalogo is None or _catalogo.versao != VERSAO_CATALOGO:
+            catalogo = _carregar_catalogo()
+            # Banco ainda não semeado: não guarda o catálogo vazio
+            if not catalogo.macrotemas:
+                return catalogo
+            _catalogo = catalogo
+        return _catalogo
+
+
+# Descarta o catálogo em cache (chamado quando o banco é semeado novamente)
+def invalidar_catalogo():
+    global _catalogo
+    with _trava:
+        _catalogo = None
+
+
+# Semeia um banco vazio com o catálogo do arquivo de dados: uma inserção em lote por tabela,
+# com os ids de macrotemas e temas devolvidos pelo RETURNING (sem fazer commit)
+def semear_catalogo(arquivo=ARQUIVO_CATALOGO):
+    with open(arquivo, encoding='utf-8') as entrada:
+        dados = json.load(entrada)
+
+    def inserir(modelo, linhas):
+        tabela = modelo.__table__
+        return db.session.execute(
+            insert(tabela).returning(tabela.c.id, sort_by_parameter_order=True), linhas
+        ).scalars().all()
+
+    ids_macrotemas = inserir(MacroTema, [
+        {'codigo': macrotema['codigo'], 'titulo': macrotema['titulo']} for macrotema in dados['macrotemas']
+    ])
+    macrotema_por_codigo = {
+        macrotema['codigo']: macrotema_id for macrotema, macrotema_id in zip(dados['macrotemas'], ids_macrotemas)
+    }
+    ids_temas = inserir(Tema, [
+        {'numero': tema['numero'], 'descricao': tema['descricao'], 'macro_tema_id': macrotema_por_codigo[tema['macrotema']]}
+        for tema in dados['temas']
+    ])
+    tema_por_numero = {tema['numero']: tema_id for tema, tema_id in zip(dados['temas'], ids_temas)}
+    db.session.execute(insert(Subtema.__table__), [
+        {'letra': subtema['letra'], 'descricao': subtema['descricao'], 'tema_id': tema_por_numero[tema['numero']]}
+        for tema in dados['temas'] for subtema in tema['subtemas']
+    ])
+    db.session.execute(insert(Recomendacao.__table__), [
+        {'tema_id': tema_por_numero[recomendacao['tema_numero']], 'faixa_nivel': recomendacao['faixa_nivel'],
+         'descricao': recomendacao['descricao']}
+        for recomendacao in dados['recomendacoes']
+    ])
+    return {
+        'macrotemas': len(ids_macrotemas),
+        'temas': len(ids_temas),
+        'subtemas': sum(len(tema['subtemas']) for tema in dados['temas']),
+        'recomendacoes': len(dados['recomendacoes'])
+    }
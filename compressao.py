@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import threading
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote brotli, só gzip
+    brotli = None
+
+# Compressão das respostas com negociação pelo cabeçalho Accept-Encoding.
+# Conteúdos imutáveis (swagger.json, questionário, relatórios em cache) ficam em memória como
+# CargaImutavel: cada codificação é calculada uma única vez e reaproveitada nas próximas requisições.
+# As demais respostas JSON/texto acima de COMPRESSAO_TAMANHO_MINIMO são comprimidas no after_request.
+# Uma resposta comprimida leva o ETag fraco (W/"..."), que continua valendo no If-None-Match.
+
+TIPOS_COMPRIMIVEIS = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript')
+
+# Qualidade do brotli nas respostas dinâmicas; conteúdos duradouros usam a máxima, calculada uma vez
+QUALIDADE_BROTLI_DINAMICA = 5
+
+
+def codificacoes_disponiveis():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _comprimir(dados, codificacao, maxima=False):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=11 if maxima else QUALIDADE_BROTLI_DINAMICA)
+    return gzip.compress(dados, compresslevel=9 if maxima else current_app.config['COMPRESSAO_NIVEL_GZIP'], mtime=0)
+
+
+# Melhor codificação aceita pelo cliente (None = sem compressão); em empate, brotli antes de gzip
+def escolher_codificacao():
+    melhor = None
+    melhor_qualidade = 0
+    for codificacao in codificacoes_disponiveis():
+        qualidade = request.accept_encodings.quality(codificacao)
+        if qualidade > melhor_qualidade:
+            melhor, melhor_qualidade = codificacao, qualidade
+    return melhor
+
+
+def _marcar_codificacao(resposta, codificacao):
+    resposta.headers['Content-Encoding'] = codificacao
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        resposta.set_etag(etag, weak=True)
+
+
+# Conteúdo imutável em memória com as variantes comprimidas calculadas sob demanda.
+# duradoura=False para conteúdos usados uma única vez (compressão mais rápida)
+class CargaImutavel:
+    def __init__(self, dados, mimetype, etag, duradoura=True):
+        self.dados = dados
+        self.mimetype = mimetype
+        self.etag = etag
+        self.duradoura = duradoura
+        self._variantes = {}
+        self._trava = threading.Lock()
+
+    def variante(self, codificacao):
+        if codificacao is None:
+            return self.dados
+        dados = self._variantes.get(codificacao)
+        if dados is None:
+            with self._trava:
+                dados = self._variantes.get(codificacao)
+                if dados is None:
+                    dados = _comprimir(self.dados, codificacao, maxima=self.duradoura)
+                    self._variantes[codificacao] = dados
+        return dados
+
+    # Resposta negociada com ETag e Cache-Control; 304 quando o If-None-Match coincide
+    def responder(self, cache_control='no-cache'):
+        resposta = current_app.response_class(response=self.dados, status=200, mimetype=self.mimetype)
+        resposta.set_etag(self.etag)
+        resposta.headers['Cache-Control'] = cache_control
+        resposta.vary.add('Accept-Encoding')
+        resposta = resposta.make_conditional(request)
+        if resposta.status_code == 200 and len(self.dados) >= current_app.config['COMPRESSAO_TAMANHO_MINIMO']:
+            codificacao = escolher_codificacao()
+            if codificacao is not None:
+                resposta.set_data(self.variante(codificacao))
+                _marcar_codificacao(resposta, codificacao)
+        return resposta
+
+
+_arquivos = {}
+_trava_arquivos = threading.Lock()
+
+
+# Arquivo estático lido uma vez por processo (alterações exigem reiniciar a aplicação)
+def carga_de_arquivo(caminho, mimetype):
+    carga = _arquivos.get(caminho)
+    if carga is None:
+        with _trava_arquivos:
+            carga = _arquivos.get(caminho)
+            if carga is None:
+                with open(caminho, 'rb') as arquivo:
+                    dados = arquivo.read()
+                carga = CargaImutavel(dados, mimetype, hashlib.sha256(dados).hexdigest()[:32])
+                _arquivos[caminho] = carga
+    return carga
+
+
+# after_request: comprime respostas dinâmicas de texto/JSON que ainda não foram codificadas
+def comprimir_resposta(resposta):
+    if (resposta.status_code != 200 or resposta.direct_passthrough or resposta.is_streamed
+            or 'Content-Encoding' in resposta.headers or resposta.mimetype not in TIPOS_COMPRIMIVEIS):
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    dados = resposta.get_data()
+    if len(dados) < current_app.config['COMPRESSAO_TAMANHO_MINIMO']:
+        return resposta
+    codificacao = escolher_codificacao()
+    if codificacao is not None:
+        resposta.set_data(_comprimir(dados, codificacao))
+        _marcar_codificacao(resposta, codificacao)
+    return resposta
+
+
+def configurar_compressao(app):
+    app.after_request(comprimir_resposta)
@@ -2,6 +2,95 @@ import os
 
 class Config:
     # Configuração do banco de dados SQLite
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///riscos_psicossociais.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///riscos_psicossociais.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = 'rp-api'
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'rp-api')
+
+    # Pool de conexões do SQLAlchemy (QueuePool); só se aplica aos bancos em arquivo (ver banco.opcoes_engine)
+    POOL_CONEXOES = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+
+    # Perfil do SQLite aplicado a cada nova conexão ('producao' ou 'compatibilidade', ver banco.py).
+    # Cada PRAGMA do perfil pode ser sobrescrito por variável de ambiente, ex.: SQLITE_BUSY_TIMEOUT=10000
+    SQLITE_PERFIL = os.environ.get('SQLITE_PERFIL', 'producao')
+    SQLITE_PRAGMAS = {
+        nome: os.environ[f'SQLITE_{nome.upper()}']
+        for nome in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size', 'temp_store')
+        if f'SQLITE_{nome.upper()}' in os.environ
+    }
+
+    # Motor do relatório: 'agregados' (tabelas mantidas incrementalmente), 'sql' (agregação das respostas)
+    # ou 'numpy' (matrizes avaliações x temas/subtemas; requer o pacote numpy)
+    RELATORIO_MOTOR = os.environ.get('RELATORIO_MOTOR', 'agregados')
+
+    # Armazenamento das respostas de novas avaliações: 'linhas' (uma linha por resposta)
+    # ou 'compacto' (máscara de temas e blob de níveis na própria avaliação)
+    ARMAZENAMENTO_RESPOSTAS = os.environ.get('ARMAZENAMENTO_RESPOSTAS', 'linhas')
+
+    # Cache das respostas do relatório em cada processo (quantidade de entradas; 0 desativa).
+    # As entradas são invalidadas pela geração de cada empresa/departamento, compartilhada pelo banco
+    RELATORIO_CACHE_TAMANHO = int(os.environ.get('RELATORIO_CACHE_TAMANHO', 256))
+
+    # Consultas do relatório, tendência, exportação, listagem e tarefas: 'primario' (mesmo banco dos cadastros),
+    # 'somente_leitura' (pool separado, somente leitura) ou 'copia' (cópia do banco atualizada periodicamente
+    # pela API de backup do SQLite; arquivo padrão: o do banco com o sufixo .leitura)
+    LEITURA_MODO = os.environ.get('LEITURA_MODO', 'primario')
+    LEITURA_COPIA_ARQUIVO = os.environ.get('LEITURA_COPIA_ARQUIVO', '')
+    LEITURA_COPIA_INTERVALO_SEGUNDOS = int(os.environ.get('LEITURA_COPIA_INTERVALO_SEGUNDOS', 60))
+
+    # Particionamento das avaliações em arquivos SQLite: 'desativado', 'empresa' (um arquivo por empresa) ou
+    # 'hash' (PARTICOES_QUANTIDADE arquivos, empresa escolhida pelo crc32 do nome). Os arquivos ficam em
+    # PARTICOES_DIRETORIO (padrão: pasta 'particoes' ao lado do banco principal); os relatórios sem empresa
+    # consultam as partições em paralelo com PARTICOES_TRABALHADORES threads
+    PARTICIONAMENTO = os.environ.get('PARTICIONAMENTO', 'desativado')
+    PARTICOES_QUANTIDADE = int(os.environ.get('PARTICOES_QUANTIDADE', 16))
+    PARTICOES_DIRETORIO = os.environ.get('PARTICOES_DIRETORIO', '')
+    PARTICOES_TRABALHADORES = int(os.environ.get('PARTICOES_TRABALHADORES', 4))
+
+    # Cadastro: 'direto' (a avaliação é gravada durante a requisição) ou 'fila' (a requisição acrescenta a
+    # avaliação validada a uma fila em disco e responde 202 com um recibo; uma thread de ingestão grava a fila
+    # no banco em transações de até FILA_TAMANHO_BLOCO avaliações). A fila fica em FILA_DIRETORIO (padrão:
+    # pasta 'fila_cadastros' ao lado do banco principal), em segmentos de até FILA_TAMANHO_SEGMENTO_MB; os
+    # cadastros simultâneos esperam FILA_ESPERA_SINCRONIZACAO_MS para compartilhar um fsync, a ingestão espera
+    # FILA_ESPERA_INGESTAO_MS para juntar mais avaliações por transação, e os recibos valem FILA_RECIBOS_TTL_SEGUNDOS
+    CADASTRO_MODO = os.environ.get('CADASTRO_MODO', 'direto')
+    FILA_DIRETORIO = os.environ.get('FILA_DIRETORIO', '')
+    FILA_TAMANHO_BLOCO = int(os.environ.get('FILA_TAMANHO_BLOCO', 1000))
+    FILA_TAMANHO_SEGMENTO_MB = int(os.environ.get('FILA_TAMANHO_SEGMENTO_MB', 64))
+    FILA_ESPERA_SINCRONIZACAO_MS = float(os.environ.get('FILA_ESPERA_SINCRONIZACAO_MS', 2))
+    FILA_ESPERA_INGESTAO_MS = float(os.environ.get('FILA_ESPERA_INGESTAO_MS', 50))
+    FILA_RECIBOS_TTL_SEGUNDOS = int(os.environ.get('FILA_RECIBOS_TTL_SEGUNDOS', 24 * 60 * 60))
+
+    # Quantidade de avaliações gravadas por transação na importação em lote
+    LOTE_TAMANHO_BLOCO = int(os.environ.get('LOTE_TAMANHO_BLOCO', 500))
+
+    # Quantidade de avaliações por bloco (leitura e transação de remoção) na limpeza de duplicadas
+    DEDUPLICACAO_TAMANHO_BLOCO = int(os.environ.get('DEDUPLICACAO_TAMANHO_BLOCO', 1000))
+
+    # Idempotência do cadastro: validade das chaves enviadas no cabeçalho Idempotency-Key,
+    # validade do hash do conteúdo (0 desativa) e tamanho do cache em memória
+    IDEMPOTENCIA_TTL_SEGUNDOS = int(os.environ.get('IDEMPOTENCIA_TTL_SEGUNDOS', 24 * 60 * 60))
+    IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS = int(os.environ.get('IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS', 10))
+    IDEMPOTENCIA_TAMANHO_CACHE = int(os.environ.get('IDEMPOTENCIA_TAMANHO_CACHE', 10000))
+
+    # Tarefas assíncronas do relatório: pool local de 'thread' ou 'processo', quantidade de trabalhadores,
+    # validade do resultado guardado e prazo máximo de uma tarefa em andamento
+    TAREFAS_EXECUTOR = os.environ.get('TAREFAS_EXECUTOR', 'thread')
+    TAREFAS_TRABALHADORES = int(os.environ.get('TAREFAS_TRABALHADORES', 2))
+    TAREFAS_TTL_SEGUNDOS = int(os.environ.get('TAREFAS_TTL_SEGUNDOS', 60 * 60))
+    TAREFAS_TEMPO_MAXIMO_SEGUNDOS = int(os.environ.get('TAREFAS_TEMPO_MAXIMO_SEGUNDOS', 10 * 60))
+
+    # Logs: nível (DEBUG mostra o cálculo de cada tema do relatório) e formato ('texto' ou 'json')
+    LOG_NIVEL = os.environ.get('LOG_NIVEL', 'INFO')
+    LOG_FORMATO = os.environ.get('LOG_FORMATO', 'texto')
+
+    # Requisições mais lentas que este limite (ms) vão para o log com as consultas SQL executadas (0 desativa)
+    INSTRUMENTACAO_LIMITE_LENTO_MS = int(os.environ.get('INSTRUMENTACAO_LIMITE_LENTO_MS', 0))
+
+    # Compressão das respostas (gzip, ou brotli com o pacote brotli instalado) negociada pelo Accept-Encoding:
+    # tamanho mínimo do corpo, em bytes, e nível do gzip nas respostas dinâmicas
+    COMPRESSAO_TAMANHO_MINIMO = int(os.environ.get('COMPRESSAO_TAMANHO_MINIMO', 1024))
+    COMPRESSAO_NIVEL_GZIP = int(os.environ.get('COMPRESSAO_NIVEL_GZIP', 6))
@@ -0,0 +1,183 @@
+from collections import Counter
+from sqlalchemy import case, func, select
+from models import db, Avaliacao, RespostaPrimeiroNivel
+from catalogo import obter_catalogo
+from relatorio import _filtrar
+from relatorio_numpy import carregar_matrizes, AUSENTE
+from particoes import reunir_particoes
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy, a coocorrência dos temas é somada bit a bit e a correlação dos subtemas fica indisponível
+    np = None
+
+# Coocorrência dos temas e correlação dos subtemas em um recorte de avaliações.
+# Temas: cada avaliação vira uma máscara de bits dos temas selecionados (a mesma do armazenamento compacto,
+# bit i = i-ésimo tema do catálogo), montada no banco com SUM por avaliação; o banco devolve só o histograma
+# {máscara: quantidade}, em geral com poucos milhares de máscaras distintas. A matriz de coocorrência é
+# M.T @ (M * quantidades), com M = bits das máscaras distintas, e a quantidade de temas por avaliação é o
+# popcount de cada máscara. Lift(i, j) = P(i e j) / (P(i) * P(j)).
+# Subtemas: correlação de Pearson dos níveis de desconforto entre pares de subtemas, usando as avaliações
+# que responderam os dois. As somas necessárias (respostas em comum, somas, somas dos quadrados e dos
+# produtos) saem de produtos de matrizes sobre as matrizes do motor numpy, em blocos de linhas.
+# Histogramas e somas se acumulam entre partições, então o recorte sem empresa é calculado em paralelo.
+
+LINHAS_POR_BLOCO = 50000
+CASAS_DECIMAIS = 4
+
+
+# Histograma das máscaras de temas selecionados no recorte: (Counter {máscara: avaliações}, total)
+def histograma_mascaras(empresa=None, departamento=None, desde=None, ate=None):
+    catalogo = obter_catalogo()
+    bit_do_tema = case(
+        {tema_id: 1 << posicao for tema_id, posicao in catalogo.posicao_tema.items()},
+        value=RespostaPrimeiroNivel.tema_id, else_=0
+    )
+    # Respostas em linhas: uma máscara por avaliação (o índice único impede o mesmo tema duas vezes)
+    por_avaliacao = select(func.sum(bit_do_tema).label('mascara')).where(RespostaPrimeiroNivel.selecionado.is_(True))
+    if empresa or departamento or desde or ate:
+        por_avaliacao = _filtrar(
+            por_avaliacao.join(Avaliacao, Avaliacao.id == RespostaPrimeiroNivel.avaliacao_id),
+            empresa, departamento, desde=desde, ate=ate
+        )
+    por_avaliacao = por_avaliacao.group_by(RespostaPrimeiroNivel.avaliacao_id).subquery()
+    histograma = Counter(dict(db.session.execute(
+        select(por_avaliacao.c.mascara, func.count()).group_by(por_avaliacao.c.mascara)
+    ).all()))
+
+    # Armazenamento compacto: a máscara já está na avaliação
+    histograma.update(dict(db.session.execute(
+        _filtrar(select(Avaliacao.temas_selecionados, func.count()), empresa, departamento, desde=desde, ate=ate)
+        .where(Avaliacao.temas_selecionados.is_not(None))
+        .group_by(Avaliacao.temas_selecionados)
+    ).all()))
+
+    total = db.session.execute(
+        _filtrar(select(func.count(Avaliacao.id)), empresa, departamento, desde=desde, ate=ate)
+    ).scalar()
+    # Avaliações sem tema selecionado (em linhas, não aparecem na soma por avaliação)
+    histograma[0] = total - sum(quantidade for mascara, quantidade in histograma.items() if mascara)
+    return histograma, total
+
+
+# Matriz de coocorrência (diagonal = avaliações com o tema) e avaliações por quantidade de temas selecionados
+def matriz_coocorrencia(histograma, quantidade_temas):
+    if np is not None:
+        mascaras = np.fromiter(histograma.keys(), dtype=np.int64, count=len(histograma))
+        quantidades = np.fromiter(histograma.values(), dtype=np.int64, count=len(histograma))
+        bits = (mascaras[:, None] >> np.arange(quantidade_temas, dtype=np.int64) & 1).astype(np.int64)
+        coocorrencia = bits.T @ (bits * quantidades[:, None])
+        por_quantidade = np.bincount(bits.sum(axis=1), weights=quantidades, minlength=quantidade_temas + 1)
+        return coocorrencia.tolist(), por_quantidade.astype(np.int64).tolist()
+
+    coocorrencia = [[0] * quantidade_temas for _ in range(quantidade_temas)]
+    por_quantidade = [0] * (quantidade_temas + 1)
+    for mascara, quantidade in histograma.items():
+        posicoes = [posicao for posicao in range(quantidade_temas) if mascara >> posicao & 1]
+        por_quantidade[len(posicoes)] += quantidade
+        for i in posicoes:
+            linha = coocorrencia[i]
+            for j in posicoes:
+                linha[j] += quantidade
+    return coocorrencia, por_quantidade
+
+
+def _lift(coocorrencia, total):
+    return [
+        [
+            round(contagem * total / (linha[i] * coocorrencia[j][j]), CASAS_DECIMAIS)
+            if linha[i] and coocorrencia[j][j] else None
+            for j, contagem in enumerate(linha)
+        ]
+        for i, linha in enumerate(coocorrencia)
+    ]
+
+
+# Somas dos níveis de desconforto de cada par de subtemas (a, b), só nas avaliações que responderam os dois:
+# {'comuns': n[a, b], 'somas': soma de x_a, 'quadrados': soma de x_a², 'produtos': soma de x_a * x_b}
+def somas_subtemas(empresa=None, departamento=None, desde=None, ate=None):
+    _, _, niveis, _, _ = carregar_matrizes(empresa, departamento, desde, ate)
+    quantidade = niveis.shape[1]
+    somas = {nome: np.zeros((quantidade, quantidade)) for nome in ('comuns', 'somas', 'quadrados', 'produtos')}
+    for inicio in range(0, len(niveis), LINHAS_POR_BLOCO):
+        bloco = niveis[inicio:inicio + LINHAS_POR_BLOCO]
+        respondidos = (bloco != AUSENTE).astype(np.float64)
+        valores = np.where(bloco != AUSENTE, bloco, 0).astype(np.float64)
+        somas['comuns'] += respondidos.T @ respondidos
+        somas['somas'] += valores.T @ respondidos
+        somas['quadrados'] += (valores * valores).T @ respondidos
+        somas['produtos'] += valores.T @ valores
+    return somas
+
+
+# Correlação de Pearson a partir das somas (None com menos de duas respostas em comum ou variância nula)
+def correlacao_subtemas(somas):
+    comuns, soma, quadrados, produtos = somas['comuns'], somas['somas'], somas['quadrados'], somas['produtos']
+    covariancia = comuns * produtos - soma * soma.T
+    variancias = (comuns * quadrados - soma * soma) * (comuns * quadrados.T - soma.T * soma.T)
+    validos = (comuns >= 2) & (variancias > 0)
+    correlacao = np.divide(covariancia, np.sqrt(np.where(validos, variancias, 1.0)))
+    correlacao = np.clip(correlacao, -1.0, 1.0).round(CASAS_DECIMAIS)
+    return [
+        [valor if valido else None for valor, valido in zip(linha, linha_validos)]
+        for linha, linha_validos in zip(correlacao.tolist(), validos.tolist())
+    ]
+
+
+def _somar_histogramas(resultados):
+    histograma = Counter()
+    total = 0
+    for parcial, quantidade in resultados:
+        histograma.update(parcial)
+        total += quantidade
+    return histograma, total
+
+
+# Calcula a coocorrência dos temas (e, com subtemas=True, a correlação dos subtemas; requer numpy) do recorte
+def calcular_coocorrencia(empresa=None, departamento=None, desde=None, ate=None, subtemas=False):
+    if subtemas and np is None:
+        raise RuntimeError('A correlação dos subtemas requer o pacote numpy.')
+    catalogo = obter_catalogo()
+    histograma, total = _somar_histogramas(reunir_particoes(
+        lambda: histograma_mascaras(empresa, departamento, desde, ate), empresa
+    ))
+    if total == 0:
+        return {
+            'total_avaliacoes': 0,
+            'mensagem': 'Nenhuma avaliação encontrada com os filtros informados.'
+        }
+
+    coocorrencia, por_quantidade = matriz_coocorrencia(histograma, len(catalogo.ordem_temas))
+    resultado = {
+        'empresa': empresa if empresa else 'Todas',
+        'departamento': departamento if departamento else 'Todos',
+        'total_avaliacoes': total,
+        'temas': [
+            {
+                'tema_id': tema_id,
+                'numero': catalogo.temas[tema_id]['numero'],
+                'descricao': catalogo.temas[tema_id]['descricao'],
+                'contagem': coocorrencia[posicao][posicao],
+                'percentual': round(coocorrencia[posicao][posicao] / total * 100, 2)
+            }
+            for posicao, tema_id in enumerate(catalogo.ordem_temas)
+        ],
+        'coocorrencia': coocorrencia,
+        'lift': _lift(coocorrencia, total),
+        'temas_por_avaliacao': por_quantidade
+    }
+
+    if subtemas:
+        somas = None
+        for parcial in reunir_particoes(lambda: somas_subtemas(empresa, departamento, desde, ate), empresa):
+            somas = parcial if somas is None else {nome: somas[nome] + parcial[nome] for nome in somas}
+        resultado['subtemas'] = {
+            'itens': [
+                {'subtema_id': subtema_id, 'tema_id': catalogo.subtemas[subtema_id]['tema_id'],
+                 'letra': catalogo.subtemas[subtema_id]['letra']}
+                for subtema_id in catalogo.ordem_subtemas
+            ],
+            'respostas_em_comum': somas['comuns'].astype(np.int64).tolist(),
+            'correlacao': correlacao_subtemas(somas)
+        }
+    return resultado
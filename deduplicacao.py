@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import time
+from sqlalchemy import bindparam, delete, func, select, text, update
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel, ChaveIdempotencia
+from agregados import descontar_agregados, recalcular_agregados_departamentos
+from catalogo import obter_catalogo
+from empacotamento import decodificar_temas, decodificar_niveis
+from relatorio import _filtrar
+import idempotencia
+
+# Remoção de avaliações duplicadas em blocos, para tabelas com milhões de linhas.
+# 1. Assinatura: as avaliações são lidas em blocos por id; a forma canônica de cada uma (empresa,
+#    departamento, função, temas selecionados e níveis dos subtemas, nos dois armazenamentos de respostas)
+#    vira um hash de 64 bits gravado em uma tabela temporária da conexão do processo.
+# 2. Grupos: GROUP BY no hash encontra os grupos duplicados; em cada grupo fica a avaliação mais recente.
+# 3. Remoção: em blocos de no máximo `tamanho_bloco` avaliações, cada remoção é conferida pela forma
+#    canônica completa (um hash igual com conteúdo diferente é ignorado). Cada transação cobre um
+#    departamento do bloco: as respostas são apagadas, as chaves de idempotência passam para a avaliação
+#    mantida e as removidas são descontadas dos agregados do departamento (pelas formas canônicas, sem
+#    reler as respostas). Depois do último bloco de cada departamento, os agregados dele são recalculados
+#    uma vez, em uma transação própria, para acertar a primeira ocorrência de cada tema e subtema.
+# As tabelas temporárias ficam em arquivo (temp_store=FILE) enquanto a limpeza roda.
+
+# Grupos duplicados listados no resultado da simulação
+EXEMPLOS_SIMULACAO = 20
+
+logger = logging.getLogger(__name__)
+
+
+# Forma canônica das avaliações `ids` (ou do intervalo de ids [primeiro, ultimo]), igual nos dois armazenamentos:
+# {id: (empresa, departamento, funcao, 'temas selecionados', 'subtema:nível')}, listas em ordem de texto
+def _formas_canonicas(conexao, catalogo, ids=None, intervalo=None):
+    def restringir(consulta, coluna):
+        if ids is not None:
+            return consulta.where(coluna.in_(ids))
+        return consulta.where(coluna.between(*intervalo))
+
+    metadados = {}
+    temas = {}
+    niveis = {}
+    for linha in conexao.execute(restringir(
+        select(Avaliacao.id, Avaliacao.empresa, Avaliacao.departamento, Avaliacao.funcao,
+               Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas), Avaliacao.id
+    )):
+        metadados[linha.id] = (linha.empresa, linha.departamento, linha.funcao or '')
+        if linha.temas_selecionados is not None:
+            temas[linha.id] = _lista(map(str, decodificar_temas(linha.temas_selecionados, catalogo)))
+            niveis[linha.id] = _lista(f'{subtema_id}:{nivel}'
+                                      for subtema_id, nivel in decodificar_niveis(linha.niveis_subtemas, catalogo))
+
+    # Respostas em linhas: uma linha por avaliação (GROUP BY); a ordem do group_concat não importa
+    for avaliacao_id, lista in conexao.execute(restringir(
+        select(RespostaPrimeiroNivel.avaliacao_id, func.group_concat(RespostaPrimeiroNivel.tema_id))
+        .where(RespostaPrimeiroNivel.selecionado.is_(True))
+        .group_by(RespostaPrimeiroNivel.avaliacao_id),
+        RespostaPrimeiroNivel.avaliacao_id
+    )):
+        temas[avaliacao_id] = _lista(lista.split(','))
+    for avaliacao_id, lista in conexao.execute(restringir(
+        select(RespostaSegundoNivel.avaliacao_id, func.group_concat(
+            RespostaSegundoNivel.subtema_id.concat(':').concat(RespostaSegundoNivel.nivel_desconforto)
+        )).group_by(RespostaSegundoNivel.avaliacao_id),
+        RespostaSegundoNivel.avaliacao_id
+    )):
+        niveis[avaliacao_id] = _lista(lista.split(','))
+
+    return {
+        avaliacao_id: dados + (temas.get(avaliacao_id, ''), niveis.get(avaliacao_id, ''))
+        for avaliacao_id, dados in metadados.items()
+    }
+
+
+def _lista(valores):
+    return ','.join(sorted(valores))
+
+
+# Hash de 64 bits (inteiro do SQLite) da forma canônica
+def _assinatura(forma):
+    return int.from_bytes(hashlib.sha256('\x1f'.join(forma).encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+def _criar_tabelas_temporarias(conexao):
+    conexao.execute(text('PRAGMA temp_store = FILE'))
+    conexao.execute(text(
+        'CREATE TEMP TABLE dedup_assinatura ('
+        'avaliacao_id INTEGER PRIMARY KEY, assinatura INTEGER NOT NULL, grupo INTEGER NOT NULL, data TEXT)'
+    ))
+    conexao.execute(text(
+        'CREATE TEMP TABLE dedup_remocao (avaliacao_id INTEGER NOT NULL, manter INTEGER NOT NULL, grupo INTEGER NOT NULL)'
+    ))
+
+
+def _remover_tabelas_temporarias(conexao, temp_store):
+    conexao.execute(text('DROP TABLE IF EXISTS temp.dedup_assinatura'))
+    conexao.execute(text('DROP TABLE IF EXISTS temp.dedup_remocao'))
+    conexao.execute(text(f'PRAGMA temp_store = {int(temp_store)}'))
+    conexao.commit()
+
+
+# Fase 1: grava a assinatura de cada avaliação do recorte; retorna {(empresa, departamento): grupo}
+def _calcular_assinaturas(conexao, catalogo, empresa, departamento, tamanho_bloco, resultado, progresso):
+    grupos = {}
+    ultimo_id = 0
+    while True:
+        linhas = conexao.execute(
+            _filtrar(select(Avaliacao.id, Avaliacao.data_avaliacao), empresa, departamento)
+            .where(Avaliacao.id > ultimo_id).order_by(Avaliacao.id).limit(tamanho_bloco)
+        ).all()
+        if not linhas:
+            break
+        ultimo_id = linhas[-1].id
+        # Sem filtro, o intervalo de ids percorre os índices das respostas em ordem
+        if empresa or departamento:
+            formas = _formas_canonicas(conexao, catalogo, ids=[linha.id for linha in linhas])
+        else:
+            formas = _formas_canonicas(conexao, catalogo, intervalo=(linhas[0].id, ultimo_id))
+        valores = []
+        for linha in linhas:
+            forma = formas[linha.id]
+            grupo = grupos.setdefault(forma[:2], len(grupos))
+            valores.append({'avaliacao_id': linha.id, 'assinatura': _assinatura(forma), 'grupo': grupo,
+                            'data': linha.data_avaliacao.isoformat(sep=' ') if linha.data_avaliacao else None})
+        conexao.execute(text(
+            'INSERT INTO temp.dedup_assinatura (avaliacao_id, assinatura, grupo, data) '
+            'VALUES (:avaliacao_id, :assinatura, :grupo, :data)'
+        ), valores)
+        conexao.commit()
+        resultado['avaliacoes_analisadas'] += len(linhas)
+        progresso('assinaturas', resultado)
+    return grupos
+
+
+# Fase 2: grupos duplicados e a lista de remoções, ordenada por departamento (os blocos de cada
+# departamento são consecutivos e ele é recalculado uma vez, depois do último)
+def _listar_remocoes(conexao, resultado):
+    conexao.execute(text(
+        'INSERT INTO temp.dedup_remocao (avaliacao_id, manter, grupo) '
+        'SELECT avaliacao_id, manter, grupo FROM ('
+        '  SELECT avaliacao_id, grupo,'
+        '         FIRST_VALUE(avaliacao_id) OVER janela AS manter,'
+        '         ROW_NUMBER() OVER janela AS posicao'
+        '  FROM temp.dedup_assinatura'
+        '  WHERE assinatura IN ('
+        '    SELECT assinatura FROM temp.dedup_assinatura GROUP BY assinatura HAVING COUNT(*) > 1)'
+        '  WINDOW janela AS (PARTITION BY assinatura ORDER BY data DESC, avaliacao_id DESC)'
+        ') WHERE posicao > 1 ORDER BY grupo, manter, avaliacao_id'
+    ))
+    conexao.commit()
+    resultado['grupos_duplicados'], resultado['avaliacoes_duplicadas'] = conexao.execute(text(
+        'SELECT COUNT(DISTINCT manter), COUNT(*) FROM temp.dedup_remocao'
+    )).one()
+
+
+def _exemplos(conexao):
+    exemplos = {}
+    for avaliacao_id, manter in conexao.execute(text(
+        'SELECT avaliacao_id, manter FROM temp.dedup_remocao WHERE manter IN ('
+        '  SELECT DISTINCT manter FROM temp.dedup_remocao ORDER BY manter LIMIT :limite'
+        ') ORDER BY manter, avaliacao_id'
+    ), {'limite': EXEMPLOS_SIMULACAO}):
+        exemplos.setdefault(manter, []).append(avaliacao_id)
+    return [{'manter': manter, 'remover': remover} for manter, remover in exemplos.items()]
+
+
+# Contagens das formas canônicas removidas: ({tema_id: contagem}, {subtema_id: (total_pontos, contagem)})
+def _contagens(formas):
+    temas = {}
+    subtemas = {}
+    for forma in formas:
+        for tema_id in filter(None, forma[3].split(',')):
+            temas[int(tema_id)] = temas.get(int(tema_id), 0) + 1
+        for par in filter(None, forma[4].split(',')):
+            subtema_id, nivel = map(int, par.split(':'))
+            pontos, contagem = subtemas.get(subtema_id, (0, 0))
+            subtemas[subtema_id] = (pontos + nivel, contagem + 1)
+    return temas, subtemas
+
+
+# Fase 3: confere e remove um bloco, com uma transação por departamento (remoções e desconto nos agregados);
+# retorna os grupos (departamentos) alterados
+def _remover_bloco(remocoes, departamentos, catalogo, resultado):
+    ids = {avaliacao_id for avaliacao_id, _, _ in remocoes} | {manter for _, manter, _ in remocoes}
+    formas = _formas_canonicas(db.session, catalogo, ids=list(ids))
+
+    por_grupo = {}
+    for avaliacao_id, manter, grupo in remocoes:
+        forma = formas.get(avaliacao_id)
+        if forma is None or manter not in formas:
+            continue  # removida ou com a mantida removida desde a fase 1
+        if forma != formas[manter]:
+            resultado['colisoes'] += 1
+            continue
+        por_grupo.setdefault(grupo, []).append((avaliacao_id, manter))
+
+    tabela_chaves = ChaveIdempotencia.__table__
+    for grupo, confirmadas in por_grupo.items():
+        ids = [avaliacao_id for avaliacao_id, _ in confirmadas]
+        db.session.execute(
+            update(tabela_chaves).where(tabela_chaves.c.avaliacao_id == bindparam('removida'))
+            .values(avaliacao_id=bindparam('manter')),
+            [{'removida': avaliacao_id, 'manter': manter} for avaliacao_id, manter in confirmadas]
+        )
+        for modelo in (RespostaPrimeiroNivel, RespostaSegundoNivel):
+            db.session.execute(delete(modelo).where(modelo.avaliacao_id.in_(ids)))
+        db.session.execute(delete(Avaliacao).where(Avaliacao.id.in_(ids)))
+        # Cada removida tem uma mantida igual no departamento: nenhuma linha dos agregados chega a zero
+        descontar_agregados(*departamentos[grupo], len(ids), *_contagens(formas[avaliacao_id] for avaliacao_id in ids))
+        db.session.commit()
+        resultado['avaliacoes_removidas'] += len(ids)
+    return set(por_grupo)
+
+
+# Recalcula os agregados dos departamentos que já passaram pelo último bloco, um por transação
+def _recalcular_departamentos(grupos, departamentos, resultado):
+    for grupo in sorted(grupos):
+        recalcular_agregados_departamentos([departamentos[grupo]])
+        db.session.commit()
+        resultado['departamentos_recalculados'] += 1
+
+
+def _registrar_progresso(fase, resultado):
+    logger.info('Limpeza de duplicadas em andamento', extra={'campos': {'fase': fase, **{
+        nome: resultado[nome] for nome in ('avaliacoes_analisadas', 'avaliacoes_duplicadas', 'avaliacoes_removidas',
+                                           'blocos')
+    }}})
+
+
+# Encontra e (sem `simular`) remove as avaliações duplicadas do recorte, mantendo a mais recente de cada
+# grupo. `progresso(fase, resultado)` é chamado a cada bloco (por padrão, registra no log).
+def limpar_avaliacoes_duplicadas(empresa=None, departamento=None, simular=False, tamanho_bloco=1000,
+                                 progresso=None):
+    if tamanho_bloco < 1:
+        raise ValueError('tamanho_bloco deve ser maior que zero.')
+    progresso = progresso or _registrar_progresso
+    catalogo = obter_catalogo()
+    resultado = {
+        'simulacao': simular,
+        'avaliacoes_analisadas': 0,
+        'grupos_duplicados': 0,
+        'avaliacoes_duplicadas': 0,
+        'avaliacoes_removidas': 0,
+        'colisoes': 0,
+        'departamentos_recalculados': 0,
+        'blocos': 0,
+        'duracao_ms': {},
+    }
+
+    inicio = time.perf_counter()
+    with db.session.get_bind().connect() as conexao:
+        temp_store = conexao.execute(text('PRAGMA temp_store')).scalar()
+        try:
+            _criar_tabelas_temporarias(conexao)
+            grupos = _calcular_assinaturas(conexao, catalogo, empresa, departamento, tamanho_bloco, resultado,
+                                           progresso)
+            resultado['duracao_ms']['assinaturas'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+            etapa = time.perf_counter()
+            _listar_remocoes(conexao, resultado)
+            resultado['duracao_ms']['grupos'] = round((time.perf_counter() - etapa) * 1000, 1)
+
+            if simular:
+                resultado['exemplos'] = _exemplos(conexao)
+            else:
+                etapa = time.perf_counter()
+                departamentos = {grupo: chave for chave, grupo in grupos.items()}
+                alterados = set()
+                ultima_linha = 0
+                while True:
+                    linhas = conexao.execute(text(
+                        'SELECT rowid, avaliacao_id, manter, grupo FROM temp.dedup_remocao '
+                        'WHERE rowid > :ultima ORDER BY rowid LIMIT :limite'
+                    ), {'ultima': ultima_linha, 'limite': tamanho_bloco}).all()
+                    conexao.commit()
+                    if not linhas:
+                        break
+                    ultima_linha = linhas[-1].rowid
+                    alterados |= _remover_bloco(
+                        [tuple(linha[1:]) for linha in linhas], departamentos, catalogo, resultado
+                    )
+                    # As remoções estão em ordem de grupo: os anteriores ao último do bloco não voltam
+                    concluidos = {grupo for grupo in alterados if grupo < linhas[-1].grupo}
+                    _recalcular_departamentos(concluidos, departamentos, resultado)
+                    alterados -= concluidos
+                    resultado['blocos'] += 1
+                    progresso('remocao', resultado)
+                _recalcular_departamentos(alterados, departamentos, resultado)
+                resultado['duracao_ms']['remocao'] = round((time.perf_counter() - etapa) * 1000, 1)
+        finally:
+            db.session.rollback()
+            _remover_tabelas_temporarias(conexao, temp_store)
+
+    # As chaves de idempotência em memória podem apontar para avaliações removidas
+    if resultado['avaliacoes_removidas']:
+        idempotencia.esquecer_chaves()
+    resultado['duracao_ms']['total'] = round((time.perf_counter() - inicio) * 1000, 1)
+    logger.info('Limpeza de duplicadas concluída', extra={'campos': {
+        nome: valor for nome, valor in resultado.items() if nome != 'exemplos'
+    }})
+    return resultado
@@ -0,0 +1,114 @@
+from collections import Counter
+
+# Armazenamento compacto das respostas de uma avaliação:
+# - temas selecionados em uma máscara de bits (bit i = i-ésimo tema na ordem do catálogo);
+# - níveis de desconforto em um blob com um byte por subtema na ordem do catálogo,
+#   com AUSENTE nos subtemas não respondidos (bytes finais ausentes são omitidos).
+
+AUSENTE = 0xFF
+
+
+def codificar_temas(tema_ids, catalogo):
+    mascara = 0
+    for tema_id in tema_ids:
+        mascara |= 1 << catalogo.posicao_tema[tema_id]
+    return mascara
+
+
+def decodificar_temas(mascara, catalogo):
+    return [tema_id for posicao, tema_id in enumerate(catalogo.ordem_temas) if mascara >> posicao & 1]
+
+
+# niveis: {subtema_id: nivel_desconforto}
+def codificar_niveis(niveis, catalogo):
+    if not niveis:
+        return b''
+    posicoes = {catalogo.posicao_subtema[subtema_id]: nivel for subtema_id, nivel in niveis.items()}
+    blob = bytearray([AUSENTE]) * (max(posicoes) + 1)
+    for posicao, nivel in posicoes.items():
+        blob[posicao] = nivel
+    return bytes(blob)
+
+
+# Retorna [(subtema_id, nivel_desconforto)] na ordem do catálogo
+def decodificar_niveis(blob, catalogo):
+    return [(catalogo.ordem_subtemas[posicao], nivel) for posicao, nivel in enumerate(blob or b'') if nivel != AUSENTE]
+
+
+# Converte as respostas no formato da API (respostas_nivel1/respostas_nivel2) para (máscara, blob)
+def compactar_respostas(respostas_nivel1, respostas_nivel2, catalogo):
+    mascara = codificar_temas([r['tema_id'] for r in respostas_nivel1 if r['selecionado']], catalogo)
+    blob = codificar_niveis({r['subtema_id']: r['nivel_desconforto'] for r in respostas_nivel2}, catalogo)
+    return mascara, blob
+
+
+# Converte (máscara, blob) de volta para as respostas no formato da API
+def expandir_respostas(mascara, blob, catalogo):
+    respostas_nivel1 = [{'tema_id': tema_id, 'selecionado': True} for tema_id in decodificar_temas(mascara, catalogo)]
+    respostas_nivel2 = [
+        {'subtema_id': subtema_id, 'nivel_desconforto': nivel}
+        for subtema_id, nivel in decodificar_niveis(blob, catalogo)
+    ]
+    return respostas_nivel1, respostas_nivel2
+
+
+# Respostas compactas no formato esperado por agregados.atualizar_agregados; a posição no
+# catálogo faz o papel do id da resposta na ordem de primeira ocorrência
+def respostas_para_agregados(avaliacao_id, mascara, blob, catalogo):
+    respostas_nivel1 = [
+        {'id': posicao, 'avaliacao_id': avaliacao_id, 'tema_id': tema_id, 'selecionado': True}
+        for posicao, tema_id in enumerate(catalogo.ordem_temas) if mascara >> posicao & 1
+    ]
+    respostas_nivel2 = [
+        {'id': posicao, 'avaliacao_id': avaliacao_id, 'subtema_id': catalogo.ordem_subtemas[posicao],
+         'nivel_desconforto': nivel}
+        for posicao, nivel in enumerate(blob) if nivel != AUSENTE
+    ]
+    return respostas_nivel1, respostas_nivel2
+
+
+# Soma nas parciais do relatório um bloco de avaliações compactas [(avaliacao_id, máscara, blob)],
+# em ordem de id, sem percorrer as respostas uma a uma: as máscaras são contadas por byte
+# (no máximo 256 valores distintos cada) e os blobs são alinhados em uma única sequência de
+# bytes, em que cada subtema é uma fatia da sequência.
+def acumular_compactas(parciais, linhas, catalogo):
+    if not linhas:
+        return parciais
+    ids = [avaliacao_id for avaliacao_id, _, _ in linhas]
+
+    for inicio in range(0, len(catalogo.ordem_temas), 8):
+        valores = Counter()
+        primeira_por_valor = {}
+        for avaliacao_id, mascara, _ in linhas:
+            valor = (mascara or 0) >> inicio & 0xFF
+            if valor:
+                valores[valor] += 1
+                primeira_por_valor.setdefault(valor, avaliacao_id)
+        for posicao in range(inicio, min(inicio + 8, len(catalogo.ordem_temas))):
+            bit = 1 << (posicao - inicio)
+            com_bit = [valor for valor in valores if valor & bit]
+            if not com_bit:
+                continue
+            ordem = (min(primeira_por_valor[valor] for valor in com_bit), posicao)
+            atual = parciais['temas'].setdefault(catalogo.ordem_temas[posicao], {'contagem': 0, 'ordem': ordem})
+            atual['contagem'] += sum(valores[valor] for valor in com_bit)
+            atual['ordem'] = min(atual['ordem'], ordem)
+
+    largura = max(len(blob or b'') for _, _, blob in linhas)
+    if not largura:
+        return parciais
+    dados = b''.join((blob or b'').ljust(largura, bytes([AUSENTE])) for _, _, blob in linhas)
+    for posicao in range(largura):
+        coluna = dados[posicao::largura]
+        presentes = coluna.translate(None, bytes([AUSENTE]))
+        if not presentes:
+            continue
+        primeira = len(coluna) - len(coluna.lstrip(bytes([AUSENTE])))
+        ordem = (ids[primeira], posicao)
+        atual = parciais['subtemas'].setdefault(
+            catalogo.ordem_subtemas[posicao], {'total_pontos': 0, 'contagem': 0, 'ordem': ordem}
+        )
+        atual['total_pontos'] += sum(presentes)
+        atual['contagem'] += len(presentes)
+        atual['ordem'] = min(atual['ordem'], ordem)
+    return parciais
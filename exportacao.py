@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import zlib
+from sqlalchemy import select
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel
+from catalogo import obter_catalogo
+from empacotamento import decodificar_temas, decodificar_niveis
+from relatorio import _filtrar
+
+# Exportação das respostas brutas, uma linha por avaliação, em CSV ou NDJSON.
+# As avaliações são lidas em blocos (yield_per) e cada bloco busca as suas respostas,
+# então a memória usada não depende do tamanho da exportação.
+
+FORMATOS_EXPORTACAO = ('csv', 'ndjson')
+TAMANHO_BLOCO_EXPORTACAO = 1000
+
+
+# Nomes das colunas na ordem do catálogo: tema_<número> (0/1) e subtema_<número><letra> (nível ou vazio)
+def colunas_exportacao(catalogo):
+    colunas_temas = {tema_id: f"tema_{tema['numero']}" for tema_id, tema in catalogo.temas.items()}
+    colunas_subtemas = {
+        subtema_id: f"subtema_{catalogo.temas[subtema['tema_id']]['numero']}{subtema['letra']}"
+        for subtema_id, subtema in catalogo.subtemas.items()
+    }
+    return colunas_temas, colunas_subtemas
+
+
+# Gera os registros (dicionários) de um bloco de avaliações
+def _registros_do_bloco(bloco, catalogo, colunas_temas, colunas_subtemas):
+    temas = {}
+    niveis = {}
+    ids_em_linhas = [linha.id for linha in bloco if linha.temas_selecionados is None]
+    if ids_em_linhas:
+        for avaliacao_id, tema_id in db.session.execute(
+            select(RespostaPrimeiroNivel.avaliacao_id, RespostaPrimeiroNivel.tema_id)
+            .where(RespostaPrimeiroNivel.avaliacao_id.in_(ids_em_linhas), RespostaPrimeiroNivel.selecionado.is_(True))
+        ):
+            temas.setdefault(avaliacao_id, set()).add(tema_id)
+        for avaliacao_id, subtema_id, nivel in db.session.execute(
+            select(RespostaSegundoNivel.avaliacao_id, RespostaSegundoNivel.subtema_id,
+                   RespostaSegundoNivel.nivel_desconforto)
+            .where(RespostaSegundoNivel.avaliacao_id.in_(ids_em_linhas))
+        ):
+            niveis.setdefault(avaliacao_id, {})[subtema_id] = nivel
+
+    for linha in bloco:
+        if linha.temas_selecionados is not None:
+            selecionados = set(decodificar_temas(linha.temas_selecionados, catalogo))
+            respondidos = dict(decodificar_niveis(linha.niveis_subtemas, catalogo))
+        else:
+            selecionados = temas.get(linha.id, set())
+            respondidos = niveis.get(linha.id, {})
+        registro = {
+            'id': linha.id,
+            'empresa': linha.empresa,
+            'departamento': linha.departamento,
+            'funcao': linha.funcao,
+            'data_avaliacao': linha.data_avaliacao.isoformat() if linha.data_avaliacao else None,
+        }
+        for tema_id, coluna in colunas_temas.items():
+            registro[coluna] = 1 if tema_id in selecionados else 0
+        for subtema_id, coluna in colunas_subtemas.items():
+            registro[coluna] = respondidos.get(subtema_id)
+        yield registro
+
+
+# Gera o conteúdo da exportação em pedaços de texto (um pedaço por bloco de avaliações)
+def gerar_exportacao(formato, empresa=None, departamento=None, desde=None, ate=None,
+                     tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+    catalogo = obter_catalogo()
+    colunas_temas, colunas_subtemas = colunas_exportacao(catalogo)
+    cabecalho = ['id', 'empresa', 'departamento', 'funcao', 'data_avaliacao',
+                 *colunas_temas.values(), *colunas_subtemas.values()]
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    if formato == 'csv':
+        escritor.writerow(cabecalho)
+
+    consulta = _filtrar(
+        select(Avaliacao.id, Avaliacao.empresa, Avaliacao.departamento, Avaliacao.funcao, Avaliacao.data_avaliacao,
+               Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas)
+        .order_by(Avaliacao.id),
+        empresa, departamento, desde=desde, ate=ate
+    )
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho_bloco))
+    for bloco in resultado.partitions():
+        for registro in _registros_do_bloco(bloco, catalogo, colunas_temas, colunas_subtemas):
+            if formato == 'csv':
+                escritor.writerow(['' if valor is None else valor for valor in registro.values()])
+            else:
+                buffer.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Codifica os pedaços de texto em UTF-8 e, opcionalmente, comprime em gzip à medida que são gerados
+def codificar_pedacos(pedacos, gzip=False):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+    for pedaco in pedacos:
+        dados = pedaco.encode('utf-8')
+        if compressor is not None:
+            dados = compressor.compress(dados)
+        if dados:
+            yield dados
+    if compressor is not None:
+        yield compressor.flush()
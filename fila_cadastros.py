@@ -0,0 +1,607 @@
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import OperationalError
+from models import db, ChaveIdempotencia, ReciboCadastro
+from avaliacoes import inserir_avaliacoes
+from idempotencia import registrar_chave, lembrar_chave
+from particoes import agrupar_por_particao, na_particao, reunir_particoes
+
+try:
+    import fcntl
+except ImportError:  # fora do POSIX (Windows) o modo 'fila' não está disponível
+    fcntl = None
+
+# Fila dos cadastros em disco (CADASTRO_MODO=fila): o POST /cadastrar_avaliacao valida a avaliação,
+# acrescenta uma linha ao segmento ativo da fila e responde 202 com um recibo assim que a linha está em disco.
+# Os cadastros simultâneos compartilham o mesmo fsync: o primeiro a esperar sincroniza o arquivo para todos
+# os que escreveram até ali. Uma thread de ingestão por processo grava a fila no banco em transações de até
+# FILA_TAMANHO_BLOCO avaliações (uma por partição, com particionamento), com a mesma gravação em lote da
+# importação (avaliacoes.inserir_avaliacoes, agregados na mesma transação).
+# Segmentos: arquivos <criação em ms>-<aleatório>.fila, só de acréscimos, uma linha por cadastro
+# ("<crc32 em hex> <json>"); o recibo é o nome do segmento seguido da posição da linha. Cada processo escreve
+# no seu segmento e mantém uma trava (flock) em todos os segmentos que são seus. A posição já gravada no banco
+# fica em <segmento>.pos; o segmento é removido quando termina de ser gravado.
+# Recuperação: os segmentos de um processo encerrado (sem trava) são assumidos pela ingestão de qualquer
+# processo, inclusive o que o substituir, e gravados a partir da posição salva. O recibo é gravado na mesma
+# transação da avaliação, então uma linha já gravada antes da queda (posição ainda não salva) não é repetida.
+# A idempotência é verificada no recebimento e de novo na ingestão: cadastros repetidos ainda na fila
+# recebem recibos diferentes, e a gravação marca os repetidos como 'duplicada', com o id da primeira avaliação.
+
+MODOS_CADASTRO = ('direto', 'fila')
+
+EXTENSAO_SEGMENTO = '.fila'
+EXTENSAO_POSICAO = '.pos'
+# Segmento recém-criado, ainda sem a trava: ignorado na recuperação
+EXTENSAO_NOVO = '.novo'
+
+_PADRAO_RECIBO = re.compile(r'^(\d{13}-[0-9a-f]{8})-(\d+)$')
+
+# A ingestão também acorda a cada intervalo para assumir segmentos de processos encerrados
+INTERVALO_VERIFICACAO_SEGUNDOS = 1.0
+INTERVALO_NOVA_TENTATIVA_SEGUNDOS = 1.0
+INTERVALO_LIMPEZA_SEGUNDOS = 60
+TENTATIVAS_CHAVE_CONCORRENTE = 3
+
+logger = logging.getLogger(__name__)
+
+_fila = None
+_trava = threading.Lock()
+
+# fdatasync basta: o tamanho do arquivo faz parte dos metadados gravados por ele
+_sincronizar = getattr(os, 'fdatasync', os.fsync)
+
+
+def fila_ativa():
+    modo = current_app.config['CADASTRO_MODO']
+    if modo not in MODOS_CADASTRO:
+        raise ValueError(f"CADASTRO_MODO deve ser {', '.join(MODOS_CADASTRO)}.")
+    return modo == 'fila'
+
+
+def _diretorio():
+    diretorio = current_app.config['FILA_DIRETORIO']
+    if not diretorio:
+        banco = db.engines[None].url.database
+        if banco in (None, '', ':memory:'):
+            raise ValueError('FILA_DIRETORIO é obrigatório com o banco principal em memória.')
+        diretorio = os.path.join(os.path.dirname(os.path.abspath(banco)), 'fila_cadastros')
+    return diretorio
+
+
+def _caminho_posicao(caminho):
+    return caminho[:-len(EXTENSAO_SEGMENTO)] + EXTENSAO_POSICAO
+
+
+# Posição do segmento até onde os registros já foram gravados no banco
+def _ler_posicao(caminho):
+    try:
+        with open(_caminho_posicao(caminho), encoding='ascii') as arquivo:
+            return int(arquivo.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+# Substitui o arquivo de posição de uma vez. Sem fsync: se a posição se perder numa queda, as linhas são
+# lidas de novo e descartadas pelos recibos já gravados.
+def _gravar_posicao(caminho, posicao):
+    destino = _caminho_posicao(caminho)
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='ascii') as arquivo:
+        arquivo.write(str(posicao))
+    os.replace(temporario, destino)
+
+
+# Grava em disco a entrada de um arquivo novo no diretório
+def _sincronizar_diretorio(diretorio):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _codificar(registro):
+    corpo = json.dumps(registro, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return b'%08x ' % zlib.crc32(corpo) + corpo + b'\n'
+
+
+# Registro de uma linha (sem o '\n'); None se a linha está corrompida
+def _decodificar(linha):
+    if len(linha) < 9 or linha[8:9] != b' ':
+        return None
+    corpo = linha[9:]
+    try:
+        if int(linha[:8], 16) != zlib.crc32(corpo):
+            return None
+        return json.loads(corpo)
+    except ValueError:
+        return None
+
+
+# Lê até `limite` registros do segmento, de `inicio` até no máximo `fim`.
+# Retorna ([(recibo, registro)], posição seguinte); para antes de uma linha incompleta.
+def _ler_registros(segmento, inicio, fim, limite):
+    itens = []
+    posicao = inicio
+    with open(segmento.caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        while len(itens) < limite and posicao < fim:
+            linha = arquivo.readline(fim - posicao)
+            if not linha.endswith(b'\n'):
+                break
+            registro = _decodificar(linha[:-1])
+            if registro is None:
+                logger.warning('Registro corrompido descartado da fila', extra={'campos': {
+                    'segmento': segmento.nome, 'posicao': posicao
+                }})
+            else:
+                itens.append((f'{segmento.nome}-{posicao}', registro))
+            posicao += len(linha)
+    return itens, posicao
+
+
+# Registro da linha que começa na posição (None se não houver uma linha válida ali)
+def _ler_registro(caminho, posicao):
+    try:
+        with open(caminho, 'rb') as arquivo:
+            arquivo.seek(posicao)
+            linha = arquivo.readline()
+    except FileNotFoundError:
+        return None
+    return _decodificar(linha[:-1]) if linha.endswith(b'\n') else None
+
+
+# Segmento da fila mantido por este processo: `fd` guarda a trava; `aberto` enquanto recebe registros
+class _Segmento:
+    def __init__(self, nome, caminho, fd, tamanho, aberto):
+        self.nome = nome
+        self.caminho = caminho
+        self.fd = fd
+        self.tamanho = tamanho
+        self.sincronizado = tamanho
+        self.aberto = aberto
+
+
+class _ChaveConcorrente(Exception):
+    pass
+
+
+class _Fila:
+    def __init__(self, diretorio, config):
+        self.diretorio = diretorio
+        self.tamanho_segmento = config['FILA_TAMANHO_SEGMENTO_MB'] * 1024 * 1024
+        self.espera_sincronizacao = config['FILA_ESPERA_SINCRONIZACAO_MS'] / 1000
+        self.tamanho_bloco = config['FILA_TAMANHO_BLOCO']
+        self.ttl_recibos = config['FILA_RECIBOS_TTL_SEGUNDOS']
+        # Protege os segmentos, o segmento ativo e os contadores; os cadastros esperam o fsync nela
+        self._condicao = threading.Condition()
+        self._sincronizando = False
+        self._ativo = None
+        self._segmentos = {}
+        self._trava_ingestao = threading.Lock()
+        self._ultima_limpeza = 0.0
+        # Acorda a ingestão quando chegam registros
+        self.sinal = threading.Event()
+        self.contadores = dict.fromkeys(('recebidos', 'sincronizacoes', 'gravados', 'duplicados', 'erros'), 0)
+        os.makedirs(diretorio, exist_ok=True)
+
+    # Cria um segmento já com a trava deste processo (criado com outro nome e renomeado, para que a
+    # recuperação de outro processo nunca o veja sem trava)
+    def _abrir_segmento(self):
+        nome = f'{int(time.time() * 1000):013d}-{secrets.token_hex(4)}'
+        caminho = os.path.join(self.diretorio, nome + EXTENSAO_SEGMENTO)
+        fd = os.open(caminho + EXTENSAO_NOVO, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(caminho + EXTENSAO_NOVO, caminho)
+        _sincronizar_diretorio(self.diretorio)
+        segmento = _Segmento(nome, caminho, fd, 0, aberto=True)
+        self._segmentos[nome] = segmento
+        return segmento
+
+    # Segmento ativo com espaço para mais `tamanho` bytes; fecha o atual (já sincronizado) quando está cheio.
+    # Chamada com a condição adquirida.
+    def _segmento_para_escrita(self, tamanho):
+        while True:
+            ativo = self._ativo
+            if ativo is not None and (ativo.tamanho == 0 or ativo.tamanho + tamanho <= self.tamanho_segmento):
+                return ativo
+            if not self._sincronizando:
+                break
+            self._condicao.wait()
+        if ativo is not None:
+            _sincronizar(ativo.fd)
+            ativo.sincronizado = ativo.tamanho
+            ativo.aberto = False
+            self.contadores['sincronizacoes'] += 1
+            self._condicao.notify_all()
+        self._ativo = self._abrir_segmento()
+        return self._ativo
+
+    # Espera a linha terminada em `fim` chegar ao disco. O primeiro cadastro a esperar sincroniza o
+    # segmento para todos que escreveram até ali; os demais esperam na condição. Chamada com a condição adquirida.
+    def _aguardar_sincronizacao(self, segmento, fim):
+        while segmento.sincronizado < fim:
+            if self._sincronizando:
+                self._condicao.wait()
+                continue
+            self._sincronizando = True
+            self._condicao.release()
+            try:
+                if self.espera_sincronizacao > 0:
+                    time.sleep(self.espera_sincronizacao)
+                alvo = segmento.tamanho
+                _sincronizar(segmento.fd)
+            finally:
+                self._condicao.acquire()
+                self._sincronizando = False
+                self._condicao.notify_all()
+            segmento.sincronizado = max(segmento.sincronizado, alvo)
+            self.contadores['sincronizacoes'] += 1
+
+    # Acrescenta o cadastro à fila e retorna o recibo depois que a linha está em disco
+    def enfileirar(self, dados, chave, ttl):
+        linha = _codificar({'recebido_em': datetime.utcnow().isoformat(), 'dados': dados, 'chave': chave, 'ttl': ttl})
+        with self._condicao:
+            segmento = self._segmento_para_escrita(len(linha))
+            recibo = f'{segmento.nome}-{segmento.tamanho}'
+            try:
+                escritos = os.write(segmento.fd, linha)
+                if escritos != len(linha):
+                    raise OSError(f'Escrita incompleta na fila ({escritos} de {len(linha)} bytes).')
+            except OSError:
+                # Linha possivelmente incompleta no fim do segmento: ele deixa de receber registros
+                segmento.tamanho = os.fstat(segmento.fd).st_size
+                segmento.aberto = False
+                self._ativo = None
+                raise
+            segmento.tamanho += len(linha)
+            self.contadores['recebidos'] += 1
+            self._aguardar_sincronizacao(segmento, segmento.tamanho)
+        self.sinal.set()
+        return recibo
+
+    # Assume os segmentos sem trava (de processos encerrados)
+    def _reivindicar_orfaos(self):
+        for arquivo in sorted(os.listdir(self.diretorio)):
+            if arquivo.endswith(EXTENSAO_NOVO):
+                self._remover_abandonado(os.path.join(self.diretorio, arquivo))
+                continue
+            nome = arquivo[:-len(EXTENSAO_SEGMENTO)]
+            if not arquivo.endswith(EXTENSAO_SEGMENTO) or nome in self._segmentos:
+                continue
+            caminho = os.path.join(self.diretorio, arquivo)
+            try:
+                fd = os.open(caminho, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # Removido por quem terminou de gravá-lo entre a abertura e a trava
+                if os.fstat(fd).st_ino != os.stat(caminho).st_ino:
+                    raise FileNotFoundError(caminho)
+            except (BlockingIOError, FileNotFoundError):
+                os.close(fd)
+                continue
+            tamanho = os.fstat(fd).st_size
+            with self._condicao:
+                self._segmentos[nome] = _Segmento(nome, caminho, fd, tamanho, aberto=False)
+            logger.info('Segmento da fila recuperado', extra={'campos': {
+                'segmento': nome, 'bytes': tamanho - _ler_posicao(caminho)
+            }})
+
+    # Segmento que ficou sem o nome definitivo (processo encerrado durante a criação)
+    def _remover_abandonado(self, caminho):
+        try:
+            fd = os.open(caminho, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(caminho)
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        finally:
+            os.close(fd)
+
+    def _remover(self, segmento):
+        with self._condicao:
+            del self._segmentos[segmento.nome]
+        os.remove(segmento.caminho)
+        try:
+            os.remove(_caminho_posicao(segmento.caminho))
+        except FileNotFoundError:
+            pass
+        os.close(segmento.fd)
+
+    # Grava no banco o próximo bloco de registros do segmento; retorna se houve progresso
+    def _ingerir_segmento(self, segmento):
+        with self._condicao:
+            fim, aberto = segmento.sincronizado, segmento.aberto
+        posicao = _ler_posicao(segmento.caminho)
+        itens, seguinte = [], posicao
+        if posicao < fim:
+            itens, seguinte = _ler_registros(segmento, posicao, fim, self.tamanho_bloco)
+        if not itens and seguinte < fim and not aberto:
+            # Final incompleto de um segmento fechado: escrita interrompida, nunca confirmada ao cliente
+            logger.warning('Final incompleto do segmento descartado', extra={'campos': {
+                'segmento': segmento.nome, 'bytes': fim - seguinte
+            }})
+            seguinte = fim
+        if itens:
+            self._gravar(itens)
+        if seguinte != posicao:
+            _gravar_posicao(segmento.caminho, seguinte)
+        if not aberto and seguinte >= fim:
+            self._remover(segmento)
+        return bool(itens) or seguinte != posicao
+
+    def _gravar(self, itens):
+        for particao, grupo in agrupar_por_particao(itens, lambda item: item[1]['dados']['empresa']):
+            with na_particao(particao):
+                contagem = _gravar_grupo(grupo)
+            self.contadores['gravados'] += contagem['gravada']
+            self.contadores['duplicados'] += contagem['duplicada']
+            self.contadores['erros'] += contagem['erro']
+
+    # Grava o próximo bloco da fila (segmentos mais antigos primeiro); retorna False quando não há o que gravar
+    def ingerir(self):
+        with self._trava_ingestao:
+            self._reivindicar_orfaos()
+            with self._condicao:
+                segmentos = sorted(self._segmentos.values(), key=lambda segmento: segmento.nome)
+            return any(self._ingerir_segmento(segmento) for segmento in segmentos)
+
+    # Remove os recibos vencidos (em todas as partições), no máximo uma vez por intervalo
+    def limpar_recibos(self):
+        if time.monotonic() - self._ultima_limpeza < INTERVALO_LIMPEZA_SEGUNDOS:
+            return
+        self._ultima_limpeza = time.monotonic()
+        limite = datetime.utcnow() - timedelta(seconds=self.ttl_recibos)
+
+        def remover():
+            db.session.execute(delete(ReciboCadastro).where(ReciboCadastro.gravado_em <= limite))
+            db.session.commit()
+
+        reunir_particoes(remover)
+
+
+def _linha_recibo(recibo, registro, estado, agora, avaliacao_id=None, erro=None):
+    return {
+        'recibo': recibo, 'estado': estado, 'avaliacao_id': avaliacao_id, 'erro': erro,
+        'recebido_em': datetime.fromisoformat(registro['recebido_em']), 'gravado_em': agora
+    }
+
+
+# Grava os registros (de uma partição) em uma transação, com os recibos; ignora os recibos já gravados
+def _gravar_transacao(itens):
+    gravados = set(db.session.execute(
+        select(ReciboCadastro.recibo).where(ReciboCadastro.recibo.in_([recibo for recibo, _ in itens]))
+    ).scalars())
+    itens = [item for item in itens if item[0] not in gravados]
+    if not itens:
+        return Counter()
+
+    agora = datetime.utcnow()
+    chaves = {registro['chave'] for _, registro in itens if registro.get('chave')}
+    existentes = dict(db.session.execute(
+        select(ChaveIdempotencia.chave, ChaveIdempotencia.avaliacao_id)
+        .where(ChaveIdempotencia.chave.in_(chaves), ChaveIdempotencia.expira_em > agora)
+    ).all()) if chaves else {}
+
+    # A primeira ocorrência de cada chave é gravada; as repetições (no banco ou no bloco) são duplicadas
+    novos = []
+    repetidos = []
+    primeiros = {}
+    for item in itens:
+        chave = item[1].get('chave')
+        if chave is not None and (chave in existentes or chave in primeiros):
+            repetidos.append(item)
+        else:
+            novos.append(item)
+            if chave is not None:
+                primeiros[chave] = item[0]
+
+    # data_avaliacao é o momento do recebimento, não o da ingestão (que pode atrasar com a fila acumulada)
+    ids = inserir_avaliacoes(
+        [registro['dados'] for _, registro in novos],
+        [datetime.fromisoformat(registro['recebido_em']) for _, registro in novos]
+    ) if novos else []
+    id_do_recibo = dict(zip((recibo for recibo, _ in novos), ids))
+    for (_, registro), avaliacao_id in zip(novos, ids):
+        # Outro processo registrou a mesma chave depois da consulta: a transação é refeita
+        if registro.get('chave') and not registrar_chave(registro['chave'], avaliacao_id, registro['ttl']):
+            raise _ChaveConcorrente()
+
+    linhas = [_linha_recibo(recibo, registro, 'gravada', agora, id_do_recibo[recibo]) for recibo, registro in novos]
+    linhas.extend(
+        _linha_recibo(recibo, registro, 'duplicada', agora,
+                      existentes.get(registro['chave']) or id_do_recibo[primeiros[registro['chave']]])
+        for recibo, registro in repetidos
+    )
+    db.session.execute(insert(ReciboCadastro.__table__), linhas)
+    db.session.commit()
+
+    for (_, registro), avaliacao_id in zip(novos, ids):
+        if registro.get('chave'):
+            lembrar_chave(registro['chave'], avaliacao_id, registro['ttl'])
+    return Counter(gravada=len(novos), duplicada=len(repetidos))
+
+
+# Grava os registros de uma partição; se a transação falhar por causa de um registro, eles são gravados um a um
+# e o que falhar sozinho recebe o recibo com o erro. Falhas do banco (OperationalError, como a trava ocupada)
+# sobem para a ingestão, que tenta de novo mais tarde a partir da mesma posição.
+def _gravar_grupo(itens):
+    for _ in range(TENTATIVAS_CHAVE_CONCORRENTE):
+        try:
+            return _gravar_transacao(itens)
+        except _ChaveConcorrente:
+            db.session.rollback()
+        except OperationalError:
+            db.session.rollback()
+            raise
+        except Exception as erro:
+            db.session.rollback()
+            if len(itens) > 1:
+                contagem = Counter()
+                for item in itens:
+                    contagem.update(_gravar_grupo([item]))
+                return contagem
+            return _gravar_erro(itens[0], erro)
+    raise RuntimeError('Chave de idempotência disputada por outro processo; o bloco será gravado de novo.')
+
+
+def _gravar_erro(item, erro):
+    recibo, registro = item
+    mensagem = str(erro) or erro.__class__.__name__
+    db.session.execute(insert(ReciboCadastro.__table__), [
+        _linha_recibo(recibo, registro, 'erro', datetime.utcnow(), erro=mensagem)
+    ])
+    db.session.commit()
+    logger.error('Cadastro da fila não gravado', extra={'campos': {'recibo': recibo, 'erro': mensagem}})
+    return Counter(erro=1)
+
+
+def _obter_fila():
+    global _fila
+    with _trava:
+        if _fila is None:
+            if fcntl is None:
+                raise ValueError('CADASTRO_MODO=fila requer um sistema POSIX (fcntl).')
+            _fila = _Fila(_diretorio(), current_app.config)
+        return _fila
+
+
+# Thread de ingestão: grava a fila sempre que chegam registros e, a cada intervalo, assume os segmentos
+# de processos encerrados
+def _ingerir_continuamente(app, fila):
+    espera = app.config['FILA_ESPERA_INGESTAO_MS'] / 1000
+    while True:
+        if fila.sinal.wait(INTERVALO_VERIFICACAO_SEGUNDOS) and espera > 0:
+            # Junta os cadastros que chegam logo em seguida na mesma transação
+            time.sleep(espera)
+        fila.sinal.clear()
+        try:
+            with app.app_context():
+                try:
+                    while fila.ingerir():
+                        pass
+                    fila.limpar_recibos()
+                finally:
+                    db.session.remove()
+        except Exception:
+            logger.exception('Falha na ingestão da fila de cadastros')
+            time.sleep(INTERVALO_NOVA_TENTATIVA_SEGUNDOS)
+
+
+# Com CADASTRO_MODO=fila, prepara a fila deste processo e inicia a thread de ingestão
+def configurar_fila(app):
+    with app.app_context():
+        if not fila_ativa():
+            return
+        fila = _obter_fila()
+    threading.Thread(target=_ingerir_continuamente, args=(app, fila), name='ingestao-cadastros', daemon=True).start()
+
+
+# Acrescenta uma avaliação já validada à fila; retorna o recibo
+def enfileirar_cadastro(dados, chave, ttl):
+    return _obter_fila().enfileirar(dados, chave, ttl)
+
+
+# Grava toda a fila no banco (inclusive os segmentos de processos encerrados); retorna os contadores da gravação
+def drenar_fila():
+    fila = _obter_fila()
+    antes = dict(fila.contadores)
+    while fila.ingerir():
+        pass
+    return {nome: fila.contadores[nome] - antes[nome] for nome in ('gravados', 'duplicados', 'erros')}
+
+
+def _buscar_recibo(recibo):
+    def buscar():
+        linha = db.session.execute(
+            select(ReciboCadastro.__table__).where(ReciboCadastro.recibo == recibo)
+        ).mappings().first()
+        return dict(linha) if linha is not None else None
+
+    for linha in reunir_particoes(buscar):
+        if linha is not None:
+            return linha
+    return None
+
+
+# Recibo para a resposta da API
+def descrever_recibo(linha):
+    descricao = {
+        'recibo': linha['recibo'],
+        'estado': linha['estado'],
+        'recebido_em': linha['recebido_em'].isoformat(),
+        'gravado_em': linha['gravado_em'].isoformat()
+    }
+    if linha['avaliacao_id'] is not None:
+        descricao['id'] = linha['avaliacao_id']
+    if linha['estado'] == 'erro':
+        descricao['erro'] = linha['erro']
+    return descricao
+
+
+# Estado de um recibo: o gravado no banco (gravada, duplicada ou erro), 'pendente' enquanto está na fila,
+# ou None (recibo inválido ou vencido)
+def consultar_recibo(recibo):
+    correspondencia = _PADRAO_RECIBO.match(recibo)
+    if correspondencia is None:
+        return None
+    linha = _buscar_recibo(recibo)
+    if linha is None:
+        posicao = int(correspondencia.group(2))
+        caminho = os.path.join(_diretorio(), correspondencia.group(1) + EXTENSAO_SEGMENTO)
+        registro = _ler_registro(caminho, posicao)
+        if registro is not None and _ler_posicao(caminho) <= posicao:
+            return {'recibo': recibo, 'estado': 'pendente', 'recebido_em': registro['recebido_em']}
+        # Gravado entre as duas consultas
+        linha = _buscar_recibo(recibo)
+    return descrever_recibo(linha) if linha is not None else None
+
+
+# Profundidade da fila (todos os processos: bytes ainda não gravados no banco, pelo tamanho de cada segmento e
+# a posição salva, sem ler os segmentos), idade do registro pendente mais antigo (a primeira linha pendente de
+# cada segmento) e os contadores deste processo
+def estado_fila():
+    fila = _obter_fila()
+    pendentes_bytes = 0
+    mais_antigo = None
+    for arquivo in sorted(os.listdir(fila.diretorio)):
+        if not arquivo.endswith(EXTENSAO_SEGMENTO):
+            continue
+        caminho = os.path.join(fila.diretorio, arquivo)
+        try:
+            posicao = _ler_posicao(caminho)
+            with open(caminho, 'rb') as segmento:
+                tamanho = os.fstat(segmento.fileno()).st_size
+                if tamanho <= posicao:
+                    continue
+                segmento.seek(posicao)
+                primeira = segmento.readline()
+        except FileNotFoundError:
+            continue
+        pendentes_bytes += tamanho - posicao
+        registro = _decodificar(primeira[:-1]) if primeira.endswith(b'\n') else None
+        if registro is not None:
+            recebido_em = datetime.fromisoformat(registro['recebido_em'])
+            mais_antigo = recebido_em if mais_antigo is None else min(mais_antigo, recebido_em)
+    with fila._condicao:
+        contadores = dict(fila.contadores)
+    return {
+        'pendentes_bytes': pendentes_bytes,
+        'defasagem_segundos': max((datetime.utcnow() - mais_antigo).total_seconds(), 0.0) if mais_antigo else 0.0,
+        **contadores
+    }
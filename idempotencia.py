@@ -0,0 +1,90 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, ChaveIdempotencia
+from cache import CacheLRU
+
+# Camada de idempotência do cadastro de avaliações.
+# A chave vem do cabeçalho Idempotency-Key ou, na falta dele, do hash do conteúdo enviado.
+# As chaves ficam em um cache em memória (TTL + LRU) e na tabela chave_idempotencia,
+# que é compartilhada por todos os processos.
+
+_cache = None
+_ultima_limpeza = 0.0
+
+# Intervalo mínimo entre as remoções de chaves expiradas da tabela
+INTERVALO_LIMPEZA_SEGUNDOS = 60
+
+
+def _obter_cache():
+    global _cache
+    if _cache is None:
+        _cache = CacheLRU(current_app.config['IDEMPOTENCIA_TAMANHO_CACHE'])
+    return _cache
+
+
+# Calcula a chave de idempotência e o seu TTL; retorna (None, 0) quando desativada
+def calcular_chave(dados, chave_cliente=None):
+    if chave_cliente:
+        chave = 'cliente:' + hashlib.sha256(chave_cliente.encode('utf-8')).hexdigest()
+        return chave, current_app.config['IDEMPOTENCIA_TTL_SEGUNDOS']
+
+    ttl = current_app.config['IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS']
+    if ttl <= 0:
+        return None, 0
+    conteudo = json.dumps(dados, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return 'conteudo:' + hashlib.sha256(conteudo.encode('utf-8')).hexdigest(), ttl
+
+
+# Retorna o id da avaliação já registrada com esta chave (ou None)
+def buscar_avaliacao(chave):
+    cache = _obter_cache()
+    avaliacao_id = cache.obter(chave)
+    if avaliacao_id is not None:
+        return avaliacao_id
+
+    linha = db.session.execute(
+        select(ChaveIdempotencia.avaliacao_id, ChaveIdempotencia.expira_em)
+        .where(ChaveIdempotencia.chave == chave, ChaveIdempotencia.expira_em > datetime.utcnow())
+    ).first()
+    if linha is None:
+        return None
+    cache.guardar(chave, linha.avaliacao_id, (linha.expira_em - datetime.utcnow()).total_seconds())
+    return linha.avaliacao_id
+
+
+# Registra a chave para a avaliação na transação atual.
+# Retorna False se outro processo já registrou a mesma chave (ainda válida).
+def registrar_chave(chave, avaliacao_id, ttl):
+    global _ultima_limpeza
+    agora = datetime.utcnow()
+    instrucao = sqlite_insert(ChaveIdempotencia.__table__).values(
+        chave=chave, avaliacao_id=avaliacao_id, expira_em=agora + timedelta(seconds=ttl)
+    )
+    # Uma chave expirada pode ser reaproveitada; uma chave válida não é sobrescrita
+    instrucao = instrucao.on_conflict_do_update(
+        index_elements=['chave'],
+        set_={'avaliacao_id': instrucao.excluded.avaliacao_id, 'expira_em': instrucao.excluded.expira_em},
+        where=ChaveIdempotencia.__table__.c.expira_em <= agora
+    )
+    if db.session.execute(instrucao).rowcount == 0:
+        return False
+
+    if time.monotonic() - _ultima_limpeza > INTERVALO_LIMPEZA_SEGUNDOS:
+        _ultima_limpeza = time.monotonic()
+        db.session.execute(delete(ChaveIdempotencia).where(ChaveIdempotencia.expira_em <= agora))
+    return True
+
+
+# Guarda a chave no cache em memória depois do commit
+def lembrar_chave(chave, avaliacao_id, ttl):
+    _obter_cache().guardar(chave, avaliacao_id, ttl)
+
+
+# Descarta o cache em memória deste processo (ex.: depois da remoção de avaliações)
+def esquecer_chaves():
+    _obter_cache().limpar()
@@ -0,0 +1,260 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timezone
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from models import db
+
+# Instrumentação das requisições e logs estruturados.
+# Cada requisição registra o tempo total e as instruções SQL executadas (quantidade e tempo,
+# pelos eventos do engine) por rota; os histogramas saem no formato texto do Prometheus em /metrics.
+# As métricas são do processo que atende a requisição (cada worker do servidor tem as suas).
+# Com INSTRUMENTACAO_LIMITE_LENTO_MS > 0, requisições mais lentas são registradas no log com as consultas.
+# As consultas feitas pelas threads das partições (particoes.reunir_particoes) contam na requisição que as
+# disparou; as leituras direto no cursor do driver (relatorio_numpy) são registradas por registrar_consulta.
+
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Tamanho máximo de cada instrução SQL guardada para o log de requisições lentas
+TAMANHO_MAXIMO_SQL = 500
+
+logger = logging.getLogger('instrumentacao')
+
+# Loggers da aplicação que recebem o nível de LOG_NIVEL (além do app.logger); o log raiz e os das
+# bibliotecas (werkzeug, sqlalchemy...) mantêm o nível configurado pelo servidor
+LOGGERS_DA_APLICACAO = ('instrumentacao', 'relatorio', 'leitura', 'deduplicacao', 'fila_cadastros')
+
+
+# Histograma cumulativo no formato do Prometheus
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{_rotulos(rotulos + (("le", _numero(limite)),))} {acumulado}'
+        yield f'{nome}_sum{_rotulos(rotulos)} {_numero(self.soma)}'
+        yield f'{nome}_count{_rotulos(rotulos)} {acumulado}'
+
+
+def _numero(valor):
+    if isinstance(valor, str):
+        return valor
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+# Métricas das requisições deste processo: {(metodo, rota): histograma} e {(metodo, rota, status): total}
+class Metricas:
+    def __init__(self):
+        self.duracao = {}
+        self.consultas = {}
+        self.duracao_sql = {}
+        self.requisicoes = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, metodo, rota, status, duracao, consultas, duracao_sql):
+        chave = (metodo, rota)
+        with self._trava:
+            if chave not in self.duracao:
+                self.duracao[chave] = Histograma(LIMITES_DURACAO)
+                self.consultas[chave] = Histograma(LIMITES_CONSULTAS)
+                self.duracao_sql[chave] = Histograma(LIMITES_DURACAO)
+            self.duracao[chave].observar(duracao)
+            self.consultas[chave].observar(consultas)
+            self.duracao_sql[chave].observar(duracao_sql)
+            self.requisicoes[chave + (status,)] = self.requisicoes.get(chave + (status,), 0) + 1
+
+    # Texto no formato de exposição do Prometheus (versão 0.0.4); `contadores` e `medidores` acrescentam
+    # contadores e medidores (gauges) simples já calculados: [(nome, ajuda, valor)]
+    def exportar(self, contadores=(), medidores=()):
+        with self._trava:
+            linhas = [
+                '# HELP rp_requisicoes_total Requisições atendidas por rota e status.',
+                '# TYPE rp_requisicoes_total counter',
+            ]
+            for (metodo, rota, status), total in sorted(self.requisicoes.items()):
+                linhas.append(f'rp_requisicoes_total{_rotulos((("metodo", metodo), ("rota", rota), ("status", status)))} {total}')
+            for nome, ajuda, histogramas in (
+                ('rp_requisicao_duracao_segundos', 'Tempo total da requisição.', self.duracao),
+                ('rp_requisicao_consultas_sql', 'Instruções SQL executadas por requisição.', self.consultas),
+                ('rp_requisicao_sql_duracao_segundos', 'Tempo das instruções SQL por requisição.', self.duracao_sql),
+            ):
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} histogram')
+                for (metodo, rota), histograma in sorted(histogramas.items()):
+                    linhas.extend(histograma.linhas(nome, (('metodo', metodo), ('rota', rota))))
+        for tipo, valores in (('counter', contadores), ('gauge', medidores)):
+            for nome, ajuda, valor in valores:
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} {tipo}')
+                linhas.append(f'{nome} {_numero(valor)}')
+        return '\n'.join(linhas) + '\n'
+
+
+metricas = Metricas()
+
+
+# Formata os registros de log como JSON (LOG_FORMATO=json) ou texto com pares chave=valor.
+# Campos estruturados vão em extra={'campos': {...}}.
+class FormatadorLog(logging.Formatter):
+    def __init__(self, formato='texto'):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.formato = formato
+
+    def format(self, registro):
+        campos = getattr(registro, 'campos', None) or {}
+        if self.formato == 'json':
+            dados = {
+                'momento': datetime.fromtimestamp(registro.created, timezone.utc).isoformat(timespec='milliseconds'),
+                'nivel': registro.levelname,
+                'logger': registro.name,
+                'mensagem': registro.getMessage(),
+                **campos
+            }
+            if registro.exc_info:
+                dados['excecao'] = self.formatException(registro.exc_info)
+            return json.dumps(dados, ensure_ascii=False, default=str)
+        texto = super().format(registro)
+        if campos:
+            texto += ' ' + ' '.join(f'{nome}={json.dumps(valor, ensure_ascii=False, default=str)}'
+                                    for nome, valor in campos.items())
+        return texto
+
+
+# Instala o formato da configuração no log raiz (se nenhum handler foi configurado antes, por exemplo pelo
+# servidor WSGI) e aplica o nível da configuração só aos loggers da aplicação
+def configurar_logs(app):
+    raiz = logging.getLogger()
+    if not raiz.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(FormatadorLog(app.config['LOG_FORMATO']))
+        raiz.addHandler(handler)
+    nivel = app.config['LOG_NIVEL'].upper()
+    app.logger.setLevel(nivel)
+    for nome in LOGGERS_DA_APLICACAO:
+        logging.getLogger(nome).setLevel(nivel)
+
+
+def _antes_da_consulta(conexao, _cursor, _instrucao, _parametros, _contexto, _executemany):
+    conexao.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+
+def _depois_da_consulta(conexao, _cursor, instrucao, _parametros, _contexto, _executemany):
+    inicios = conexao.info.get('inicio_consultas')
+    if not inicios:
+        return
+    registrar_consulta(instrucao, time.perf_counter() - inicios.pop())
+
+
+# Medidas da requisição em andamento (ou da requisição que disparou a thread de partição atual)
+def medidas_atuais():
+    if not has_app_context():
+        return None
+    return g.get('instrumentacao')
+
+
+# Soma uma instrução SQL às medidas da requisição atual; também chamada por quem executa SQL direto no
+# cursor do driver, fora dos eventos do engine
+def registrar_consulta(instrucao, duracao):
+    medidas = medidas_atuais()
+    if medidas is None:
+        return
+    with medidas['trava']:
+        medidas['consultas'] += 1
+        medidas['duracao_sql'] += duracao
+        if medidas['instrucoes'] is not None:
+            medidas['instrucoes'].append({'sql': instrucao[:TAMANHO_MAXIMO_SQL], 'ms': round(duracao * 1000, 3)})
+
+
+# Instrução que falhou: descarta o início guardado
+def _erro_na_consulta(contexto):
+    if contexto.connection is not None and contexto.connection.info.get('inicio_consultas'):
+        contexto.connection.info['inicio_consultas'].pop()
+
+
+def _iniciar_requisicao():
+    limite_lento_ms = current_app.config['INSTRUMENTACAO_LIMITE_LENTO_MS']
+    g.instrumentacao = {
+        'inicio': time.perf_counter(),
+        'consultas': 0,
+        'duracao_sql': 0.0,
+        # As threads das partições somam nas mesmas medidas
+        'trava': threading.Lock(),
+        'limite_lento_ms': limite_lento_ms,
+        # As instruções só são guardadas quando o log de requisições lentas está ativo
+        'instrucoes': [] if limite_lento_ms > 0 else None,
+    }
+
+
+def _registrar_requisicao(medidas, status):
+    duracao = time.perf_counter() - medidas['inicio']
+    rota = request.url_rule.rule if request.url_rule is not None else 'sem_rota'
+    metricas.registrar(request.method, rota, str(status), duracao, medidas['consultas'], medidas['duracao_sql'])
+
+    if medidas['instrucoes'] is not None and duracao * 1000 >= medidas['limite_lento_ms']:
+        logger.warning('Requisição lenta', extra={'campos': {
+            'metodo': request.method,
+            'caminho': request.full_path.rstrip('?'),
+            'rota': rota,
+            'status': status,
+            'duracao_ms': round(duracao * 1000, 3),
+            'consultas_sql': medidas['consultas'],
+            'sql_ms': round(medidas['duracao_sql'] * 1000, 3),
+            'consultas': medidas['instrucoes'],
+        }})
+
+
+# Registra a requisição; em respostas geradas em fluxo, mede até o início do envio
+def _finalizar_requisicao(resposta):
+    medidas = g.pop('instrumentacao', None)
+    if medidas is not None:
+        _registrar_requisicao(medidas, resposta.status_code)
+    return resposta
+
+
+# Requisição encerrada sem passar por _finalizar_requisicao (exceção não tratada na view ou nos ganchos):
+# registrada com status 500
+def _encerrar_requisicao(_erro):
+    medidas = g.pop('instrumentacao', None)
+    if medidas is not None:
+        _registrar_requisicao(medidas, 500)
+
+
+# Registra a contagem e o tempo das instruções SQL de um engine (também usado nos engines das partições)
+def instrumentar_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _antes_da_consulta)
+    event.listen(engine, 'after_cursor_execute', _depois_da_consulta)
+    event.listen(engine, 'handle_error', _erro_na_consulta)
+
+
+# Instala os logs, os eventos dos engines e os ganchos de requisição na aplicação
+def configurar_instrumentacao(app):
+    configurar_logs(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            instrumentar_engine(engine)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+    app.teardown_request(_encerrar_requisicao)
@@ -0,0 +1,153 @@
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from flask import current_app, g, make_response
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from models import db, VersaoBanco
+
+# Roteamento das consultas analíticas (relatório, tendência, exportação, listagem e tarefas) para fora
+# do banco principal, para que não disputem conexões e travas com os cadastros. LEITURA_MODO:
+# 'primario': tudo no banco principal (padrão).
+# 'somente_leitura': mesmo arquivo, em um pool de conexões separado com PRAGMA query_only.
+# 'copia': uma cópia do arquivo feita com a API de backup do SQLite e atualizada a cada
+#          LEITURA_COPIA_INTERVALO_SEGUNDOS; o momento da cópia fica gravado nela (versao_banco),
+#          e as respostas roteadas informam a defasagem nos cabeçalhos X-Leitura-*.
+# As rotas marcadas com @rotear_leitura definem g.leitura_roteada; a SessaoRoteada (models.py) envia
+# os SELECT dessas requisições ao bind 'leitura'.
+
+MODOS_LEITURA = ('primario', 'somente_leitura', 'copia')
+
+# Componente de versao_banco com o momento (UTC) em que a cópia foi tirada
+COMPONENTE_COPIA = 'copia_leitura'
+
+logger = logging.getLogger(__name__)
+
+
+# Inclui o bind 'leitura' em SQLALCHEMY_BINDS; deve ser chamada antes de db.init_app
+def preparar_leitura(app):
+    modo = app.config['LEITURA_MODO']
+    if modo not in MODOS_LEITURA:
+        raise ValueError(f"LEITURA_MODO deve ser {', '.join(MODOS_LEITURA)}.")
+    if modo == 'primario':
+        return
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite':
+        raise ValueError('LEITURA_MODO só é suportado com SQLite.')
+    if modo == 'copia':
+        url = url.set(database=app.config['LEITURA_COPIA_ARQUIVO'] or f'{url.database}.leitura')
+    app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}),
+                                      'leitura': url.render_as_string(hide_password=False)}
+
+
+def _somente_leitura(conexao_dbapi, _registro):
+    cursor = conexao_dbapi.cursor()
+    try:
+        cursor.execute('PRAGMA query_only = ON')
+    finally:
+        cursor.close()
+
+
+# Protege o bind 'leitura' contra escritas e, no modo 'copia', cria a cópia e inicia a atualização periódica
+def configurar_leitura(app):
+    modo = app.config['LEITURA_MODO']
+    if modo == 'primario':
+        return
+    with app.app_context():
+        event.listen(db.engines['leitura'], 'connect', _somente_leitura)
+    if modo == 'copia':
+        with app.app_context():
+            if defasagem_leitura() is None:
+                atualizar_copia()
+        threading.Thread(target=_atualizar_periodicamente, args=(app,), name='copia-leitura', daemon=True).start()
+
+
+# Copia o banco principal para o arquivo do bind 'leitura' em uma única etapa da API de backup
+# (os leitores da cópia continuam lendo a versão anterior até o fim da cópia)
+def atualizar_copia():
+    origem = db.engines[None].url.database
+    destino = db.engines['leitura'].url.database
+    inicio = time.perf_counter()
+    momento = datetime.utcnow()
+    with closing(sqlite3.connect(origem, timeout=30)) as conexao_origem, \
+            closing(sqlite3.connect(destino, timeout=30)) as conexao_destino:
+        conexao_origem.backup(conexao_destino)
+        try:
+            conexao_destino.execute(
+                'INSERT INTO versao_banco (componente, versao) VALUES (?, ?) '
+                'ON CONFLICT (componente) DO UPDATE SET versao = excluded.versao',
+                (COMPONENTE_COPIA, momento.isoformat())
+            )
+            conexao_destino.commit()
+        except sqlite3.OperationalError:
+            return  # banco principal ainda sem esquema; a próxima atualização grava o momento
+    logger.info('Cópia de leitura atualizada', extra={'campos': {
+        'arquivo': destino, 'duracao_ms': round((time.perf_counter() - inicio) * 1000, 1)
+    }})
+
+
+# Cada processo tem a sua thread; a cópia só é refeita quando ninguém a atualizou dentro do intervalo
+def _atualizar_periodicamente(app):
+    intervalo = app.config['LEITURA_COPIA_INTERVALO_SEGUNDOS']
+    while True:
+        time.sleep(intervalo)
+        try:
+            with app.app_context():
+                defasagem = defasagem_leitura()
+                if defasagem is None or defasagem >= intervalo:
+                    atualizar_copia()
+        except Exception:
+            logger.exception('Falha ao atualizar a cópia de leitura')
+
+
+# Momento (UTC) dos dados servidos pelo bind 'leitura': None no modo 'primario' ou sem cópia ainda
+def momento_leitura():
+    modo = current_app.config['LEITURA_MODO']
+    if modo == 'primario':
+        return None
+    if modo == 'somente_leitura':
+        return datetime.utcnow()
+    with db.engines['leitura'].connect() as conexao:
+        try:
+            versao = conexao.execute(
+                select(VersaoBanco.versao).where(VersaoBanco.componente == COMPONENTE_COPIA)
+            ).scalar()
+        except OperationalError:
+            return None  # cópia de um banco ainda não inicializado
+    return datetime.fromisoformat(versao) if versao else None
+
+
+def _segundos_desde(momento):
+    return max((datetime.utcnow() - momento).total_seconds(), 0.0)
+
+
+# Segundos desde o momento dos dados de leitura (None quando não se aplica)
+def defasagem_leitura():
+    momento = momento_leitura()
+    return _segundos_desde(momento) if momento is not None else None
+
+
+# Marca a requisição (ou tarefa) atual para ler do bind 'leitura'
+def ativar_leitura_roteada():
+    if current_app.config['LEITURA_MODO'] != 'primario':
+        g.leitura_roteada = True
+
+
+# Decorador das rotas analíticas: consultas no bind 'leitura' e defasagem nos cabeçalhos da resposta
+def rotear_leitura(rota):
+    @functools.wraps(rota)
+    def envoltorio(*args, **kwargs):
+        ativar_leitura_roteada()
+        resposta = make_response(rota(*args, **kwargs))
+        if g.get('leitura_roteada'):
+            momento = momento_leitura()
+            if momento is not None:
+                resposta.headers['X-Leitura-Atualizada-Em'] = momento.isoformat(timespec='seconds') + 'Z'
+                resposta.headers['X-Leitura-Defasagem-Segundos'] = str(round(_segundos_desde(momento), 1))
+        return resposta
+    return envoltorio
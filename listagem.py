@@ -0,0 +1,99 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel
+from catalogo import obter_catalogo
+from empacotamento import expandir_respostas
+from relatorio import ParametroInvalido, _filtrar
+
+# Listagem das avaliações para auditoria, da mais recente para a mais antiga, paginada por cursor
+# (keyset em data_avaliacao, id): cada página continua a partir da última linha da anterior pelos
+# índices de data (ix_avaliacao_data, ix_avaliacao_empresa_data e ix_avaliacao_empresa_departamento_data),
+# então o custo de uma página não depende da profundidade. As respostas da página são lidas em uma
+# consulta por tabela de respostas; as avaliações compactas são decodificadas em memória.
+# data_avaliacao é NOT NULL (as datas nulas de bancos antigos são preenchidas por migracoes.atualizar_esquema).
+
+LIMITE_PADRAO_LISTAGEM = 50
+LIMITE_MAXIMO_LISTAGEM = 500
+
+
+# Cursor opaco (base64 de [data ISO, id]) da última avaliação de uma página
+def codificar_cursor(data_avaliacao, avaliacao_id):
+    conteudo = json.dumps([data_avaliacao.isoformat(), avaliacao_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(conteudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        conteudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data_avaliacao, avaliacao_id = json.loads(conteudo)
+        return datetime.fromisoformat(data_avaliacao), int(avaliacao_id)
+    except (ValueError, TypeError):
+        raise ParametroInvalido("Parâmetro 'cursor' inválido.")
+
+
+# Respostas das avaliações em linhas da página: {id: (respostas_nivel1, respostas_nivel2)}
+def _respostas_em_linhas(ids):
+    respostas = {avaliacao_id: ([], []) for avaliacao_id in ids}
+    for avaliacao_id, tema_id, selecionado in db.session.execute(
+        select(RespostaPrimeiroNivel.avaliacao_id, RespostaPrimeiroNivel.tema_id, RespostaPrimeiroNivel.selecionado)
+        .where(RespostaPrimeiroNivel.avaliacao_id.in_(ids))
+        .order_by(RespostaPrimeiroNivel.avaliacao_id, RespostaPrimeiroNivel.tema_id)
+    ):
+        respostas[avaliacao_id][0].append({'tema_id': tema_id, 'selecionado': selecionado})
+    for avaliacao_id, subtema_id, nivel in db.session.execute(
+        select(RespostaSegundoNivel.avaliacao_id, RespostaSegundoNivel.subtema_id, RespostaSegundoNivel.nivel_desconforto)
+        .where(RespostaSegundoNivel.avaliacao_id.in_(ids))
+        .order_by(RespostaSegundoNivel.avaliacao_id, RespostaSegundoNivel.subtema_id)
+    ):
+        respostas[avaliacao_id][1].append({'subtema_id': subtema_id, 'nivel_desconforto': nivel})
+    return respostas
+
+
+# Uma página da listagem: {'avaliacoes': [...], 'proximo_cursor': cursor ou None na última página}
+def listar_avaliacoes(empresa=None, departamento=None, funcao=None, desde=None, ate=None,
+                      limite=LIMITE_PADRAO_LISTAGEM, cursor=None, incluir_respostas=False):
+    ordem = (Avaliacao.data_avaliacao, Avaliacao.id)
+    consulta = _filtrar(
+        select(Avaliacao.id, Avaliacao.empresa, Avaliacao.departamento, Avaliacao.funcao, Avaliacao.data_avaliacao,
+               Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas),
+        empresa, departamento, desde=desde, ate=ate
+    )
+    if funcao:
+        consulta = consulta.where(Avaliacao.funcao == funcao)
+    if cursor:
+        consulta = consulta.where(tuple_(*ordem) < tuple_(*decodificar_cursor(cursor)))
+    # Uma linha a mais indica se há próxima página
+    linhas = db.session.execute(
+        consulta.order_by(*(coluna.desc() for coluna in ordem)).limit(limite + 1)
+    ).all()
+    pagina = linhas[:limite]
+
+    respostas = {}
+    if incluir_respostas and pagina:
+        ids_em_linhas = [linha.id for linha in pagina if linha.temas_selecionados is None]
+        if ids_em_linhas:
+            respostas = _respostas_em_linhas(ids_em_linhas)
+        catalogo = obter_catalogo()
+        for linha in pagina:
+            if linha.temas_selecionados is not None:
+                respostas[linha.id] = expandir_respostas(linha.temas_selecionados, linha.niveis_subtemas, catalogo)
+
+    avaliacoes = []
+    for linha in pagina:
+        avaliacao = {
+            'id': linha.id,
+            'empresa': linha.empresa,
+            'departamento': linha.departamento,
+            'funcao': linha.funcao,
+            'data_avaliacao': linha.data_avaliacao.isoformat(),
+        }
+        if incluir_respostas:
+            avaliacao['respostas_nivel1'], avaliacao['respostas_nivel2'] = respostas[linha.id]
+        avaliacoes.append(avaliacao)
+
+    proximo_cursor = None
+    if len(linhas) > limite:
+        proximo_cursor = codificar_cursor(pagina[-1].data_avaliacao, pagina[-1].id)
+    return {'avaliacoes': avaliacoes, 'proximo_cursor': proximo_cursor}
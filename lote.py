@@ -0,0 +1,142 @@
+import codecs
+import json
+import re
+from models import db
+from avaliacoes import validar_avaliacao, inserir_avaliacoes
+from particoes import agrupar_por_particao, na_particao
+
+# Importação em massa de avaliações (quiosques offline e formulários digitalizados).
+# O corpo é lido em pedaços, como NDJSON (uma avaliação por linha) ou array JSON,
+# sem carregar a requisição inteira na memória.
+
+TAMANHO_LEITURA = 64 * 1024
+
+
+# Lê o fluxo em pedaços de texto
+def _pedacos(fluxo):
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        dados = fluxo.read(TAMANHO_LEITURA)
+        if not dados:
+            final = decodificador.decode(b'', final=True)
+            if final:
+                yield final
+            return
+        texto = decodificador.decode(dados)
+        if texto:
+            yield texto
+
+
+# Gera (registro, erro) para cada avaliação do corpo, detectando NDJSON ou array JSON
+def ler_registros(fluxo):
+    pedacos = _pedacos(fluxo)
+    buffer = ''
+    for pedaco in pedacos:
+        buffer += pedaco
+        if buffer.strip():
+            break
+    buffer = buffer.lstrip()
+    if buffer.startswith('['):
+        yield from _ler_array(buffer[1:], pedacos)
+    else:
+        yield from _ler_ndjson(buffer, pedacos)
+
+
+def _decodificar_linha(linha):
+    try:
+        return json.loads(linha), None
+    except ValueError as erro:
+        return None, f'JSON inválido: {erro}'
+
+
+def _ler_ndjson(buffer, pedacos):
+    while True:
+        *linhas, buffer = buffer.split('\n')
+        for linha in linhas:
+            if linha.strip():
+                yield _decodificar_linha(linha)
+        pedaco = next(pedacos, None)
+        if pedaco is None:
+            break
+        buffer += pedaco
+    if buffer.strip():
+        yield _decodificar_linha(buffer)
+
+
+def _ler_array(buffer, pedacos):
+    decodificador = json.JSONDecoder()
+    separadores = re.compile(r'[\s,]*')
+    posicao = 0
+    fim = False
+    while True:
+        posicao = separadores.match(buffer, posicao).end()
+        if posicao < len(buffer) and buffer[posicao] == ']':
+            return
+        if posicao < len(buffer):
+            try:
+                registro, posicao = decodificador.raw_decode(buffer, posicao)
+                yield registro, None
+                continue
+            except ValueError as erro:
+                # Pode ser apenas um registro incompleto no buffer: lê mais antes de desistir
+                if fim:
+                    yield None, f'JSON inválido: {erro}'
+                    return
+        elif fim:
+            yield None, 'Array JSON não foi fechado.'
+            return
+        pedaco = next(pedacos, None)
+        if pedaco is None:
+            fim = True
+        else:
+            buffer = buffer[posicao:] + pedaco
+            posicao = 0
+
+
+# Grava um bloco de avaliações válidas em uma transação (uma por partição, com particionamento)
+# e registra o resultado de cada uma
+def _gravar_bloco(bloco, resultados):
+    inseridas = 0
+    for particao, itens in agrupar_por_particao(bloco, lambda item: item[1]['empresa']):
+        with na_particao(particao):
+            try:
+                ids = inserir_avaliacoes([dados for _, dados in itens])
+                db.session.commit()
+            except Exception as erro:
+                db.session.rollback()
+                for indice, _ in itens:
+                    resultados.append({'indice': indice, 'erro': f'Falha ao gravar o bloco: {erro}'})
+                continue
+        for (indice, _), avaliacao_id in zip(itens, ids):
+            resultados.append({'indice': indice, 'id': avaliacao_id})
+        inseridas += len(ids)
+    return inseridas
+
+
+# Importa as avaliações do fluxo em blocos de tamanho_bloco; retorna o resultado por registro
+def importar_lote(fluxo, tamanho_bloco):
+    resultados = []
+    inseridas = 0
+    total = 0
+    bloco = []
+    for indice, (registro, erro) in enumerate(ler_registros(fluxo)):
+        total += 1
+        if erro is None:
+            erro = validar_avaliacao(registro)
+        if erro is not None:
+            resultados.append({'indice': indice, 'erro': erro})
+            continue
+        bloco.append((indice, registro))
+        if len(bloco) >= tamanho_bloco:
+            inseridas += _gravar_bloco(bloco, resultados)
+            bloco = []
+    if bloco:
+        inseridas += _gravar_bloco(bloco, resultados)
+
+    resultados.sort(key=lambda resultado: resultado['indice'])
+    return {
+        'total': total,
+        'inseridas': inseridas,
+        'erros': total - inseridas,
+        'resultados': resultados
+    }
@@ -0,0 +1,263 @@
+import hashlib
+from datetime import datetime
+from sqlalchemy import MetaData, bindparam, delete, func, insert, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn, CreateTable
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel, Recomendacao, VersaoBanco
+from agregados import reconstruir_agregados
+from relatorio import consulta_temas, consulta_subtemas
+from catalogo import obter_catalogo
+from empacotamento import compactar_respostas, expandir_respostas
+
+# Atualização idempotente do esquema de bancos já existentes (riscos_psicossociais.db).
+# db.create_all só cria tabelas novas; colunas e índices de tabelas antigas são criados aqui.
+
+
+# Adiciona as colunas (anuláveis) que faltam nas tabelas existentes; retorna 'tabela.coluna' de cada uma
+def _adicionar_colunas():
+    adicionadas = []
+    for tabela in db.metadata.sorted_tables:
+        existentes = {linha[1] for linha in db.session.execute(text(f'PRAGMA table_info("{tabela.name}")'))}
+        if not existentes:
+            continue
+        for coluna in tabela.columns:
+            if coluna.name not in existentes and coluna.nullable:
+                definicao = CreateColumn(coluna).compile(dialect=db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE "{tabela.name}" ADD COLUMN {definicao}'))
+                adicionadas.append(f'{tabela.name}.{coluna.name}')
+    return adicionadas
+
+
+# Assinatura do esquema declarado nos modelos (tabelas, colunas e índices); muda sozinha quando um modelo muda
+def assinatura_esquema():
+    partes = []
+    for tabela in sorted(db.metadata.sorted_tables, key=lambda tabela: tabela.name):
+        partes.append(tabela.name)
+        partes.extend(f'{coluna.name}:{coluna.type}:{coluna.nullable}' for coluna in tabela.columns)
+        partes.extend(sorted(
+            f"{indice.name}:{','.join(coluna.name for coluna in indice.columns)}:{indice.unique}" for indice in tabela.indexes
+        ))
+    return hashlib.sha256('\n'.join(partes).encode('utf-8')).hexdigest()[:32]
+
+
+# Versões gravadas no banco ({} em bancos criados antes da tabela versao_banco)
+def ler_versoes():
+    try:
+        return dict(db.session.execute(select(VersaoBanco.componente, VersaoBanco.versao)).all())
+    except OperationalError:
+        db.session.rollback()
+        return {}
+
+
+# Grava a versão de um componente (sem fazer commit)
+def gravar_versao(componente, versao):
+    instrucao = sqlite_insert(VersaoBanco.__table__).values(componente=componente, versao=versao)
+    db.session.execute(instrucao.on_conflict_do_update(
+        index_elements=['componente'], set_={'versao': instrucao.excluded.versao}
+    ))
+
+
+# Data gravada nas avaliações sem data_avaliacao de bancos antigos: a mais antiga, para que continuem no fim da
+# listagem (a paginação por cursor em data_avaliacao, id não alcança linhas com data nula)
+DATA_AVALIACAO_DESCONHECIDA = datetime(1970, 1, 1)
+
+
+# Preenche as datas nulas e reconstrói a tabela avaliacao com data_avaliacao NOT NULL (o SQLite não altera a
+# restrição de uma coluna existente); os índices da tabela são recriados em seguida por atualizar_esquema.
+# Retorna a quantidade de avaliações preenchidas
+def _exigir_data_avaliacao():
+    obrigatorias = {linha[1]: linha[3] for linha in db.session.execute(text('PRAGMA table_info("avaliacao")'))}
+    if obrigatorias.get('data_avaliacao', 1):
+        return 0
+    preenchidas = db.session.execute(
+        update(Avaliacao).where(Avaliacao.data_avaliacao.is_(None)).values(data_avaliacao=DATA_AVALIACAO_DESCONHECIDA)
+    ).rowcount
+    tabela = Avaliacao.__table__
+    nova = tabela.to_metadata(MetaData(), name='avaliacao_nova')
+    colunas = ', '.join(f'"{coluna.name}"' for coluna in tabela.columns)
+    db.session.execute(CreateTable(nova))
+    db.session.execute(text(f'INSERT INTO avaliacao_nova ({colunas}) SELECT {colunas} FROM avaliacao'))
+    db.session.execute(text('DROP TABLE avaliacao'))
+    db.session.execute(text('ALTER TABLE avaliacao_nova RENAME TO avaliacao'))
+    return preenchidas
+
+
+# Índices substituídos por outros mais completos, removidos dos bancos existentes
+INDICES_OBSOLETOS = ('ix_avaliacao_empresa_departamento',)
+
+
+# Remove respostas repetidas (mesma avaliação e tema/subtema), mantendo a primeira,
+# para que os índices únicos possam ser criados. Retorna a quantidade removida.
+def _remover_respostas_repetidas(modelo, coluna):
+    primeiras = select(func.min(modelo.id)).group_by(modelo.avaliacao_id, coluna)
+    resultado = db.session.execute(modelo.__table__.delete().where(modelo.id.not_in(primeiras)))
+    return resultado.rowcount
+
+
+# Cria as colunas e os índices que faltam; pode ser executada quantas vezes for necessário
+def atualizar_esquema():
+    colunas = _adicionar_colunas()
+    datas_preenchidas = _exigir_data_avaliacao()
+    removidas = 0
+    indices_existentes = {
+        linha[0] for linha in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    }
+    if 'ux_resposta_primeiro_nivel_avaliacao_tema' not in indices_existentes:
+        removidas += _remover_respostas_repetidas(RespostaPrimeiroNivel, RespostaPrimeiroNivel.tema_id)
+    if 'ux_resposta_segundo_nivel_avaliacao_subtema' not in indices_existentes:
+        removidas += _remover_respostas_repetidas(RespostaSegundoNivel, RespostaSegundoNivel.subtema_id)
+    if removidas:
+        reconstruir_agregados()
+    db.session.commit()
+
+    conexao = db.session.connection()
+    criados = []
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            if indice.name not in indices_existentes:
+                indice.create(bind=conexao, checkfirst=True)
+                criados.append(indice.name)
+    removidos = [nome for nome in INDICES_OBSOLETOS if nome in indices_existentes]
+    for nome in removidos:
+        db.session.execute(text(f'DROP INDEX IF EXISTS "{nome}"'))
+    db.session.commit()
+    return {'colunas_adicionadas': colunas, 'indices_criados': criados, 'indices_removidos': removidos,
+            'respostas_repetidas_removidas': removidas, 'datas_avaliacao_preenchidas': datas_preenchidas}
+
+
+# Converte as avaliações já gravadas para o armazenamento 'compacto' ou de volta para 'linhas'.
+# Trabalha em blocos de avaliações (um commit por bloco) e reconstrói os agregados no final.
+# Respostas de primeiro nível não selecionadas não são guardadas no formato compacto.
+def converter_armazenamento(destino, tamanho_bloco=1000):
+    if destino not in ('compacto', 'linhas'):
+        raise ValueError("Destino deve ser 'compacto' ou 'linhas'.")
+    catalogo = obter_catalogo()
+    converter_bloco = _compactar_bloco if destino == 'compacto' else _expandir_bloco
+    pendentes = (
+        Avaliacao.temas_selecionados.is_(None) if destino == 'compacto'
+        else Avaliacao.temas_selecionados.is_not(None)
+    )
+    convertidas = 0
+    ultimo_id = 0
+    while True:
+        ids = db.session.execute(
+            select(Avaliacao.id).where(pendentes, Avaliacao.id > ultimo_id).order_by(Avaliacao.id).limit(tamanho_bloco)
+        ).scalars().all()
+        if not ids:
+            break
+        converter_bloco(ids, catalogo)
+        db.session.commit()
+        convertidas += len(ids)
+        ultimo_id = ids[-1]
+
+    reconstruir_agregados()
+    db.session.commit()
+    return {'destino': destino, 'avaliacoes_convertidas': convertidas}
+
+
+def _compactar_bloco(ids, catalogo):
+    respostas_nivel1 = {avaliacao_id: [] for avaliacao_id in ids}
+    respostas_nivel2 = {avaliacao_id: [] for avaliacao_id in ids}
+    for linha in db.session.execute(
+        select(RespostaPrimeiroNivel.avaliacao_id, RespostaPrimeiroNivel.tema_id, RespostaPrimeiroNivel.selecionado)
+        .where(RespostaPrimeiroNivel.avaliacao_id.in_(ids))
+    ):
+        respostas_nivel1[linha.avaliacao_id].append({'tema_id': linha.tema_id, 'selecionado': linha.selecionado})
+    for linha in db.session.execute(
+        select(RespostaSegundoNivel.avaliacao_id, RespostaSegundoNivel.subtema_id, RespostaSegundoNivel.nivel_desconforto)
+        .where(RespostaSegundoNivel.avaliacao_id.in_(ids))
+    ):
+        respostas_nivel2[linha.avaliacao_id].append(
+            {'subtema_id': linha.subtema_id, 'nivel_desconforto': linha.nivel_desconforto}
+        )
+
+    valores = []
+    for avaliacao_id in ids:
+        mascara, blob = compactar_respostas(respostas_nivel1[avaliacao_id], respostas_nivel2[avaliacao_id], catalogo)
+        valores.append({'avaliacao': avaliacao_id, 'mascara': mascara, 'blob': blob})
+    db.session.execute(
+        update(Avaliacao.__table__)
+        .where(Avaliacao.__table__.c.id == bindparam('avaliacao'))
+        .values(temas_selecionados=bindparam('mascara'), niveis_subtemas=bindparam('blob')),
+        valores
+    )
+    for modelo in (RespostaPrimeiroNivel, RespostaSegundoNivel):
+        db.session.execute(delete(modelo).where(modelo.avaliacao_id.in_(ids)))
+
+
+def _expandir_bloco(ids, catalogo):
+    linhas_nivel1 = []
+    linhas_nivel2 = []
+    for linha in db.session.execute(
+        select(Avaliacao.id, Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas)
+        .where(Avaliacao.id.in_(ids)).order_by(Avaliacao.id)
+    ):
+        respostas_nivel1, respostas_nivel2 = expandir_respostas(linha.temas_selecionados, linha.niveis_subtemas, catalogo)
+        linhas_nivel1.extend(dict(resposta, avaliacao_id=linha.id) for resposta in respostas_nivel1)
+        linhas_nivel2.extend(dict(resposta, avaliacao_id=linha.id) for resposta in respostas_nivel2)
+
+    for modelo, linhas in ((RespostaPrimeiroNivel, linhas_nivel1), (RespostaSegundoNivel, linhas_nivel2)):
+        if linhas:
+            db.session.execute(insert(modelo.__table__), linhas)
+    db.session.execute(
+        update(Avaliacao).where(Avaliacao.id.in_(ids)).values(temas_selecionados=None, niveis_subtemas=None)
+    )
+
+
+# Consultas críticas e o índice que cada uma deve usar
+def _consultas_criticas():
+    return [
+        ('avaliações por empresa e departamento',
+         select(Avaliacao.id).where(Avaliacao.empresa == 'x', Avaliacao.departamento == 'y'),
+         'ix_avaliacao_empresa_departamento_data'),
+        ('avaliações por empresa e período',
+         select(Avaliacao.id).where(Avaliacao.empresa == 'x', Avaliacao.data_avaliacao >= datetime(2024, 1, 1),
+                                    Avaliacao.data_avaliacao < datetime(2024, 4, 1)),
+         'ix_avaliacao_empresa_data'),
+        ('página da listagem de avaliações',
+         select(Avaliacao.id)
+         .where(tuple_(Avaliacao.data_avaliacao, Avaliacao.id) < tuple_(datetime(2024, 1, 1), 1000))
+         .order_by(Avaliacao.data_avaliacao.desc(), Avaliacao.id.desc()).limit(51),
+         'ix_avaliacao_data'),
+        ('respostas de primeiro nível por avaliação',
+         select(RespostaPrimeiroNivel).where(RespostaPrimeiroNivel.avaliacao_id == 1),
+         'ux_resposta_primeiro_nivel_avaliacao_tema'),
+        ('respostas de segundo nível por avaliação',
+         select(RespostaSegundoNivel).where(RespostaSegundoNivel.avaliacao_id == 1),
+         'ux_resposta_segundo_nivel_avaliacao_subtema'),
+        ('recomendações por tema e faixa',
+         select(Recomendacao).where(Recomendacao.tema_id == 1, Recomendacao.faixa_nivel == 2),
+         'ix_recomendacao_tema_faixa'),
+    ]
+
+
+# Retorna as linhas do EXPLAIN QUERY PLAN de uma consulta
+def plano_consulta(consulta):
+    compilada = consulta.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return [linha[-1] for linha in db.session.execute(text(f'EXPLAIN QUERY PLAN {compilada}'))]
+
+
+# Confere com EXPLAIN QUERY PLAN que as consultas críticas usam os índices esperados.
+# Retorna a lista de problemas encontrados (vazia quando está tudo certo).
+def verificar_planos():
+    problemas = []
+    for descricao, consulta, indice in _consultas_criticas():
+        plano = plano_consulta(consulta)
+        if not any(indice in linha for linha in plano):
+            problemas.append(f"{descricao}: índice {indice} não usado ({'; '.join(plano)})")
+
+    # As agregações do relatório filtradas por empresa não podem varrer avaliações nem respostas
+    for descricao, consulta in (
+        ('agregação de temas por empresa', consulta_temas(empresa='x')),
+        ('agregação de subtemas por empresa', consulta_subtemas(empresa='x')),
+        ('agregação de temas por empresa e período',
+         consulta_temas(empresa='x', desde=datetime(2024, 1, 1), ate=datetime(2024, 4, 1))),
+    ):
+        varreduras = [
+            linha for linha in plano_consulta(consulta)
+            if linha.startswith(('SCAN avaliacao', 'SCAN resposta_'))
+        ]
+        if varreduras:
+            problemas.append(f"{descricao}: varredura completa ({'; '.join(varreduras)})")
+    return problemas
@@ -1,8 +1,35 @@
+from flask import g, has_app_context, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime
 
+
+# Chave do environ WSGI com a conexão (síncrona, sobre o driver assíncrono) usada pela requisição no modo ASGI
+CONEXAO_DA_REQUISICAO = 'riscos.conexao'
+
+
+# Sessão que envia as consultas SELECT ao bind 'leitura' (conexão somente leitura ou cópia do banco,
+# ver leitura.py) quando a requisição ou tarefa atual foi marcada com g.leitura_roteada;
+# escritas e demais instruções continuam no banco principal.
+# Com g.particao definido (ver particoes.py), todas as instruções vão para o engine da partição.
+# No modo ASGI (asgi.py), a conexão do engine assíncrono guardada no environ da requisição tem precedência.
+class SessaoRoteada(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and CONEXAO_DA_REQUISICAO in request.environ:
+            return request.environ[CONEXAO_DA_REQUISICAO]
+        if bind is None and has_app_context() and g.get('particao') is not None:
+            return g.particao
+        if (bind is None and clause is not None and getattr(clause, 'is_select', False)
+                and has_app_context() and g.get('leitura_roteada') and 'leitura' in self._db.engines):
+            return self._db.engines['leitura']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # Inicializa o SQLAlchemy
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
+
+# Os índices são declarados em __table_args__ com nome explícito para que
+# migracoes.atualizar_esquema possa criá-los em bancos já existentes
 
 # Modelo de dados para macrotemas (categorias A, B, C, D, E do PRD-PRQ)
 class MacroTema(db.Model):
@@ -25,6 +52,8 @@ class Tema(db.Model):
     avaliacoes = db.relationship('RespostaPrimeiroNivel', backref='tema', lazy=True)
     recomendacoes = db.relationship('Recomendacao', backref='tema', lazy=True)
 
+    __table_args__ = (db.Index('ix_tema_macro_tema_id', 'macro_tema_id'),)
+
 # Modelo para os subtemas (perguntas do segundo nível)
 class Subtema(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,18 +64,33 @@ class Subtema(db.Model):
     # Relações
     avaliacoes = db.relationship('RespostaSegundoNivel', backref='subtema', lazy=True)
 
+    __table_args__ = (db.Index('ix_subtema_tema_id', 'tema_id'),)
+
 # Modelo para cada avaliação completa feita por um trabalhador
 class Avaliacao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     empresa = db.Column(db.String(100), nullable=False)
     departamento = db.Column(db.String(100), nullable=False)
     funcao = db.Column(db.String(100), nullable=True)
-    data_avaliacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_avaliacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Armazenamento compacto das respostas (ver empacotamento.py): máscara dos temas
+    # selecionados e níveis dos subtemas. Nulos quando as respostas estão nas tabelas de respostas.
+    temas_selecionados = db.Column(db.Integer, nullable=True)
+    niveis_subtemas = db.Column(db.LargeBinary, nullable=True)
     
     # Relações com as respostas
     respostas_nivel1 = db.relationship('RespostaPrimeiroNivel', backref='avaliacao', lazy=True)
     respostas_nivel2 = db.relationship('RespostaSegundoNivel', backref='avaliacao', lazy=True)
 
+    # Filtros do relatório por empresa e departamento; a data no fim dos índices atende a paginação
+    # da listagem (keyset em data_avaliacao, id)
+    __table_args__ = (
+        db.Index('ix_avaliacao_empresa_departamento_data', 'empresa', 'departamento', 'data_avaliacao'),
+        db.Index('ix_avaliacao_empresa_data', 'empresa', 'data_avaliacao'),
+        db.Index('ix_avaliacao_data', 'data_avaliacao'),
+    )
+
 # Modelo para respostas do primeiro nível (temas selecionados)
 class RespostaPrimeiroNivel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -54,6 +98,12 @@ class RespostaPrimeiroNivel(db.Model):
     tema_id = db.Column(db.Integer, db.ForeignKey('tema.id'), nullable=False)
     selecionado = db.Column(db.Boolean, default=False)
 
+    # Uma resposta por tema em cada avaliação; o índice também atende às buscas por avaliacao_id
+    __table_args__ = (
+        db.Index('ux_resposta_primeiro_nivel_avaliacao_tema', 'avaliacao_id', 'tema_id', unique=True),
+        db.Index('ix_resposta_primeiro_nivel_tema', 'tema_id', 'selecionado'),
+    )
+
 # Modelo para respostas do segundo nível (nível de desconforto)
 class RespostaSegundoNivel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,9 +112,105 @@ class RespostaSegundoNivel(db.Model):
     # 0=Sem impacto, 1=Desconforto leve, 2=Desconforto moderado, 3=Dor leve, 4=Dor intensa
     nivel_desconforto = db.Column(db.Integer, nullable=False)  
 
+    # Uma resposta por subtema em cada avaliação; o índice também atende às buscas por avaliacao_id
+    __table_args__ = (
+        db.Index('ux_resposta_segundo_nivel_avaliacao_subtema', 'avaliacao_id', 'subtema_id', unique=True),
+        db.Index('ix_resposta_segundo_nivel_subtema', 'subtema_id'),
+    )
+
 # Modelo para recomendações baseadas no tema e nível de risco
 class Recomendacao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tema_id = db.Column(db.Integer, db.ForeignKey('tema.id'), nullable=False)
     faixa_nivel = db.Column(db.Integer, nullable=False)  # 0=Baixo risco, 1=Médio risco, 2=Alto risco
     descricao = db.Column(db.Text, nullable=False)
+
+    # Busca das recomendações de um tema por faixa de risco
+    __table_args__ = (db.Index('ix_recomendacao_tema_faixa', 'tema_id', 'faixa_nivel'),)
+
+# Agregados mantidos incrementalmente para o relatório: total de avaliações por empresa/departamento
+class AgregadoDepartamento(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    empresa = db.Column(db.String(100), nullable=False)
+    departamento = db.Column(db.String(100), nullable=False)
+    total_avaliacoes = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('empresa', 'departamento'),)
+
+# Agregado de seleções de temas por empresa/departamento
+class AgregadoTema(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    empresa = db.Column(db.String(100), nullable=False)
+    departamento = db.Column(db.String(100), nullable=False)
+    tema_id = db.Column(db.Integer, db.ForeignKey('tema.id'), nullable=False)
+    contagem = db.Column(db.Integer, nullable=False, default=0)
+    # Primeira ocorrência (avaliação, resposta), usada para manter a ordem do relatório
+    primeira_avaliacao_id = db.Column(db.Integer, nullable=False)
+    primeira_resposta_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('empresa', 'departamento', 'tema_id'),)
+
+# Agregado de pontos de desconforto por subtema em cada empresa/departamento
+class AgregadoSubtema(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    empresa = db.Column(db.String(100), nullable=False)
+    departamento = db.Column(db.String(100), nullable=False)
+    subtema_id = db.Column(db.Integer, db.ForeignKey('subtema.id'), nullable=False)
+    total_pontos = db.Column(db.Integer, nullable=False, default=0)
+    contagem = db.Column(db.Integer, nullable=False, default=0)
+    primeira_avaliacao_id = db.Column(db.Integer, nullable=False)
+    primeira_resposta_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('empresa', 'departamento', 'subtema_id'),)
+
+# Geração dos dados de cada empresa/departamento: incrementada a cada escrita que altera o relatório,
+# invalida as respostas guardadas no cache do relatório em todos os processos
+class GeracaoRelatorio(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    empresa = db.Column(db.String(100), nullable=False)
+    departamento = db.Column(db.String(100), nullable=False)
+    geracao = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('empresa', 'departamento'),)
+
+# Chaves de idempotência das submissões (compartilhadas entre os processos pelo banco)
+class ChaveIdempotencia(db.Model):
+    chave = db.Column(db.String(80), primary_key=True)
+    avaliacao_id = db.Column(db.Integer, db.ForeignKey('avaliacao.id'), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+
+# Recibos dos cadastros recebidos pela fila (CADASTRO_MODO=fila, ver fila_cadastros.py), gravados na mesma
+# transação das avaliações: um registro da fila com recibo já gravado não é gravado de novo após uma queda
+class ReciboCadastro(db.Model):
+    recibo = db.Column(db.String(64), primary_key=True)
+    estado = db.Column(db.String(20), nullable=False)  # gravada, duplicada, erro
+    avaliacao_id = db.Column(db.Integer)
+    erro = db.Column(db.Text)
+    recebido_em = db.Column(db.DateTime, nullable=False)
+    gravado_em = db.Column(db.DateTime, nullable=False, index=True)
+
+# Tarefas assíncronas do relatório: parâmetros, estado e resultado (JSON já serializado)
+class TarefaRelatorio(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    # Hash dos parâmetros normalizados; pedidos iguais em andamento compartilham a mesma tarefa
+    chave = db.Column(db.String(64), nullable=False)
+    parametros = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluida, erro
+    resultado = db.Column(db.LargeBinary)
+    erro = db.Column(db.Text)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluida_em = db.Column(db.DateTime)
+    # Em andamento: prazo máximo de execução; concluída: fim da validade do resultado
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+
+    # No máximo uma tarefa em andamento por chave
+    __table_args__ = (
+        db.Index('ux_tarefa_relatorio_chave_em_andamento', 'chave', unique=True,
+                 sqlite_where=db.text("estado IN ('pendente', 'executando')")),
+    )
+
+# Versões gravadas no banco por inicializar_db ('esquema' e 'catalogo'); quando coincidem com as
+# da aplicação, a inicialização não recria tabelas nem semeia o catálogo
+class VersaoBanco(db.Model):
+    componente = db.Column(db.String(20), primary_key=True)
+    versao = db.Column(db.String(64), nullable=False)
@@ -0,0 +1,255 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app, g
+from sqlalchemy import create_engine, insert, select
+from models import db, MacroTema, Tema, Subtema, Recomendacao, Avaliacao, AgregadoDepartamento
+from banco import configurar_engine, opcoes_engine, pragmas_configurados
+from instrumentacao import instrumentar_engine, medidas_atuais
+
+# Particionamento das avaliações em arquivos SQLite separados (PARTICIONAMENTO):
+# 'empresa': um arquivo por empresa, criado no primeiro cadastro dela;
+# 'hash': PARTICOES_QUANTIDADE arquivos, com a empresa no arquivo crc32(empresa) % PARTICOES_QUANTIDADE.
+# Cada partição tem o esquema completo e uma cópia do catálogo (mesmos ids do banco principal), então as
+# consultas existentes rodam nela sem alteração. g.particao escolhe o engine da requisição: a SessaoRoteada
+# (models.py) envia a ele todas as instruções da sessão. O banco principal guarda o catálogo, as versões e
+# as tarefas; as avaliações, respostas, agregados e chaves de idempotência ficam nas partições.
+# As consultas sem empresa rodam em todas as partições em paralelo (reunir_particoes) e as parciais são
+# mescladas por quem chamou. Os ids das avaliações são únicos dentro de cada partição.
+
+MODOS_PARTICIONAMENTO = ('desativado', 'empresa', 'hash')
+
+# Partição sem avaliações, usada nas leituras de empresas que ainda não têm arquivo (modo 'empresa')
+PARTICAO_VAZIA = 'particao_vazia'
+
+_engines = {}
+_trava = threading.RLock()
+_executor = None
+
+
+def particionamento_ativo():
+    modo = current_app.config['PARTICIONAMENTO']
+    if modo not in MODOS_PARTICIONAMENTO:
+        raise ValueError(f"PARTICIONAMENTO deve ser {', '.join(MODOS_PARTICIONAMENTO)}.")
+    return modo != 'desativado'
+
+
+def _diretorio():
+    diretorio = current_app.config['PARTICOES_DIRETORIO']
+    if not diretorio:
+        banco = db.engines[None].url.database
+        if banco in (None, '', ':memory:'):
+            raise ValueError('PARTICOES_DIRETORIO é obrigatório com o banco principal em memória.')
+        diretorio = os.path.join(os.path.dirname(os.path.abspath(banco)), 'particoes')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+# Nome do arquivo (sem extensão) da partição da empresa
+def nome_particao(empresa):
+    if current_app.config['PARTICIONAMENTO'] == 'hash':
+        return f"balde_{zlib.crc32(empresa.encode('utf-8')) % current_app.config['PARTICOES_QUANTIDADE']:03d}"
+    # Nome legível seguido de um hash, para que empresas com o mesmo nome simplificado não se misturem
+    legivel = unicodedata.normalize('NFKD', empresa).encode('ascii', 'ignore').decode('ascii').lower()
+    legivel = re.sub(r'[^a-z0-9]+', '-', legivel).strip('-')[:40]
+    return f"empresa_{legivel}_{hashlib.sha256(empresa.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _caminho(nome):
+    return os.path.join(_diretorio(), f'{nome}.db')
+
+
+# Engine de um arquivo de partição, com o mesmo pool, PRAGMAs e instrumentação do banco principal
+def _criar_engine(caminho):
+    url = f'sqlite:///{caminho}'
+    engine = create_engine(url, **opcoes_engine(current_app.config, url))
+    configurar_engine(engine, pragmas_configurados(current_app.config))
+    instrumentar_engine(engine)
+    return engine
+
+
+# Cria o arquivo da partição com esquema e catálogo em um arquivo temporário e só então o coloca no lugar,
+# para que outro processo nunca abra uma partição pela metade
+def _criar_arquivo(caminho):
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    engine = _criar_engine(temporario)
+    try:
+        preparar_particao(engine)
+        engine.dispose()
+        try:
+            os.link(temporario, caminho)
+        except FileExistsError:
+            pass  # criada por outro processo ao mesmo tempo
+    finally:
+        engine.dispose()
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+
+
+def _engine_do_arquivo(caminho, criar):
+    engine = _engines.get(caminho)
+    if engine is not None:
+        return engine
+    with _trava:
+        if caminho not in _engines:
+            if not os.path.exists(caminho):
+                if not criar:
+                    return None
+                _criar_arquivo(caminho)
+            _engines[caminho] = _criar_engine(caminho)
+        return _engines[caminho]
+
+
+# Engine da partição da empresa. Sem `criar`, empresas sem arquivo recebem a partição vazia.
+def obter_particao(empresa, criar=False):
+    engine = _engine_do_arquivo(_caminho(nome_particao(empresa)), criar)
+    if engine is None:
+        engine = _engine_do_arquivo(_caminho(PARTICAO_VAZIA), True)
+    return engine
+
+
+# Engines de todas as partições existentes (sem a partição vazia), na ordem dos arquivos
+def todas_particoes():
+    diretorio = _diretorio()
+    nomes = sorted(
+        nome for nome in os.listdir(diretorio)
+        if nome.endswith('.db') and nome != f'{PARTICAO_VAZIA}.db'
+    )
+    engines = (_engine_do_arquivo(os.path.join(diretorio, nome), False) for nome in nomes)
+    return [engine for engine in engines if engine is not None]
+
+
+# Envia as instruções da sessão ao engine da partição dentro do bloco (None volta ao banco principal)
+@contextmanager
+def na_particao(engine):
+    anterior = g.get('particao')
+    g.particao = engine
+    try:
+        yield engine
+    finally:
+        g.particao = anterior
+
+
+# Escolhe a partição da empresa para o resto da requisição (criando o arquivo nos cadastros)
+def rotear_empresa(empresa, criar=False):
+    if particionamento_ativo():
+        g.particao = obter_particao(empresa, criar)
+
+
+def _obter_executor():
+    global _executor
+    with _trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config['PARTICOES_TRABALHADORES'], thread_name_prefix='particoes'
+            )
+        return _executor
+
+
+def _executar_na_particao(app, engine, funcao, medidas):
+    with app.app_context():
+        g.particao = engine
+        # As consultas da thread contam na instrumentação da requisição que a disparou
+        if medidas is not None:
+            g.instrumentacao = medidas
+        try:
+            return funcao()
+        finally:
+            db.session.remove()
+
+
+# Executa `funcao` na partição da empresa ou, sem empresa, em todas as partições em paralelo (cada uma em
+# uma thread com o seu contexto e a sua sessão). Retorna a lista dos resultados, um por partição consultada;
+# sem particionamento, a lista tem só o resultado no banco principal.
+def reunir_particoes(funcao, empresa=None):
+    if not particionamento_ativo():
+        return [funcao()]
+    if empresa:
+        with na_particao(obter_particao(empresa)):
+            return [funcao()]
+    engines = todas_particoes()
+    if not engines:
+        with na_particao(obter_particao('')):
+            return [funcao()]
+    app = current_app._get_current_object()
+    medidas = medidas_atuais()
+    return list(_obter_executor().map(lambda engine: _executar_na_particao(app, engine, funcao, medidas), engines))
+
+
+# Separa os itens pela partição da empresa de cada um: [(engine, itens)], na ordem da primeira ocorrência
+def agrupar_por_particao(itens, empresa_de):
+    if not particionamento_ativo():
+        return [(None, list(itens))]
+    grupos = {}
+    for item in itens:
+        grupos.setdefault(nome_particao(empresa_de(item)), []).append(item)
+    return [(obter_particao(empresa_de(grupo[0]), criar=True), grupo) for grupo in grupos.values()]
+
+
+# Copia as tabelas do catálogo do banco principal para a partição, com os mesmos ids
+def _copiar_catalogo(engine):
+    with db.engines[None].connect() as origem, engine.begin() as destino:
+        for modelo in (MacroTema, Tema, Subtema, Recomendacao):
+            linhas = [dict(linha._mapping) for linha in origem.execute(select(modelo.__table__))]
+            if linhas:
+                destino.execute(insert(modelo.__table__), linhas)
+
+
+# Cria ou atualiza o esquema da partição e copia o catálogo, com as mesmas versões gravadas em versao_banco
+# do banco principal. Retorna as etapas executadas.
+def preparar_particao(engine):
+    from migracoes import assinatura_esquema, atualizar_esquema, gravar_versao, ler_versoes  # migracoes importa relatorio
+    from agregados import reconstruir_agregados
+
+    etapas = []
+    with na_particao(engine):
+        versoes = ler_versoes()
+        esquema = assinatura_esquema()
+        if versoes.get('esquema') != esquema:
+            db.metadata.create_all(engine)
+            atualizar_esquema()
+            if AgregadoDepartamento.query.count() == 0 and Avaliacao.query.count() > 0:
+                reconstruir_agregados()
+            gravar_versao('esquema', esquema)
+            db.session.commit()
+            etapas.append('esquema')
+
+        with na_particao(None):
+            catalogo = ler_versoes().get('catalogo')
+        if catalogo and versoes.get('catalogo') != catalogo:
+            if MacroTema.query.count() == 0:
+                db.session.commit()
+                _copiar_catalogo(engine)
+                etapas.append('catalogo')
+            gravar_versao('catalogo', catalogo)
+        db.session.commit()
+    return etapas
+
+
+# Prepara as partições existentes (e, no modo 'hash', cria todas); usado por inicializar_db
+def preparar_particoes():
+    if not particionamento_ativo():
+        return {}
+    nomes = {PARTICAO_VAZIA}
+    if current_app.config['PARTICIONAMENTO'] == 'hash':
+        nomes.update(f'balde_{indice:03d}' for indice in range(current_app.config['PARTICOES_QUANTIDADE']))
+    diretorio = _diretorio()
+    nomes.update(nome[:-3] for nome in os.listdir(diretorio) if nome.endswith('.db'))
+
+    etapas = {}
+    for nome in sorted(nomes):
+        caminho = _caminho(nome)
+        if not os.path.exists(caminho):
+            _engine_do_arquivo(caminho, True)
+            etapas[nome] = ['criada']
+            continue
+        executadas = preparar_particao(_engine_do_arquivo(caminho, False))
+        if executadas:
+            etapas[nome] = executadas
+    return etapas
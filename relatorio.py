@@ -0,0 +1,567 @@
+import functools
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import Integer, and_, cast, func, select
+from models import (db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel,
+                    AgregadoDepartamento, AgregadoTema, AgregadoSubtema)
+from catalogo import obter_catalogo
+from empacotamento import acumular_compactas
+from particoes import reunir_particoes
+
+# Motor de agregação do relatório baseado em consultas GROUP BY.
+# O número de consultas é fixo, independente da quantidade de avaliações.
+#
+# As agregações produzem "parciais" no formato:
+#   {'total': int,
+#    'temas': {tema_id: {'contagem': int, 'ordem': (avaliacao_id, resposta_id)}},
+#    'subtemas': {subtema_id: {'total_pontos': int, 'contagem': int, 'ordem': (avaliacao_id, resposta_id)}}}
+# A 'ordem' guarda a primeira ocorrência de cada tema/subtema, reproduzindo a ordem
+# em que a versão anterior (que percorria avaliação por avaliação) os encontrava.
+
+logger = logging.getLogger(__name__)
+
+
+# Dimensões aceitas no relatório agrupado (colunas de Avaliacao)
+DIMENSOES_RELATORIO = ('empresa', 'departamento', 'funcao')
+
+
+# Períodos da série temporal do relatório
+PERIODOS_TENDENCIA = ('semana', 'mes', 'trimestre')
+
+
+# Aplica os filtros de empresa e departamento em uma consulta (Avaliacao ou tabelas de agregados).
+# O período [desde, ate) só existe em Avaliacao; as tabelas de agregados não guardam datas.
+def _filtrar(consulta, empresa=None, departamento=None, modelo=Avaliacao, desde=None, ate=None):
+    if empresa:
+        consulta = consulta.where(modelo.empresa == empresa)
+    if departamento:
+        consulta = consulta.where(modelo.departamento == departamento)
+    if desde:
+        consulta = consulta.where(Avaliacao.data_avaliacao >= desde)
+    if ate:
+        consulta = consulta.where(Avaliacao.data_avaliacao < ate)
+    return consulta
+
+
+# Monta a agregação de uma tabela de respostas por coluna (tema_id ou subtema_id), guardando a primeira ocorrência.
+# Com agrupar_por, a agregação é feita separadamente para cada combinação das colunas informadas.
+def _consulta_agregacao(modelo, coluna, colunas_soma, filtro_resposta, empresa, departamento, agrupar_por=(),
+                        desde=None, ate=None):
+    agregado = _filtrar(
+        select(
+            *agrupar_por,
+            coluna.label('chave'),
+            func.count().label('contagem'),
+            func.min(modelo.avaliacao_id).label('primeira_avaliacao'),
+            *colunas_soma
+        )
+        .join(Avaliacao, Avaliacao.id == modelo.avaliacao_id)
+        .where(*filtro_resposta)
+        .group_by(*agrupar_por, coluna),
+        empresa, departamento, desde=desde, ate=ate
+    ).subquery()
+
+    # Desempate da primeira ocorrência: menor id de resposta dentro da primeira avaliação
+    return (
+        select(agregado, func.min(modelo.id).label('primeira_resposta'))
+        .join(modelo, and_(
+            coluna == agregado.c.chave,
+            modelo.avaliacao_id == agregado.c.primeira_avaliacao,
+            *filtro_resposta
+        ))
+        .group_by(*agregado.c)
+    )
+
+
+# Agregações das respostas dos dois níveis (usadas pelo relatório e pela reconstrução dos agregados)
+def consulta_temas(empresa=None, departamento=None, agrupar_por=(), desde=None, ate=None):
+    return _consulta_agregacao(
+        RespostaPrimeiroNivel, RespostaPrimeiroNivel.tema_id, [],
+        [RespostaPrimeiroNivel.selecionado.is_(True)], empresa, departamento, agrupar_por, desde, ate
+    )
+
+
+def consulta_subtemas(empresa=None, departamento=None, agrupar_por=(), desde=None, ate=None):
+    return _consulta_agregacao(
+        RespostaSegundoNivel, RespostaSegundoNivel.subtema_id,
+        [func.sum(RespostaSegundoNivel.nivel_desconforto).label('total_pontos')],
+        [], empresa, departamento, agrupar_por, desde, ate
+    )
+
+
+def agregar_temas(empresa=None, departamento=None, agrupar_por=(), desde=None, ate=None):
+    return db.session.execute(consulta_temas(empresa, departamento, agrupar_por, desde, ate)).all()
+
+
+def agregar_subtemas(empresa=None, departamento=None, agrupar_por=(), desde=None, ate=None):
+    return db.session.execute(consulta_subtemas(empresa, departamento, agrupar_por, desde, ate)).all()
+
+
+# Calcula as parciais do relatório com o motor configurado.
+# Com período (desde/ate) o motor de agregados dá lugar ao SQL, que filtra pela data da avaliação.
+def calcular_parciais(empresa=None, departamento=None, desde=None, ate=None):
+    motor = current_app.config.get('RELATORIO_MOTOR')
+    if motor == 'agregados' and not (desde or ate):
+        return calcular_parciais_agregadas(empresa, departamento)
+    if motor == 'numpy':
+        from relatorio_numpy import calcular_parciais_numpy  # numpy é opcional
+        return calcular_parciais_numpy(empresa, departamento, desde=desde, ate=ate)
+    return calcular_parciais_sql(empresa, departamento, desde, ate)
+
+
+# Calcula as parciais a partir das tabelas de agregados (custo proporcional ao número de temas)
+def calcular_parciais_agregadas(empresa=None, departamento=None):
+    return _parciais_agregadas_por_grupo((), empresa, departamento).get((), _parciais_vazias())
+
+
+# Calcula as parciais do relatório direto das tabelas de respostas
+def calcular_parciais_sql(empresa=None, departamento=None, desde=None, ate=None):
+    return _parciais_sql_por_grupo((), empresa, departamento, desde, ate).get((), _parciais_vazias())
+
+
+def _parciais_vazias():
+    return {'total': 0, 'temas': {}, 'subtemas': {}}
+
+
+# Calcula em uma passada as parciais de cada combinação das dimensões (nomes em DIMENSOES_RELATORIO).
+# Retorna {(valores das dimensões): parciais}; grupos sem avaliações não aparecem.
+def calcular_parciais_agrupadas(dimensoes, empresa=None, departamento=None, desde=None, ate=None):
+    # As tabelas de agregados só guardam empresa e departamento, sem datas
+    if (current_app.config.get('RELATORIO_MOTOR') == 'agregados' and 'funcao' not in dimensoes
+            and not (desde or ate)):
+        return _parciais_agregadas_por_grupo(dimensoes, empresa, departamento)
+    return _parciais_sql_por_grupo(
+        [getattr(Avaliacao, dimensao) for dimensao in dimensoes], empresa, departamento, desde, ate
+    )
+
+
+def _parciais_agregadas_por_grupo(dimensoes, empresa, departamento):
+    def colunas(modelo):
+        return [getattr(modelo, dimensao) for dimensao in dimensoes]
+
+    grupos = {}
+    for *grupo, total in db.session.execute(
+        _filtrar(select(*colunas(AgregadoDepartamento), func.sum(AgregadoDepartamento.total_avaliacoes))
+                 .group_by(*colunas(AgregadoDepartamento)), empresa, departamento, AgregadoDepartamento)
+    ):
+        if total:
+            grupos[tuple(grupo)] = {'total': total, 'temas': {}, 'subtemas': {}}
+    if not grupos:
+        return grupos
+
+    # Cada linha é a parcial de um departamento; as linhas são somadas por tema/subtema
+    for linha in db.session.execute(
+        _filtrar(select(*colunas(AgregadoTema), AgregadoTema), empresa, departamento, AgregadoTema)
+    ):
+        *grupo, agregado = linha
+        ordem = (agregado.primeira_avaliacao_id, agregado.primeira_resposta_id)
+        atual = grupos[tuple(grupo)]['temas'].setdefault(agregado.tema_id, {'contagem': 0, 'ordem': ordem})
+        atual['contagem'] += agregado.contagem
+        atual['ordem'] = min(atual['ordem'], ordem)
+
+    for linha in db.session.execute(
+        _filtrar(select(*colunas(AgregadoSubtema), AgregadoSubtema), empresa, departamento, AgregadoSubtema)
+    ):
+        *grupo, agregado = linha
+        ordem = (agregado.primeira_avaliacao_id, agregado.primeira_resposta_id)
+        atual = grupos[tuple(grupo)]['subtemas'].setdefault(
+            agregado.subtema_id, {'total_pontos': 0, 'contagem': 0, 'ordem': ordem}
+        )
+        atual['total_pontos'] += agregado.total_pontos
+        atual['contagem'] += agregado.contagem
+        atual['ordem'] = min(atual['ordem'], ordem)
+
+    return grupos
+
+
+# colunas: colunas ou expressões de Avaliacao que definem os grupos
+def _parciais_sql_por_grupo(colunas, empresa, departamento, desde=None, ate=None):
+    quantidade = len(colunas)
+
+    grupos = {}
+    for *grupo, total in db.session.execute(
+        _filtrar(select(*colunas, func.count(Avaliacao.id)).group_by(*colunas), empresa, departamento,
+                 desde=desde, ate=ate)
+    ):
+        if total:
+            grupos[tuple(grupo)] = {'total': total, 'temas': {}, 'subtemas': {}}
+    if not grupos:
+        return grupos
+
+    for linha in agregar_temas(empresa, departamento, colunas, desde, ate):
+        grupos[tuple(linha[:quantidade])]['temas'][linha.chave] = {
+            'contagem': linha.contagem,
+            'ordem': (linha.primeira_avaliacao, linha.primeira_resposta)
+        }
+
+    for linha in agregar_subtemas(empresa, departamento, colunas, desde, ate):
+        grupos[tuple(linha[:quantidade])]['subtemas'][linha.chave] = {
+            'total_pontos': linha.total_pontos,
+            'contagem': linha.contagem,
+            'ordem': (linha.primeira_avaliacao, linha.primeira_resposta)
+        }
+
+    # Avaliações em armazenamento compacto entram decodificadas em bloco
+    for grupo, parciais in parciais_compactas(empresa, departamento, colunas, desde=desde, ate=ate).items():
+        mesclar_parciais(grupos[grupo], parciais)
+
+    return grupos
+
+
+# Parciais das avaliações em armazenamento compacto, por grupo ({(valores de agrupar_por): parciais}).
+# As avaliações são lidas em blocos, em ordem de id, sem carregar tudo na memória.
+def parciais_compactas(empresa=None, departamento=None, agrupar_por=(), tamanho_bloco=5000, desde=None, ate=None):
+    catalogo = obter_catalogo()
+    consulta = _filtrar(
+        select(*agrupar_por, Avaliacao.id, Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas)
+        .where(Avaliacao.temas_selecionados.is_not(None))
+        .order_by(Avaliacao.id),
+        empresa, departamento, desde=desde, ate=ate
+    )
+    grupos = {}
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho_bloco))
+    for bloco in resultado.partitions():
+        linhas_por_grupo = {}
+        for linha in bloco:
+            grupo = tuple(linha[:len(agrupar_por)])
+            linhas_por_grupo.setdefault(grupo, []).append(tuple(linha[len(agrupar_por):]))
+        for grupo, linhas in linhas_por_grupo.items():
+            parciais = grupos.setdefault(grupo, {'total': 0, 'temas': {}, 'subtemas': {}})
+            acumular_compactas(parciais, linhas, catalogo)
+    return grupos
+
+
+# Soma as parciais de origem nas de destino (total, temas e subtemas), mantendo a menor ordem
+# (entre partições, a menor ordem compara ids de bancos diferentes: só define o desempate entre temas de mesmo
+# percentual e a ordem dos subtemas, como descrito no README)
+def mesclar_parciais(destino, origem):
+    destino['total'] += origem['total']
+    for tema_id, dados in origem['temas'].items():
+        atual = destino['temas'].setdefault(tema_id, {'contagem': 0, 'ordem': dados['ordem']})
+        atual['contagem'] += dados['contagem']
+        atual['ordem'] = min(atual['ordem'], dados['ordem'])
+    for subtema_id, dados in origem['subtemas'].items():
+        atual = destino['subtemas'].setdefault(subtema_id, {'total_pontos': 0, 'contagem': 0, 'ordem': dados['ordem']})
+        atual['total_pontos'] += dados['total_pontos']
+        atual['contagem'] += dados['contagem']
+        atual['ordem'] = min(atual['ordem'], dados['ordem'])
+        if 'distribuicao' in dados:
+            anterior = atual.get('distribuicao') or [0] * len(dados['distribuicao'])
+            atual['distribuicao'] = [soma + quantidade for soma, quantidade in zip(anterior, dados['distribuicao'])]
+    return destino
+
+
+# Mescla as parciais calculadas em cada partição (a lista de reunir_particoes); com uma só, devolve-a intacta
+def mesclar_lista_parciais(lista):
+    if len(lista) == 1:
+        return lista[0]
+    return functools.reduce(mesclar_parciais, lista, _parciais_vazias())
+
+
+# Mescla os grupos ({grupo: parciais}) calculados em cada partição
+def mesclar_grupos(lista):
+    if len(lista) == 1:
+        return lista[0]
+    grupos = {}
+    for origem in lista:
+        for grupo, parciais in origem.items():
+            mesclar_parciais(grupos.setdefault(grupo, _parciais_vazias()), parciais)
+    return grupos
+
+
+# Classifica o nível médio em uma faixa de risco
+def classificar_faixa(nivel_medio):
+    faixa_nivel = 0  # Ausência de Risco (padrão)
+    if nivel_medio >= 0.5 and nivel_medio < 1.5:
+        faixa_nivel = 1  # Risco Baixo
+    elif nivel_medio >= 1.5 and nivel_medio < 2.5:
+        faixa_nivel = 2  # Risco Moderado
+    elif nivel_medio >= 2.5 and nivel_medio < 3.5:
+        faixa_nivel = 3  # Risco Alto
+    elif nivel_medio >= 3.5:
+        faixa_nivel = 4  # Risco Crítico
+    return faixa_nivel
+
+
+# Monta o relatório final (mesmo contrato JSON de sempre) a partir das parciais
+def montar_relatorio(parciais, empresa=None, departamento=None):
+    total_avaliacoes = parciais['total']
+    if total_avaliacoes == 0:
+        return {
+            'total_avaliacoes': 0,
+            'mensagem': 'Nenhuma avaliação encontrada com os filtros informados.'
+        }
+
+    tema_ids = sorted(parciais['temas'], key=lambda tema_id: parciais['temas'][tema_id]['ordem'])
+
+    catalogo = obter_catalogo()
+
+    # Subtemas agrupados por tema, apenas para temas selecionados
+    subtemas_por_tema = {}
+    for subtema_id, subtema_dados in parciais['subtemas'].items():
+        subtema = catalogo.subtemas[subtema_id]
+        if subtema['tema_id'] in parciais['temas']:
+            subtemas_por_tema.setdefault(subtema['tema_id'], []).append((subtema_dados['ordem'], subtema, subtema_dados))
+
+    temas_resultado = []
+    for tema_id in tema_ids:
+        tema = catalogo.temas[tema_id]
+        contagem = parciais['temas'][tema_id]['contagem']
+
+        subtemas_lista = []
+        total_pontos_tema = 0
+        total_respostas_tema = 0
+        for _, subtema, subtema_dados in sorted(subtemas_por_tema.get(tema_id, []), key=lambda item: item[0]):
+            subtema_resultado = {
+                'letra': subtema['letra'],
+                'descricao': subtema['descricao'],
+                'nivel_medio': round(subtema_dados['total_pontos'] / subtema_dados['contagem'], 2)
+            }
+            if 'distribuicao' in subtema_dados:
+                subtema_resultado['distribuicao'] = subtema_dados['distribuicao']
+            subtemas_lista.append(subtema_resultado)
+            total_pontos_tema += subtema_dados['total_pontos']
+            total_respostas_tema += subtema_dados['contagem']
+
+        # Calcular média do tema
+        nivel_medio = 0
+        if total_respostas_tema > 0:
+            nivel_medio = round(total_pontos_tema / total_respostas_tema, 2)
+
+        faixa_nivel = classificar_faixa(nivel_medio)
+
+        recomendacoes_lista = catalogo.recomendacoes.get((tema_id, faixa_nivel), [])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Tema do relatório calculado', extra={'campos': {
+                'tema': tema['numero'], 'nivel_medio': nivel_medio, 'faixa_nivel': faixa_nivel,
+                'recomendacoes': len(recomendacoes_lista)
+            }})
+
+        # Adiciona dados consolidados do tema ao resultado final
+        temas_resultado.append({
+            'tema': tema['numero'],
+            'descricao': tema['descricao'],
+            'contagem': contagem,
+            'macrotema': tema['macrotema'],
+            'percentual': round((contagem / total_avaliacoes) * 100, 1),
+            'nivel_medio': nivel_medio,
+            'subtemas': subtemas_lista,
+            'recomendacoes': recomendacoes_lista
+        })
+
+    # Ordenar por percentual (decrescente)
+    temas_resultado.sort(key=lambda x: x['percentual'], reverse=True)
+
+    return {
+        'total_avaliacoes': total_avaliacoes,
+        'empresa': empresa if empresa else 'Todas',
+        'departamento': departamento if departamento else 'Todos',
+        'temas': temas_resultado
+    }
+
+
+# Monta o relatório agrupado: um relatório (mesmo formato de montar_relatorio) por grupo e,
+# com linha_base, o relatório de todo o recorte, obtido somando as parciais dos grupos
+def montar_relatorio_agrupado(grupos, dimensoes, empresa=None, departamento=None, linha_base=False):
+    resultado = {
+        'empresa': empresa if empresa else 'Todas',
+        'departamento': departamento if departamento else 'Todos',
+        'agrupar_por': list(dimensoes),
+        'total_avaliacoes': sum(parciais['total'] for parciais in grupos.values()),
+        'grupos': []
+    }
+    for grupo in sorted(grupos, key=lambda valores: [(valor is None, valor or '') for valor in valores]):
+        valores = dict(zip(dimensoes, grupo))
+        resultado['grupos'].append({
+            'grupo': valores,
+            'relatorio': montar_relatorio(
+                grupos[grupo], valores.get('empresa', empresa), valores.get('departamento', departamento)
+            )
+        })
+
+    if linha_base:
+        base = _parciais_vazias()
+        for parciais in grupos.values():
+            mesclar_parciais(base, parciais)
+        resultado['linha_base'] = montar_relatorio(base, empresa, departamento)
+    return resultado
+
+
+# Rótulo do período de cada avaliação, calculado no SQLite e ordenável como texto:
+# semana = data da segunda-feira (AAAA-MM-DD), mes = AAAA-MM, trimestre = AAAA-Tn
+def expressao_periodo(periodo):
+    data = Avaliacao.data_avaliacao
+    if periodo == 'semana':
+        return func.date(data, '-6 days', 'weekday 1')
+    if periodo == 'mes':
+        return func.strftime('%Y-%m', data)
+    if periodo == 'trimestre':
+        return func.printf('%s-T%d', func.strftime('%Y', data), (cast(func.strftime('%m', data), Integer) + 2) // 3)
+    raise ValueError(f'Período desconhecido: {periodo}')
+
+
+# Calcula as parciais de cada período em uma passada: {rótulo do período: parciais}
+def calcular_tendencia(periodo, empresa=None, departamento=None, desde=None, ate=None):
+    coluna = expressao_periodo(periodo).label('periodo')
+    grupos = mesclar_grupos(reunir_particoes(
+        lambda: _parciais_sql_por_grupo([coluna], empresa, departamento, desde, ate), empresa
+    ))
+    return {grupo[0]: parciais for grupo, parciais in grupos.items()}
+
+
+# Estatísticas de cada tema selecionado nas parciais, com as mesmas regras de montar_relatorio:
+# {tema_id: {'contagem', 'percentual', 'nivel_medio', 'faixa_nivel'}}
+def estatisticas_temas(parciais):
+    catalogo = obter_catalogo()
+    pontos = {}
+    for subtema_id, dados in parciais['subtemas'].items():
+        tema_id = catalogo.subtemas[subtema_id]['tema_id']
+        if tema_id in parciais['temas']:
+            total_pontos, contagem = pontos.get(tema_id, (0, 0))
+            pontos[tema_id] = (total_pontos + dados['total_pontos'], contagem + dados['contagem'])
+
+    estatisticas = {}
+    for tema_id, dados in parciais['temas'].items():
+        total_pontos, contagem = pontos.get(tema_id, (0, 0))
+        nivel_medio = round(total_pontos / contagem, 2) if contagem else 0
+        estatisticas[tema_id] = {
+            'contagem': dados['contagem'],
+            'percentual': round((dados['contagem'] / parciais['total']) * 100, 1),
+            'nivel_medio': nivel_medio,
+            'faixa_nivel': classificar_faixa(nivel_medio)
+        }
+    return estatisticas
+
+
+# Monta a série temporal: uma lista de valores por tema, alinhada com a lista de períodos.
+# Em períodos sem o tema, contagem e percentual são 0 e nivel_medio/faixa_nivel são nulos.
+def montar_tendencia(series, periodo, empresa=None, departamento=None):
+    catalogo = obter_catalogo()
+    periodos = sorted(series)
+    estatisticas = {rotulo: estatisticas_temas(series[rotulo]) for rotulo in periodos}
+    tema_ids = sorted(
+        {tema_id for por_tema in estatisticas.values() for tema_id in por_tema},
+        key=lambda tema_id: catalogo.temas[tema_id]['numero']
+    )
+
+    temas = []
+    for tema_id in tema_ids:
+        tema = catalogo.temas[tema_id]
+        valores = [estatisticas[rotulo].get(tema_id) for rotulo in periodos]
+        temas.append({
+            'tema': tema['numero'],
+            'descricao': tema['descricao'],
+            'macrotema': tema['macrotema'],
+            'contagem': [valor['contagem'] if valor else 0 for valor in valores],
+            'percentual': [valor['percentual'] if valor else 0 for valor in valores],
+            'nivel_medio': [valor['nivel_medio'] if valor else None for valor in valores],
+            'faixa_nivel': [valor['faixa_nivel'] if valor else None for valor in valores]
+        })
+
+    return {
+        'empresa': empresa if empresa else 'Todas',
+        'departamento': departamento if departamento else 'Todos',
+        'periodo': periodo,
+        'periodos': periodos,
+        'total_avaliacoes': [series[rotulo]['total'] for rotulo in periodos],
+        'temas': temas
+    }
+
+
+# Erro nos parâmetros de uma consulta de relatório (resposta 400)
+class ParametroInvalido(ValueError):
+    pass
+
+
+# Parâmetros booleanos da query string (1, true, sim)
+def parametro_ativo(parametros, nome):
+    return str(parametros.get(nome) or '').lower() in ('1', 'true', 'sim')
+
+
+# Período das consultas: desde/ate em ISO 8601 (data ou data e hora, com fuso ou 'Z'; em UTC se não houver fuso).
+# Um 'ate' só com a data inclui o dia inteiro. Retorna (desde, ate).
+def ler_periodo(parametros):
+    limites = []
+    for nome in ('desde', 'ate'):
+        valor = parametros.get(nome)
+        if not valor:
+            limites.append(None)
+            continue
+        try:
+            # fromisoformat só aceita o sufixo 'Z' (UTC) a partir do Python 3.11
+            data = datetime.fromisoformat(valor[:-1] + '+00:00' if valor[-1:] in ('Z', 'z') else valor)
+        except (TypeError, ValueError):
+            raise ParametroInvalido(f"Parâmetro '{nome}' deve ser uma data ISO 8601 (AAAA-MM-DD).")
+        if data.tzinfo is not None:
+            data = data.astimezone(timezone.utc).replace(tzinfo=None)
+        if nome == 'ate' and len(valor) == 10:
+            data += timedelta(days=1)
+        limites.append(data)
+    return limites
+
+
+# Lê e valida os parâmetros do relatório (query string do /gerar_relatorio ou JSON das tarefas).
+# Retorna um dicionário serializável em JSON, aceito por executar_relatorio.
+def ler_parametros_relatorio(parametros):
+    desde, ate = ler_periodo(parametros)
+
+    # Relatório agrupado: todos os grupos (ex.: agrupar_por=departamento) em uma única passada
+    dimensoes = None
+    agrupar_por = parametros.get('agrupar_por')
+    if agrupar_por is not None:
+        if isinstance(agrupar_por, str):
+            agrupar_por = agrupar_por.split(',')
+        dimensoes = [str(dimensao).strip() for dimensao in agrupar_por if str(dimensao).strip()]
+        if (not dimensoes or len(set(dimensoes)) != len(dimensoes)
+                or any(dimensao not in DIMENSOES_RELATORIO for dimensao in dimensoes)):
+            raise ParametroInvalido(f"Parâmetro 'agrupar_por' deve combinar {', '.join(DIMENSOES_RELATORIO)}.")
+
+    # Distribuição das respostas por nível de desconforto: calculada pelo motor numpy
+    distribuicao = dimensoes is None and parametro_ativo(parametros, 'distribuicao')
+    if distribuicao:
+        from relatorio_numpy import numpy_disponivel
+        if not numpy_disponivel():
+            raise ParametroInvalido("O parâmetro 'distribuicao' requer o pacote numpy.")
+
+    return {
+        'empresa': parametros.get('empresa'),
+        'departamento': parametros.get('departamento'),
+        'desde': desde.isoformat() if desde else None,
+        'ate': ate.isoformat() if ate else None,
+        'agrupar_por': dimensoes,
+        'linha_base': dimensoes is not None and parametro_ativo(parametros, 'linha_base'),
+        'distribuicao': distribuicao
+    }
+
+
+# Executa o relatório descrito pelos parâmetros de ler_parametros_relatorio
+def executar_relatorio(parametros):
+    empresa = parametros['empresa']
+    departamento = parametros['departamento']
+    desde = datetime.fromisoformat(parametros['desde']) if parametros['desde'] else None
+    ate = datetime.fromisoformat(parametros['ate']) if parametros['ate'] else None
+
+    # Sem particionamento, reunir_particoes só executa o cálculo no banco principal; com ele, a empresa
+    # escolhe a partição, e os relatórios de todas as empresas somam as parciais de cada partição
+    if parametros['agrupar_por'] is not None:
+        grupos = mesclar_grupos(reunir_particoes(
+            lambda: calcular_parciais_agrupadas(parametros['agrupar_por'], empresa, departamento, desde, ate),
+            empresa
+        ))
+        return montar_relatorio_agrupado(
+            grupos, parametros['agrupar_por'], empresa, departamento, linha_base=parametros['linha_base']
+        )
+
+    if parametros['distribuicao']:
+        from relatorio_numpy import calcular_parciais_numpy
+        parciais = mesclar_lista_parciais(reunir_particoes(
+            lambda: calcular_parciais_numpy(empresa, departamento, distribuicao=True, desde=desde, ate=ate), empresa
+        ))
+        return montar_relatorio(parciais, empresa, departamento)
+
+    # Agregação feita no banco com um número fixo de consultas
+    parciais = mesclar_lista_parciais(reunir_particoes(
+        lambda: calcular_parciais(empresa, departamento, desde, ate), empresa
+    ))
+    return montar_relatorio(parciais, empresa, departamento)
@@ -0,0 +1,183 @@
+import time
+from sqlalchemy import select
+from models import db, Avaliacao, RespostaPrimeiroNivel, RespostaSegundoNivel
+from catalogo import obter_catalogo
+from avaliacoes import NIVEL_DESCONFORTO_MAXIMO
+from relatorio import _filtrar
+from instrumentacao import registrar_consulta
+
+try:
+    import numpy as np
+except ImportError:  # motor opcional: sem numpy, use os motores 'agregados' ou 'sql'
+    np = None
+
+# Motor vetorizado do relatório (RELATORIO_MOTOR=numpy).
+# As avaliações do recorte viram duas matrizes densas, uma linha por avaliação:
+# - temas: bool (avaliações x temas), True quando o tema foi selecionado;
+# - niveis: int8 (avaliações x subtemas), com -1 nos subtemas não respondidos.
+# Contagens, somas e distribuição por nível saem de operações por coluna.
+# As respostas são lidas em blocos, então a memória extra fica limitada ao tamanho das matrizes.
+
+TAMANHO_BLOCO = 100000
+AUSENTE = -1
+
+
+def numpy_disponivel():
+    return np is not None
+
+
+# Primeira ocorrência (avaliacao_id, resposta_id) de cada chave em um bloco de respostas
+def _primeiras(avaliacoes, respostas, chaves):
+    ordem = np.lexsort((respostas, avaliacoes))
+    unicas, posicoes = np.unique(chaves[ordem], return_index=True)
+    indices = ordem[posicoes]
+    return dict(zip(unicas.tolist(), zip(avaliacoes[indices].tolist(), respostas[indices].tolist())))
+
+
+def _guardar_menores(destino, origem):
+    for chave, ordem in origem.items():
+        if chave not in destino or ordem < destino[chave]:
+            destino[chave] = ordem
+
+
+# Executa a consulta direto no cursor do driver e gera blocos de tuplas; converter objetos Row
+# do SQLAlchemy em arrays custa mais que a própria leitura. Fora dos eventos do engine: o tempo de execução
+# e de leitura dos blocos é somado à instrumentação da requisição. A conexão vem da SessaoRoteada com a
+# consulta, então segue o mesmo roteamento das demais leituras (bind 'leitura', partição, conexão do ASGI)
+def _tuplas(consulta):
+    compilada = consulta.compile(dialect=db.engine.dialect)
+    instrucao = str(compilada)
+    parametros = [compilada.params[nome] for nome in compilada.positiontup or ()]
+    cursor = db.session.connection(bind_arguments={'clause': consulta}).connection.cursor()
+    duracao = 0.0
+    try:
+        inicio = time.perf_counter()
+        cursor.execute(instrucao, parametros)
+        while True:
+            bloco = cursor.fetchmany(TAMANHO_BLOCO)
+            duracao += time.perf_counter() - inicio
+            if not bloco:
+                break
+            yield bloco
+            inicio = time.perf_counter()
+    finally:
+        cursor.close()
+        registrar_consulta(instrucao, duracao)
+
+
+# Lê a consulta em blocos já convertidos para arrays int64 (uma coluna por campo)
+def _blocos(consulta):
+    for bloco in _tuplas(consulta):
+        yield np.array(bloco, dtype=np.int64).T
+
+
+# Carrega as matrizes do recorte; retorna (ids, temas, niveis, ordem_temas, ordem_subtemas)
+def carregar_matrizes(empresa=None, departamento=None, desde=None, ate=None):
+    catalogo = obter_catalogo()
+    ids = np.concatenate(
+        [np.array(bloco, dtype=np.int64).reshape(-1) for bloco in _tuplas(
+            _filtrar(select(Avaliacao.id).order_by(Avaliacao.id), empresa, departamento, desde=desde, ate=ate)
+        )] or [np.zeros(0, dtype=np.int64)]
+    )
+    temas = np.zeros((len(ids), len(catalogo.ordem_temas)), dtype=bool)
+    niveis = np.full((len(ids), len(catalogo.ordem_subtemas)), AUSENTE, dtype=np.int8)
+    ordem_temas = {}
+    ordem_subtemas = {}
+    if not len(ids):
+        return ids, temas, niveis, ordem_temas, ordem_subtemas
+
+    # Posição no catálogo indexada pelo id do tema/subtema
+    posicao_tema = np.zeros(max(catalogo.ordem_temas) + 1, dtype=np.int64)
+    posicao_tema[catalogo.ordem_temas] = np.arange(len(catalogo.ordem_temas))
+    posicao_subtema = np.zeros(max(catalogo.ordem_subtemas) + 1, dtype=np.int64)
+    posicao_subtema[catalogo.ordem_subtemas] = np.arange(len(catalogo.ordem_subtemas))
+
+    def respostas(modelo, *colunas, filtro=()):
+        consulta = select(modelo.avaliacao_id, modelo.id, *colunas).where(*filtro)
+        if empresa or departamento or desde or ate:
+            consulta = _filtrar(
+                consulta.join(Avaliacao, Avaliacao.id == modelo.avaliacao_id), empresa, departamento,
+                desde=desde, ate=ate
+            )
+        return _blocos(consulta)
+
+    for avaliacoes, resposta_ids, tema_ids in respostas(
+        RespostaPrimeiroNivel, RespostaPrimeiroNivel.tema_id, filtro=[RespostaPrimeiroNivel.selecionado.is_(True)]
+    ):
+        temas[np.searchsorted(ids, avaliacoes), posicao_tema[tema_ids]] = True
+        _guardar_menores(ordem_temas, _primeiras(avaliacoes, resposta_ids, tema_ids))
+
+    for avaliacoes, resposta_ids, subtema_ids, valores in respostas(
+        RespostaSegundoNivel, RespostaSegundoNivel.subtema_id, RespostaSegundoNivel.nivel_desconforto
+    ):
+        niveis[np.searchsorted(ids, avaliacoes), posicao_subtema[subtema_ids]] = valores
+        _guardar_menores(ordem_subtemas, _primeiras(avaliacoes, resposta_ids, subtema_ids))
+
+    # Avaliações em armazenamento compacto: bits da máscara e bytes do blob (0xFF como int8 é -1 = AUSENTE)
+    consulta = _filtrar(
+        select(Avaliacao.id, Avaliacao.temas_selecionados, Avaliacao.niveis_subtemas)
+        .where(Avaliacao.temas_selecionados.is_not(None)),
+        empresa, departamento, desde=desde, ate=ate
+    )
+    bits = np.arange(len(catalogo.ordem_temas), dtype=np.int64)
+    for bloco in _tuplas(consulta):
+        linhas = np.searchsorted(ids, np.array([linha[0] for linha in bloco], dtype=np.int64))
+        mascaras = np.array([linha[1] for linha in bloco], dtype=np.int64)
+        temas[linhas] |= (mascaras[:, None] >> bits & 1).astype(bool)
+        largura = max(len(linha[2] or b'') for linha in bloco)
+        if largura:
+            dados = b''.join((linha[2] or b'').ljust(largura, b'\xff') for linha in bloco)
+            niveis[linhas, :largura] = np.frombuffer(dados, dtype=np.int8).reshape(len(bloco), largura)
+
+        # Primeira avaliação do bloco com cada tema/subtema; a posição no catálogo desempata.
+        # O bloco pode vir na ordem do índice de empresa/departamento, então as linhas são ordenadas por id.
+        linhas = np.sort(linhas)
+        for matriz, ordem, ordem_catalogo in (
+            (temas[linhas], ordem_temas, catalogo.ordem_temas),
+            (niveis[linhas] != AUSENTE, ordem_subtemas, catalogo.ordem_subtemas),
+        ):
+            presentes = np.flatnonzero(matriz.any(axis=0))
+            primeiras = matriz[:, presentes].argmax(axis=0)
+            _guardar_menores(ordem, {
+                ordem_catalogo[posicao]: (ids[linhas[primeira]].item(), posicao)
+                for posicao, primeira in zip(presentes.tolist(), primeiras.tolist())
+            })
+
+    return ids, temas, niveis, ordem_temas, ordem_subtemas
+
+
+# Calcula as parciais do relatório com as matrizes; com distribuicao=True, cada subtema
+# traz também a quantidade de respostas em cada nível de desconforto (0 a NIVEL_DESCONFORTO_MAXIMO)
+def calcular_parciais_numpy(empresa=None, departamento=None, distribuicao=False, desde=None, ate=None):
+    if np is None:
+        raise RuntimeError('O motor numpy do relatório requer o pacote numpy.')
+    catalogo = obter_catalogo()
+    ids, temas, niveis, ordem_temas, ordem_subtemas = carregar_matrizes(empresa, departamento, desde, ate)
+    parciais = {'total': len(ids), 'temas': {}, 'subtemas': {}}
+    if not len(ids):
+        return parciais
+
+    contagens_temas = temas.sum(axis=0)
+    respondidos = niveis != AUSENTE
+    contagens_subtemas = respondidos.sum(axis=0)
+    pontos_subtemas = np.where(respondidos, niveis, 0).sum(axis=0, dtype=np.int64)
+    if distribuicao:
+        por_nivel = np.stack([(niveis == nivel).sum(axis=0) for nivel in range(NIVEL_DESCONFORTO_MAXIMO + 1)], axis=1)
+
+    for posicao in np.flatnonzero(contagens_temas).tolist():
+        tema_id = catalogo.ordem_temas[posicao]
+        parciais['temas'][tema_id] = {
+            'contagem': int(contagens_temas[posicao]),
+            'ordem': ordem_temas[tema_id]
+        }
+    for posicao in np.flatnonzero(contagens_subtemas).tolist():
+        subtema_id = catalogo.ordem_subtemas[posicao]
+        parciais['subtemas'][subtema_id] = {
+            'total_pontos': int(pontos_subtemas[posicao]),
+            'contagem': int(contagens_subtemas[posicao]),
+            'ordem': ordem_subtemas[subtema_id]
+        }
+        if distribuicao:
+            parciais['subtemas'][subtema_id]['distribuicao'] = por_nivel[posicao].tolist()
+    return parciais
+
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, TarefaRelatorio
+from relatorio import executar_relatorio
+from leitura import ativar_leitura_roteada
+
+# Tarefas assíncronas do relatório, executadas em um pool local de threads ou de processos
+# (TAREFAS_EXECUTOR), sem broker externo. O estado e o resultado ficam na tabela tarefa_relatorio:
+# qualquer processo da aplicação consulta a tarefa, e pedidos iguais em andamento viram uma só tarefa.
+
+EXECUTORES_TAREFAS = ('thread', 'processo')
+ESTADOS_EM_ANDAMENTO = ('pendente', 'executando')
+
+_aplicacao = None
+_executor = None
+_trava_executor = threading.Lock()
+
+
+# Registra a aplicação usada pelos trabalhadores (nos processos filhos, importada do módulo app)
+def configurar_tarefas(app):
+    global _aplicacao
+    _aplicacao = app
+
+
+def _obter_aplicacao():
+    global _aplicacao
+    if _aplicacao is None:
+        from app import app
+        _aplicacao = app
+    return _aplicacao
+
+
+# Processos novos não reaproveitam as conexões abertas herdadas do processo pai
+def _iniciar_processo():
+    with _obter_aplicacao().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def _obter_executor():
+    global _executor
+    with _trava_executor:
+        if _executor is None:
+            tipo = current_app.config['TAREFAS_EXECUTOR']
+            if tipo not in EXECUTORES_TAREFAS:
+                raise ValueError(f"TAREFAS_EXECUTOR deve ser {', '.join(EXECUTORES_TAREFAS)}.")
+            trabalhadores = current_app.config['TAREFAS_TRABALHADORES']
+            if tipo == 'processo':
+                _executor = ProcessPoolExecutor(trabalhadores, initializer=_iniciar_processo)
+            else:
+                _executor = ThreadPoolExecutor(trabalhadores, thread_name_prefix='tarefa-relatorio')
+    return _executor
+
+
+# Hash dos parâmetros normalizados do relatório
+def calcular_chave_tarefa(parametros):
+    conteudo = json.dumps(parametros, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+# Remove tarefas com resultado vencido e tarefas em andamento que passaram do prazo
+# (ex.: o processo que as executava foi encerrado)
+def limpar_tarefas_expiradas():
+    return db.session.execute(delete(TarefaRelatorio).where(TarefaRelatorio.expira_em <= datetime.utcnow())).rowcount
+
+
+def _tarefa_em_andamento(chave):
+    return db.session.execute(
+        select(TarefaRelatorio).where(TarefaRelatorio.chave == chave,
+                                      TarefaRelatorio.estado.in_(ESTADOS_EM_ANDAMENTO))
+    ).scalar_one_or_none()
+
+
+# Cria a tarefa para os parâmetros (já lidos por ler_parametros_relatorio) e a envia ao pool.
+# Se uma tarefa igual ainda está em andamento, ela é reaproveitada. Retorna (tarefa, coalescida).
+def enviar_tarefa(parametros):
+    limpar_tarefas_expiradas()
+    db.session.commit()
+
+    chave = calcular_chave_tarefa(parametros)
+    tarefa = _tarefa_em_andamento(chave)
+    if tarefa is not None:
+        return tarefa, True
+
+    agora = datetime.utcnow()
+    tarefa = TarefaRelatorio(
+        id=uuid.uuid4().hex, chave=chave, parametros=json.dumps(parametros, ensure_ascii=False),
+        estado='pendente', criada_em=agora,
+        expira_em=agora + timedelta(seconds=current_app.config['TAREFAS_TEMPO_MAXIMO_SEGUNDOS'])
+    )
+    db.session.add(tarefa)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outro pedido igual criou a tarefa ao mesmo tempo
+        db.session.rollback()
+        tarefa = _tarefa_em_andamento(chave)
+        if tarefa is None:
+            raise
+        return tarefa, True
+
+    _obter_executor().submit(executar_tarefa, tarefa.id)
+    return tarefa, False
+
+
+# Executa a tarefa no trabalhador (thread ou processo do pool) e grava o resultado
+def executar_tarefa(tarefa_id):
+    with _obter_aplicacao().app_context():
+        # Só um trabalhador assume a tarefa
+        assumida = db.session.execute(
+            update(TarefaRelatorio)
+            .where(TarefaRelatorio.id == tarefa_id, TarefaRelatorio.estado == 'pendente')
+            .values(estado='executando')
+        ).rowcount
+        db.session.commit()
+        if not assumida:
+            return
+
+        valores = {}
+        try:
+            tarefa = db.session.get(TarefaRelatorio, tarefa_id)
+            # O relatório lê do bind 'leitura' (LEITURA_MODO); a tarefa continua no banco principal
+            ativar_leitura_roteada()
+            relatorio = executar_relatorio(json.loads(tarefa.parametros))
+            valores = {'estado': 'concluida', 'resultado': current_app.json.response(relatorio).get_data()}
+        except Exception as erro:
+            db.session.rollback()
+            current_app.logger.exception('Falha na tarefa de relatório %s', tarefa_id)
+            valores = {'estado': 'erro', 'erro': str(erro) or erro.__class__.__name__}
+        finally:
+            agora = datetime.utcnow()
+            valores.setdefault('estado', 'erro')
+            db.session.execute(
+                update(TarefaRelatorio).where(TarefaRelatorio.id == tarefa_id).values(
+                    concluida_em=agora,
+                    expira_em=agora + timedelta(seconds=current_app.config['TAREFAS_TTL_SEGUNDOS']),
+                    **valores
+                )
+            )
+            db.session.commit()
+            db.session.remove()
+
+
+# Busca a tarefa ainda válida (ou None)
+def obter_tarefa(tarefa_id):
+    tarefa = db.session.get(TarefaRelatorio, tarefa_id)
+    if tarefa is None or tarefa.expira_em <= datetime.utcnow():
+        return None
+    return tarefa
+
+
+# Estado da tarefa para a resposta da API
+def descrever_tarefa(tarefa):
+    descricao = {
+        'id': tarefa.id,
+        'estado': tarefa.estado,
+        'parametros': json.loads(tarefa.parametros),
+        'criada_em': tarefa.criada_em.isoformat(),
+        'concluida_em': tarefa.concluida_em.isoformat() if tarefa.concluida_em else None,
+        'expira_em': tarefa.expira_em.isoformat()
+    }
+    if tarefa.estado == 'erro':
+        descricao['erro'] = tarefa.erro
+    return descricao
@@ -0,0 +1,29 @@
+import os
+
+# Funções usadas pelos cenários (executados em um interpretador novo, ver conftest.executar)
+
+ESQUEMA_ORIGINAL = os.path.join(os.path.dirname(__file__), 'dados', 'esquema_original.sql')
+
+
+def diretorio():
+    return os.environ['TESTE_DIRETORIO']
+
+
+# Importa a aplicação com a configuração do ambiente e inicializa o banco; retorna (app, cliente de teste)
+def iniciar():
+    import app as modulo
+    modulo.inicializar_db()
+    return modulo.app, modulo.app.test_client()
+
+
+# Avaliações sintéticas reprodutíveis no formato do /cadastrar_avaliacao
+def gerar(app, quantidade, empresas=3, departamentos=3, semente=1):
+    from benchmarks.gerador import gerar_avaliacoes
+    with app.app_context():
+        return list(gerar_avaliacoes(quantidade, empresas, departamentos, semente=semente))
+
+
+def cadastrar(cliente, avaliacoes):
+    for avaliacao in avaliacoes:
+        resposta = cliente.post('/cadastrar_avaliacao', json=avaliacao)
+        assert resposta.status_code == 201, resposta.get_json()
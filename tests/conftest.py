@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# A configuração é lida do ambiente na importação de config.py/app.py, e vários módulos guardam estado do
+# processo (catálogo, caches, engines das partições, fila). Cada cenário roda em um interpretador novo, com o
+# banco em tmp_path e as variáveis de ambiente do cenário; os asserts do cenário fazem o teste falhar.
+# O cenário é uma função do módulo de teste (sem o prefixo test_) que importa a aplicação dentro dela e
+# encontra o diretório do teste em TESTE_DIRETORIO; retorna a saída padrão do cenário.
+@pytest.fixture
+def executar(tmp_path):
+    def executar(cenario, **ambiente):
+        variaveis = {
+            **os.environ,
+            'DATABASE_URL': f'sqlite:///{tmp_path}/teste.db',
+            'TESTE_DIRETORIO': str(tmp_path),
+            'LOG_NIVEL': 'WARNING',
+            'IDEMPOTENCIA_TTL_CONTEUDO_SEGUNDOS': '0',
+            **ambiente,
+        }
+        resultado = subprocess.run(
+            [sys.executable, '-c', f'import {cenario.__module__} as m; m.{cenario.__name__}()'],
+            cwd=RAIZ, env=variaveis, capture_output=True, text=True, timeout=600
+        )
+        if resultado.returncode != 0:
+            pytest.fail(resultado.stderr[-5000:], pytrace=False)
+        return resultado.stdout
+    return executar
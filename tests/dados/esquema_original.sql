@@ -0,0 +1,58 @@
+-- Esquema criado por db.create_all na primeira versão da API (sem índices, agregados nem versões),
+-- usado para testar a atualização de bancos antigos
+CREATE TABLE macro_tema (
+	id INTEGER NOT NULL, 
+	codigo VARCHAR(5) NOT NULL, 
+	titulo VARCHAR(100) NOT NULL, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE avaliacao (
+	id INTEGER NOT NULL, 
+	empresa VARCHAR(100) NOT NULL, 
+	departamento VARCHAR(100) NOT NULL, 
+	funcao VARCHAR(100), 
+	data_avaliacao DATETIME, 
+	PRIMARY KEY (id)
+);
+CREATE TABLE tema (
+	id INTEGER NOT NULL, 
+	numero INTEGER NOT NULL, 
+	descricao TEXT NOT NULL, 
+	macro_tema_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(macro_tema_id) REFERENCES macro_tema (id)
+);
+CREATE TABLE subtema (
+	id INTEGER NOT NULL, 
+	letra VARCHAR(5) NOT NULL, 
+	descricao TEXT NOT NULL, 
+	tema_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(tema_id) REFERENCES tema (id)
+);
+CREATE TABLE resposta_primeiro_nivel (
+	id INTEGER NOT NULL, 
+	avaliacao_id INTEGER NOT NULL, 
+	tema_id INTEGER NOT NULL, 
+	selecionado BOOLEAN, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(avaliacao_id) REFERENCES avaliacao (id), 
+	FOREIGN KEY(tema_id) REFERENCES tema (id)
+);
+CREATE TABLE recomendacao (
+	id INTEGER NOT NULL, 
+	tema_id INTEGER NOT NULL, 
+	faixa_nivel INTEGER NOT NULL, 
+	descricao TEXT NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(tema_id) REFERENCES tema (id)
+);
+CREATE TABLE resposta_segundo_nivel (
+	id INTEGER NOT NULL, 
+	avaliacao_id INTEGER NOT NULL, 
+	subtema_id INTEGER NOT NULL, 
+	nivel_desconforto INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(avaliacao_id) REFERENCES avaliacao (id), 
+	FOREIGN KEY(subtema_id) REFERENCES subtema (id)
+);
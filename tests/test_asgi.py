@@ -0,0 +1,119 @@
+import asyncio
+import json
+import pytest
+from tests.comum import gerar, iniciar
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+
+# Requisição HTTP à aplicação ASGI, com o corpo entregue em pedaços; retorna (status, cabeçalhos, corpo)
+async def _requisitar(aplicacao, metodo, caminho, corpo=b'', cabecalhos=(), tamanho_pedaco=1000):
+    caminho, _, consulta = caminho.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': metodo, 'scheme': 'http',
+        'path': caminho, 'root_path': '', 'query_string': consulta.encode('latin-1'),
+        'headers': [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+    }
+    pedacos = [corpo[inicio:inicio + tamanho_pedaco] for inicio in range(0, len(corpo), tamanho_pedaco)] or [b'']
+    mensagens = [
+        {'type': 'http.request', 'body': pedaco, 'more_body': posicao < len(pedacos) - 1}
+        for posicao, pedaco in enumerate(pedacos)
+    ]
+    enviadas = []
+
+    async def receive():
+        if mensagens:
+            return mensagens.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    await aplicacao(scope, receive, send)
+    inicio = enviadas[0]
+    assert inicio['type'] == 'http.response.start'
+    assert all(mensagem.get('more_body') for mensagem in enviadas[1:-1]) and not enviadas[-1].get('more_body')
+    cabecalhos = {nome.decode('latin-1'): valor.decode('latin-1') for nome, valor in inicio['headers']}
+    return inicio['status'], cabecalhos, b''.join(mensagem.get('body', b'') for mensagem in enviadas[1:])
+
+
+# Inicia o ciclo de vida (lifespan) da aplicação; retorna a função que o encerra
+async def _iniciar_ciclo_de_vida(aplicacao):
+    mensagens = asyncio.Queue()
+    respostas = asyncio.Queue()
+    tarefa = asyncio.create_task(
+        aplicacao({'type': 'lifespan', 'asgi': {'version': '3.0'}}, mensagens.get, respostas.put)
+    )
+    await mensagens.put({'type': 'lifespan.startup'})
+    assert (await respostas.get())['type'] == 'lifespan.startup.complete'
+
+    async def encerrar():
+        await mensagens.put({'type': 'lifespan.shutdown'})
+        assert (await respostas.get())['type'] == 'lifespan.shutdown.complete'
+        await tarefa
+    return encerrar
+
+
+# As rotas servidas no laço de eventos e as delegadas à aplicação WSGI respondem como o servidor Flask
+def cenario_mesmo_contrato():
+    from asgi import aplicacao
+    app, cliente = iniciar()
+    avaliacoes = gerar(app, 12)
+    json_ = [('Content-Type', 'application/json')]
+
+    def flask(metodo, caminho, corpo=b'', cabecalhos=()):
+        resposta = cliente.open(caminho, method=metodo, data=corpo, headers=list(cabecalhos))
+        return resposta.status_code, resposta.headers, resposta.get_data()
+
+    async def comparar():
+        encerrar = await _iniciar_ciclo_de_vida(aplicacao)
+
+        async def asgi(metodo, caminho, corpo=b'', cabecalhos=()):
+            return await _requisitar(aplicacao, metodo, caminho, corpo, cabecalhos)
+
+        # Questionário: mesmo corpo e ETag, 304 com If-None-Match
+        status, cabecalhos, corpo = await asgi('GET', '/obter_questionario')
+        esperado = flask('GET', '/obter_questionario')
+        assert (status, cabecalhos['etag'], corpo) == (esperado[0], esperado[1]['ETag'], esperado[2])
+        assert (await asgi('GET', '/obter_questionario', cabecalhos=[('If-None-Match', cabecalhos['etag'])]))[0] == 304
+
+        # Cadastros válidos, com selecionado legado, repetido por Idempotency-Key e inválidos
+        campos = set(json.loads(flask('POST', '/cadastrar_avaliacao', json.dumps(avaliacoes[6]).encode(), json_)[2]))
+        for avaliacao in avaliacoes[:6]:
+            status, _, corpo = await asgi('POST', '/cadastrar_avaliacao', json.dumps(avaliacao).encode(), json_)
+            assert status == 201 and set(json.loads(corpo)) == campos
+        legada = {**avaliacoes[7], 'respostas_nivel1': [
+            {**resposta, 'selecionado': int(resposta['selecionado'])} for resposta in avaliacoes[7]['respostas_nivel1']
+        ]}
+        assert (await asgi('POST', '/cadastrar_avaliacao', json.dumps(legada).encode(), json_))[0] == 201
+        chave = [*json_, ('Idempotency-Key', 'asgi-1')]
+        primeira = await asgi('POST', '/cadastrar_avaliacao', json.dumps(avaliacoes[8]).encode(), chave)
+        repetida = await asgi('POST', '/cadastrar_avaliacao', json.dumps(avaliacoes[8]).encode(), chave)
+        pelo_flask = flask('POST', '/cadastrar_avaliacao', json.dumps(avaliacoes[8]).encode(), chave)
+        assert json.loads(primeira[2])['id'] == json.loads(repetida[2])['id'] == json.loads(pelo_flask[2])['id']
+        assert (repetida[0], json.loads(repetida[2])) == (pelo_flask[0], json.loads(pelo_flask[2]))
+        for invalido in (b'{"empresa": "E"}', b'{xx', json.dumps({**avaliacoes[9], 'respostas_nivel1': 'x'}).encode()):
+            status, _, corpo = await asgi('POST', '/cadastrar_avaliacao', invalido, json_)
+            esperado = flask('POST', '/cadastrar_avaliacao', invalido, json_)
+            assert (status, corpo) == (esperado[0], esperado[2])
+
+        # Rotas delegadas: lote com o corpo em vários pedaços, relatório, exportação em fluxo e rota inexistente
+        lote = '\n'.join(json.dumps(avaliacao) for avaliacao in avaliacoes[9:]).encode()
+        status, _, corpo = await asgi('POST', '/cadastrar_avaliacoes_lote', lote, [('Content-Type', 'application/x-ndjson')])
+        assert status == 200 and json.loads(corpo)['inseridas'] == 3
+        for caminho in ('/gerar_relatorio?agrupar_por=empresa', '/exportar_avaliacoes?formato=ndjson',
+                        '/listar_avaliacoes?limite=5', '/rota_inexistente'):
+            status, cabecalhos, corpo = await asgi('GET', caminho)
+            esperado = flask('GET', caminho)
+            assert status == esperado[0] and corpo == esperado[2], caminho
+            assert cabecalhos.get('content-type') == esperado[1].get('Content-Type'), caminho
+
+        await encerrar()
+
+    asyncio.run(comparar())
+
+
+def test_mesmo_contrato_do_flask(executar):
+    executar(cenario_mesmo_contrato, RELATORIO_CACHE_TAMANHO='0')
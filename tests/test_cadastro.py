@@ -0,0 +1,45 @@
+import json
+import pytest
+from tests.comum import iniciar
+
+
+# Formatos de 'selecionado' e respostas repetidas que as primeiras versões da API gravavam sem erro
+def cenario_respostas_legadas():
+    from catalogo import obter_catalogo
+    app, cliente = iniciar()
+    with app.app_context():
+        catalogo = obter_catalogo()
+    temas = catalogo.ordem_temas[:5]
+    subtema = catalogo.ordem_subtemas[0]
+    avaliacao = {
+        'empresa': 'E', 'departamento': 'D', 'funcao': 'F',
+        'respostas_nivel1': [
+            {'tema_id': temas[0], 'selecionado': 1},
+            {'tema_id': temas[1], 'selecionado': 'true'},
+            {'tema_id': temas[2], 'selecionado': 0},
+            {'tema_id': temas[3], 'selecionado': None},
+            {'tema_id': temas[4], 'selecionado': True},
+            {'tema_id': temas[4], 'selecionado': False},
+        ],
+        'respostas_nivel2': [
+            {'subtema_id': subtema, 'nivel_desconforto': 3},
+            {'subtema_id': subtema, 'nivel_desconforto': 1},
+        ]
+    }
+    resposta = cliente.post('/cadastrar_avaliacao', json=avaliacao)
+    assert resposta.status_code == 201, resposta.get_json()
+
+    linha = json.loads(cliente.get('/exportar_avaliacoes?formato=ndjson').get_data(as_text=True))
+    selecionados = [linha[f"tema_{catalogo.temas[tema_id]['numero']}"] for tema_id in temas]
+    assert selecionados == [1, 1, 0, 0, 1]
+    dados_subtema = catalogo.subtemas[subtema]
+    assert linha[f"subtema_{catalogo.temas[dados_subtema['tema_id']]['numero']}{dados_subtema['letra']}"] == 3
+
+    for invalido in ('talvez', 2, 1.0, []):
+        avaliacao['respostas_nivel1'] = [{'tema_id': temas[0], 'selecionado': invalido}]
+        assert cliente.post('/cadastrar_avaliacao', json=avaliacao).status_code == 400
+
+
+@pytest.mark.parametrize('armazenamento', ['linhas', 'compacto'])
+def test_respostas_legadas(executar, armazenamento):
+    executar(cenario_respostas_legadas, ARMAZENAMENTO_RESPOSTAS=armazenamento)
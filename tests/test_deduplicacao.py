@@ -0,0 +1,65 @@
+from tests.comum import gerar, iniciar
+
+CONSULTAS_AGREGADOS = (
+    'SELECT empresa, departamento, total_avaliacoes FROM agregado_departamento',
+    'SELECT empresa, departamento, tema_id, contagem FROM agregado_tema',
+    'SELECT empresa, departamento, subtema_id, total_pontos, contagem FROM agregado_subtema',
+)
+
+
+def _agregados():
+    from models import db
+    return [sorted(map(tuple, db.session.execute(db.text(consulta)).all())) for consulta in CONSULTAS_AGREGADOS]
+
+
+def _ids():
+    from models import db, Avaliacao
+    return set(db.session.execute(db.select(Avaliacao.id)).scalars())
+
+
+# Cada avaliação é enviada de 2 a 4 vezes seguidas, alternando o formato de armazenamento;
+# a limpeza (por empresa e depois geral) deve manter só a última cópia de cada uma
+def cenario_limpeza():
+    app, cliente = iniciar()
+    copias = {}
+    for posicao, avaliacao in enumerate(gerar(app, 30)):
+        app.config['ARMAZENAMENTO_RESPOSTAS'] = 'compacto' if posicao % 2 else 'linhas'
+        for _ in range(2 + posicao % 3):
+            resposta = cliente.post('/cadastrar_avaliacao', json=avaliacao)
+            assert resposta.status_code == 201
+            copias.setdefault(posicao, []).append((avaliacao['empresa'], resposta.get_json()['id']))
+    with app.app_context():
+        todas = _ids()
+
+    simulacao = cliente.delete('/limpar_avaliacoes_duplicadas?simular=true').get_json()
+    assert simulacao['grupos_duplicados'] == 30
+    assert simulacao['avaliacoes_duplicadas'] == sum(len(ids) - 1 for ids in copias.values())
+    assert simulacao['avaliacoes_removidas'] == 0
+
+    empresa = copias[0][0][0]
+    removidas = {avaliacao_id for ids in copias.values() for dona, avaliacao_id in ids[:-1] if dona == empresa}
+    resultado = cliente.delete(f'/limpar_avaliacoes_duplicadas?empresa={empresa}&tamanho_bloco=7').get_json()
+    assert resultado['avaliacoes_removidas'] == len(removidas)
+    with app.app_context():
+        assert _ids() == todas - removidas
+
+    cliente.delete('/limpar_avaliacoes_duplicadas?tamanho_bloco=7')
+    with app.app_context():
+        assert _ids() == {ids[-1][1] for ids in copias.values()}
+        agregados = _agregados()
+        from agregados import reconstruir_agregados
+        reconstruir_agregados()
+        assert _agregados() == agregados
+
+    relatorios = set()
+    for motor in ('agregados', 'sql'):
+        app.config['RELATORIO_MOTOR'] = motor
+        relatorio = cliente.get('/gerar_relatorio')
+        assert relatorio.get_json()['total_avaliacoes'] == 30
+        relatorios.add(relatorio.get_data())
+    assert len(relatorios) == 1
+    assert cliente.delete('/limpar_avaliacoes_duplicadas').get_json()['avaliacoes_removidas'] == 0
+
+
+def test_limpeza_mantem_a_copia_mais_recente(executar):
+    executar(cenario_limpeza, RELATORIO_CACHE_TAMANHO='0')
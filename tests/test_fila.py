@@ -0,0 +1,123 @@
+import glob
+import json
+import os
+import time
+import pytest
+from tests.comum import diretorio, iniciar, gerar
+
+pytest.importorskip('fcntl')
+
+
+# Importa a aplicação com CADASTRO_MODO=fila sem a thread de ingestão: os cadastros ficam só na fila
+def _iniciar_sem_ingestao():
+    import fila_cadastros
+    fila_cadastros._ingerir_continuamente = lambda app, fila: None
+    return iniciar()
+
+
+def _salvar(nome, dados):
+    with open(os.path.join(diretorio(), nome), 'w') as arquivo:
+        json.dump(dados, arquivo)
+
+
+def _carregar(nome):
+    with open(os.path.join(diretorio(), nome)) as arquivo:
+        return json.load(arquivo)
+
+
+# Primeiro processo: enfileira as avaliações e termina sem gravá-las no banco
+def cenario_enfileirar():
+    app, cliente = _iniciar_sem_ingestao()
+    recibos = []
+    for avaliacao in gerar(app, 12):
+        resposta = cliente.post('/cadastrar_avaliacao', json=avaliacao)
+        assert resposta.status_code == 202, resposta.get_json()
+        recibos.append(resposta.get_json()['recibo'])
+    _salvar('recibos.json', recibos)
+
+
+# Outro processo, mais tarde: drena a fila; cada avaliação fica com a data do recebimento
+def cenario_drenar_com_data_do_recebimento():
+    from datetime import datetime
+    from models import db, Avaliacao
+    from fila_cadastros import drenar_fila
+    app, cliente = iniciar()
+    recibos = _carregar('recibos.json')
+    inicio_da_drenagem = datetime.utcnow()
+    with app.app_context():
+        assert drenar_fila()['gravados'] == len(recibos)
+        datas = dict(db.session.execute(db.select(Avaliacao.id, Avaliacao.data_avaliacao)).all())
+    for recibo in recibos:
+        estado = cliente.get(f'/recibos_cadastro/{recibo}').get_json()
+        assert estado['estado'] == 'gravada', estado
+        recebido_em = datetime.fromisoformat(estado['recebido_em'])
+        assert datas[estado['id']] == recebido_em, (recibo, datas[estado['id']], recebido_em)
+        assert recebido_em < inicio_da_drenagem
+
+
+@pytest.mark.parametrize('armazenamento', ['linhas', 'compacto'])
+def test_data_da_avaliacao_e_a_do_recebimento(executar, armazenamento):
+    executar(cenario_enfileirar, CADASTRO_MODO='fila', ARMAZENAMENTO_RESPOSTAS=armazenamento)
+    time.sleep(1)
+    executar(cenario_drenar_com_data_do_recebimento, ARMAZENAMENTO_RESPOSTAS=armazenamento)
+
+
+def _segmentos():
+    return sorted(glob.glob(os.path.join(diretorio(), 'fila_cadastros', '*.fila')))
+
+
+# Processo que cai durante os cadastros: 30 avaliações na fila (uma repetida com a mesma Idempotency-Key)
+# e uma linha escrita pela metade no fim do segmento
+def cenario_enfileirar_e_cair():
+    app, cliente = _iniciar_sem_ingestao()
+    avaliacoes = gerar(app, 29)
+    recibos = []
+    for posicao in [*range(len(avaliacoes)), 3]:
+        resposta = cliente.post(
+            '/cadastrar_avaliacao', json=avaliacoes[posicao], headers={'Idempotency-Key': f'chave-{posicao}'}
+        )
+        assert resposta.status_code == 202, resposta.get_json()
+        recibos.append(resposta.get_json()['recibo'])
+    _salvar('recibos.json', recibos)
+    [segmento] = _segmentos()
+    with open(segmento, 'ab') as arquivo:
+        arquivo.write(b'0badc0de {"recebido_em": "2024-')
+    os._exit(0)
+
+
+# Outro processo assume o segmento e cai depois de gravar dois blocos, antes de a posição chegar ao disco
+def cenario_ingerir_parte_e_cair():
+    from fila_cadastros import _obter_fila, _caminho_posicao
+    app, _ = _iniciar_sem_ingestao()
+    with app.app_context():
+        fila = _obter_fila()
+        assert fila.ingerir() and fila.ingerir()
+    assert fila.contadores['gravados'] == 14
+    [segmento] = _segmentos()
+    os.remove(_caminho_posicao(segmento))
+    os._exit(0)
+
+
+# Um terceiro processo grava o restante: cada avaliação uma única vez, a repetida como duplicada
+def cenario_recuperar():
+    from models import db, Avaliacao, AgregadoDepartamento
+    from fila_cadastros import drenar_fila
+    app, cliente = iniciar()
+    recibos = _carregar('recibos.json')
+    with app.app_context():
+        assert drenar_fila() == {'gravados': 15, 'duplicados': 1, 'erros': 0}
+        ids = set(db.session.execute(db.select(Avaliacao.id)).scalars())
+        assert db.session.execute(db.select(db.func.sum(AgregadoDepartamento.total_avaliacoes))).scalar() == 29
+    assert _segmentos() == [] and len(ids) == 29
+    estados = [cliente.get(f'/recibos_cadastro/{recibo}').get_json() for recibo in recibos]
+    assert [estado['estado'] for estado in estados] == ['gravada'] * 29 + ['duplicada']
+    assert {estado['id'] for estado in estados[:29]} == ids
+    assert estados[29]['id'] == estados[3]['id']
+
+
+@pytest.mark.parametrize('armazenamento', ['linhas', 'compacto'])
+def test_recuperacao_depois_de_quedas(executar, armazenamento):
+    ambiente = {'CADASTRO_MODO': 'fila', 'ARMAZENAMENTO_RESPOSTAS': armazenamento, 'FILA_TAMANHO_BLOCO': '7'}
+    executar(cenario_enfileirar_e_cair, **ambiente)
+    executar(cenario_ingerir_parte_e_cair, **ambiente)
+    executar(cenario_recuperar, **ambiente)
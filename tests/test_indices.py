@@ -0,0 +1,41 @@
+import os
+import sqlite3
+from tests.comum import ESQUEMA_ORIGINAL, diretorio, iniciar
+
+
+def _verificar_planos(app):
+    from migracoes import verificar_planos
+    with app.app_context():
+        assert verificar_planos() == []
+
+
+def cenario_banco_novo():
+    app, _ = iniciar()
+    _verificar_planos(app)
+
+
+# Banco com o esquema original e dados antigos: respostas repetidas e avaliação sem data
+def cenario_banco_original():
+    with sqlite3.connect(os.path.join(diretorio(), 'teste.db')) as conexao:
+        with open(ESQUEMA_ORIGINAL) as arquivo:
+            conexao.executescript(arquivo.read())
+        conexao.executemany(
+            'INSERT INTO avaliacao (id, empresa, departamento, funcao, data_avaliacao) VALUES (?, ?, ?, ?, ?)',
+            [(1, 'E', 'D', 'F', '2024-01-02 10:00:00.000000'), (2, 'E', 'D', None, None)]
+        )
+        conexao.executemany(
+            'INSERT INTO resposta_primeiro_nivel (avaliacao_id, tema_id, selecionado) VALUES (?, ?, ?)',
+            [(1, 1, 1), (1, 1, 1), (2, 2, 0)]
+        )
+    app, cliente = iniciar()
+    _verificar_planos(app)
+    assert cliente.get('/gerar_relatorio').get_json()['total_avaliacoes'] == 2
+    assert [avaliacao['id'] for avaliacao in cliente.get('/listar_avaliacoes').get_json()['avaliacoes']] == [1, 2]
+
+
+def test_planos_banco_novo(executar):
+    executar(cenario_banco_novo)
+
+
+def test_planos_banco_atualizado(executar):
+    executar(cenario_banco_original)
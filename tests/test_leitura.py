@@ -0,0 +1,64 @@
+import pytest
+from tests.comum import iniciar, gerar, cadastrar
+
+MOTORES = ('agregados', 'sql', 'numpy')
+
+CONSULTAS = ('/gerar_relatorio', '/gerar_relatorio?distribuicao=true', '/coocorrencia_temas?subtemas=true')
+
+
+def _respostas(app, cliente):
+    respostas = {}
+    for motor in MOTORES:
+        app.config['RELATORIO_MOTOR'] = motor
+        for consulta in CONSULTAS:
+            resposta = cliente.get(consulta)
+            assert resposta.status_code == 200, (motor, consulta, resposta.get_json())
+            assert 'X-Leitura-Defasagem-Segundos' in resposta.headers
+            respostas[motor, consulta] = resposta.get_json()
+    return respostas
+
+
+# Com LEITURA_MODO=copia, os três motores (inclusive as leituras direto no cursor do motor numpy) respondem
+# pela cópia: as avaliações gravadas depois dela não aparecem em nenhuma rota
+def cenario_copia_defasada():
+    app, cliente = iniciar()
+    avaliacoes = gerar(app, 8)
+    cadastrar(cliente, avaliacoes[:3])
+    with app.app_context():
+        from leitura import atualizar_copia
+        atualizar_copia()
+    antes = _respostas(app, cliente)
+    cadastrar(cliente, avaliacoes[3:])
+    depois = _respostas(app, cliente)
+    for chave, resposta in depois.items():
+        assert resposta == antes[chave], chave
+    for motor in MOTORES:
+        assert antes[motor, '/gerar_relatorio']['total_avaliacoes'] == 3, motor
+        assert antes[motor, '/coocorrencia_temas?subtemas=true']['total_avaliacoes'] == 3, motor
+    assert antes['agregados', '/gerar_relatorio'] == antes['numpy', '/gerar_relatorio']
+
+
+def test_motores_leem_a_copia(executar):
+    pytest.importorskip('numpy')
+    executar(cenario_copia_defasada, LEITURA_MODO='copia', LEITURA_COPIA_INTERVALO_SEGUNDOS='3600',
+             RELATORIO_CACHE_TAMANHO='0')
+
+
+# Com LEITURA_MODO=somente_leitura, as consultas das rotas roteadas (inclusive as do cursor do motor numpy)
+# usam só o pool de leitura
+def cenario_pool_somente_leitura():
+    from sqlalchemy import event
+    from models import db
+    app, cliente = iniciar()
+    cadastrar(cliente, gerar(app, 5))
+    usos = {'principal': 0, 'leitura': 0}
+    with app.app_context():
+        for nome, engine in (('principal', db.engines[None]), ('leitura', db.engines['leitura'])):
+            event.listen(engine, 'checkout', lambda *_, nome=nome: usos.__setitem__(nome, usos[nome] + 1))
+    _respostas(app, cliente)
+    assert usos['principal'] == 0 and usos['leitura'] > 0, usos
+
+
+def test_motores_usam_o_pool_de_leitura(executar):
+    pytest.importorskip('numpy')
+    executar(cenario_pool_somente_leitura, LEITURA_MODO='somente_leitura', RELATORIO_CACHE_TAMANHO='0')
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+from datetime import datetime
+from urllib.parse import urlencode
+from tests.comum import ESQUEMA_ORIGINAL, diretorio, gerar, iniciar
+
+# Poucas datas distintas, para que avaliações com a mesma data caiam nas bordas das páginas
+DATAS = [datetime(2024, 1, 1, 8), datetime(2024, 3, 5, 12, 30), datetime(2024, 3, 5, 12, 30, 0, 500), datetime(2024, 7, 9)]
+FILTROS = (
+    {},
+    {'empresa': 'Empresa 1'},
+    {'empresa': 'Empresa 2', 'departamento': 'Departamento 1'},
+    {'funcao': 'Analista'},
+    {'desde': '2024-03-05T12:30:00', 'ate': '2024-07-01'},
+)
+
+
+def _percorrer(cliente, filtros, limite, durante=None):
+    ids = []
+    avaliacoes = {}
+    cursor = None
+    while True:
+        parametros = {**filtros, 'limite': limite, 'incluir_respostas': 'true', **({'cursor': cursor} if cursor else {})}
+        pagina = cliente.get('/listar_avaliacoes?' + urlencode(parametros)).get_json()
+        assert len(pagina['avaliacoes']) <= limite
+        for avaliacao in pagina['avaliacoes']:
+            ids.append(avaliacao['id'])
+            avaliacoes[avaliacao['id']] = avaliacao
+        cursor = pagina['proximo_cursor']
+        if cursor is None:
+            return ids, avaliacoes
+        if durante:
+            durante()
+
+
+def _esperados(dados, filtros):
+    desde = datetime.fromisoformat(filtros['desde']) if 'desde' in filtros else None
+    ate = datetime.fromisoformat(filtros['ate']) if 'ate' in filtros else None
+    selecionados = [
+        (data, avaliacao_id) for avaliacao_id, (avaliacao, data) in dados.items()
+        if all(avaliacao[campo] == filtros[campo] for campo in ('empresa', 'departamento', 'funcao') if campo in filtros)
+        and (desde is None or data >= desde) and (ate is None or data < ate)
+    ]
+    return [avaliacao_id for _, avaliacao_id in sorted(selecionados, reverse=True)]
+
+
+# Percorre todas as páginas com cada filtro e limite: cada avaliação aparece uma única vez, na ordem
+# (data_avaliacao, id) decrescente, mesmo com cadastros novos entre uma página e outra
+def cenario_paginas():
+    from models import db, Avaliacao
+    app, cliente = iniciar()
+    novas = gerar(app, 20, semente=2)
+    dados = {}
+    for posicao, avaliacao in enumerate(gerar(app, 120)):
+        avaliacao['funcao'] = 'Analista' if posicao % 3 else 'Operador'
+        app.config['ARMAZENAMENTO_RESPOSTAS'] = 'compacto' if posicao % 2 else 'linhas'
+        resposta = cliente.post('/cadastrar_avaliacao', json=avaliacao)
+        assert resposta.status_code == 201
+        dados[resposta.get_json()['id']] = (avaliacao, DATAS[posicao * 7 % len(DATAS)])
+    with app.app_context():
+        for avaliacao_id, (_, data) in dados.items():
+            db.session.execute(db.update(Avaliacao).where(Avaliacao.id == avaliacao_id).values(data_avaliacao=data))
+        db.session.commit()
+
+    for filtros in FILTROS:
+        esperados = _esperados(dados, filtros)
+        assert esperados
+        for limite in (1, 7, 50, 500):
+            ids, avaliacoes = _percorrer(cliente, filtros, limite)
+            assert ids == esperados, (filtros, limite)
+
+    # Respostas devolvidas nos dois formatos de armazenamento
+    for avaliacao_id, avaliacao in avaliacoes.items():
+        enviada = dados[avaliacao_id][0]
+        assert ({resposta['tema_id'] for resposta in avaliacao['respostas_nivel1'] if resposta['selecionado']}
+                == {resposta['tema_id'] for resposta in enviada['respostas_nivel1'] if resposta['selecionado']})
+        assert (sorted((resposta['subtema_id'], resposta['nivel_desconforto']) for resposta in avaliacao['respostas_nivel2'])
+                == sorted((resposta['subtema_id'], resposta['nivel_desconforto']) for resposta in enviada['respostas_nivel2']))
+
+    ids, _ = _percorrer(cliente, {}, 9, durante=lambda: cliente.post('/cadastrar_avaliacao', json=novas.pop()))
+    assert ids == _esperados(dados, {})
+
+
+# Banco com o esquema original em que parte das avaliações não tem data (preenchida na atualização do esquema)
+def cenario_paginas_banco_original():
+    with sqlite3.connect(os.path.join(diretorio(), 'teste.db')) as conexao:
+        with open(ESQUEMA_ORIGINAL) as arquivo:
+            conexao.executescript(arquivo.read())
+        conexao.executemany(
+            'INSERT INTO avaliacao (id, empresa, departamento, funcao, data_avaliacao) VALUES (?, ?, ?, ?, ?)',
+            [(avaliacao_id, 'E', 'D', 'F', None if avaliacao_id % 3 else f'2024-01-{avaliacao_id % 5 + 1:02d} 10:00:00.000000')
+             for avaliacao_id in range(1, 41)]
+        )
+    _, cliente = iniciar()
+    for limite in (1, 3, 50):
+        ids, avaliacoes = _percorrer(cliente, {}, limite)
+        assert sorted(ids) == list(range(1, 41))
+        chaves = [(avaliacoes[avaliacao_id]['data_avaliacao'], avaliacao_id) for avaliacao_id in ids]
+        assert chaves == sorted(chaves, reverse=True)
+
+
+def test_paginas_completas(executar):
+    executar(cenario_paginas)
+
+
+def test_paginas_banco_original(executar):
+    executar(cenario_paginas_banco_original)
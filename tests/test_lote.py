@@ -0,0 +1,74 @@
+import json
+import os
+import pytest
+from tests.comum import cadastrar, diretorio, gerar, iniciar
+
+INVALIDAS = {3: {'empresa': '', 'departamento': 'D', 'respostas_nivel1': [], 'respostas_nivel2': []}, 17: [1, 2]}
+
+
+# Avaliações do lote (com acentos, para cortar caracteres de vários bytes entre as leituras) e as inválidas
+def _avaliacoes(app):
+    avaliacoes = gerar(app, 40)
+    for posicao, avaliacao in enumerate(avaliacoes):
+        avaliacao['funcao'] = f'Função {posicao % 4} – operação'
+    for indice, invalida in sorted(INVALIDAS.items()):
+        avaliacoes.insert(indice, invalida)
+    return avaliacoes
+
+
+def _salvar_relatorio(cliente):
+    with open(os.path.join(diretorio(), 'relatorio.json'), 'w') as arquivo:
+        arquivo.write(cliente.get('/gerar_relatorio?agrupar_por=empresa,funcao').get_data(as_text=True))
+
+
+# Lote em NDJSON ou array JSON, lido em pedaços menores que um registro e gravado em blocos de 7 avaliações
+def cenario_lote():
+    import lote
+    lote.TAMANHO_LEITURA = 97
+    formato = os.environ['TESTE_FORMATO']
+    app, cliente = iniciar()
+    avaliacoes = _avaliacoes(app)
+    if formato == 'ndjson':
+        corpo = '\n'.join(json.dumps(avaliacao, ensure_ascii=False) for avaliacao in avaliacoes)
+        corpo = corpo.replace('\n', '\n\n{"empresa": \n', 1)  # linha com JSON inválido no índice 1
+        invalidas = {1, *(indice + 1 for indice in INVALIDAS)}
+    else:
+        corpo = ' [\n' + ',\n'.join(json.dumps(avaliacao, ensure_ascii=False) for avaliacao in avaliacoes) + '\n]\n'
+        invalidas = set(INVALIDAS)
+    total = len(avaliacoes) + (formato == 'ndjson')
+
+    resposta = cliente.post('/cadastrar_avaliacoes_lote?tamanho_bloco=7', data=corpo.encode('utf-8'))
+    assert resposta.status_code == 200
+    resultado = resposta.get_json()
+    assert (resultado['total'], resultado['inseridas'], resultado['erros']) == (total, total - len(invalidas), len(invalidas))
+    assert [item['indice'] for item in resultado['resultados']] == list(range(total))
+    assert {item['indice'] for item in resultado['resultados'] if 'erro' in item} == invalidas
+    ids = [item['id'] for item in resultado['resultados'] if 'id' in item]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    _salvar_relatorio(cliente)
+
+
+# As mesmas avaliações válidas enviadas uma a uma no /cadastrar_avaliacao
+def cenario_individual():
+    app, cliente = iniciar()
+    cadastrar(cliente, [avaliacao for avaliacao in _avaliacoes(app) if isinstance(avaliacao, dict) and avaliacao['empresa']])
+    _salvar_relatorio(cliente)
+
+
+def cenario_array_nao_fechado():
+    _, cliente = iniciar()
+    resultado = cliente.post('/cadastrar_avaliacoes_lote', data=b'[{"empresa": "E"}, ').get_json()
+    assert resultado['total'] == 2 and resultado['inseridas'] == 0
+    assert resultado['resultados'][1]['erro'] == 'Array JSON não foi fechado.'
+
+
+@pytest.mark.parametrize('formato', ['ndjson', 'array'])
+def test_lote_igual_aos_cadastros_individuais(executar, tmp_path, formato):
+    executar(cenario_individual, DATABASE_URL=f'sqlite:///{tmp_path}/individual.db')
+    esperado = (tmp_path / 'relatorio.json').read_text()
+    executar(cenario_lote, TESTE_FORMATO=formato)
+    assert (tmp_path / 'relatorio.json').read_text() == esperado
+
+
+def test_lote_array_nao_fechado(executar):
+    executar(cenario_array_nao_fechado)
@@ -0,0 +1,77 @@
+import json
+import os
+import pytest
+from tests.comum import cadastrar, diretorio, gerar, iniciar
+
+MOTORES = ('agregados', 'sql', 'numpy')
+CONSULTAS = (
+    '/gerar_relatorio',
+    '/gerar_relatorio?empresa=Empresa 1',
+    '/gerar_relatorio?empresa=Empresa 2&departamento=Departamento 1',
+    '/gerar_relatorio?desde=2000-01-01&ate=2100-01-01',
+    '/gerar_relatorio?distribuicao=true',
+    '/gerar_relatorio?agrupar_por=empresa,departamento',
+    '/gerar_relatorio?agrupar_por=departamento&linha_base=true',
+)
+
+
+# Corpo de cada consulta com cada motor; os motores devem produzir bytes idênticos
+def _relatorios(app, cliente):
+    corpos = {}
+    for motor in MOTORES:
+        app.config['RELATORIO_MOTOR'] = motor
+        for consulta in CONSULTAS:
+            resposta = cliente.get(consulta)
+            assert resposta.status_code == 200, (motor, consulta, resposta.get_json())
+            corpos.setdefault(consulta, {})[motor] = resposta.get_data(as_text=True)
+    for consulta, por_motor in corpos.items():
+        assert len(set(por_motor.values())) == 1, (consulta, por_motor)
+    return {consulta: por_motor[MOTORES[0]] for consulta, por_motor in corpos.items()}
+
+
+def _salvar(nome, relatorios):
+    with open(os.path.join(diretorio(), f'{nome}.json'), 'w') as arquivo:
+        json.dump(relatorios, arquivo)
+
+
+# Mesmas avaliações gravadas em linhas, no formato compacto ou metade em cada (ARMAZENAMENTO_RESPOSTAS é lido
+# a cada cadastro); depois, as avaliações são convertidas para o outro formato e os relatórios não mudam
+def cenario_relatorios():
+    from migracoes import converter_armazenamento
+    armazenamento = os.environ['TESTE_ARMAZENAMENTO']
+    app, cliente = iniciar()
+    avaliacoes = gerar(app, 300)
+    metade = len(avaliacoes) // 2
+    app.config['ARMAZENAMENTO_RESPOSTAS'] = 'compacto' if armazenamento == 'compacto' else 'linhas'
+    cadastrar(cliente, avaliacoes[:metade])
+    if armazenamento == 'misto':
+        app.config['ARMAZENAMENTO_RESPOSTAS'] = 'compacto'
+    cadastrar(cliente, avaliacoes[metade:])
+    relatorios = _relatorios(app, cliente)
+    _salvar(armazenamento, relatorios)
+
+    with app.app_context():
+        converter_armazenamento('linhas' if armazenamento == 'compacto' else 'compacto', tamanho_bloco=70)
+    assert _relatorios(app, cliente) == relatorios
+
+
+@pytest.fixture(scope='module')
+def relatorios():
+    return {}
+
+
+@pytest.mark.parametrize('armazenamento', ['linhas', 'compacto', 'misto'])
+def test_relatorios_identicos(executar, tmp_path, relatorios, armazenamento):
+    pytest.importorskip('numpy')
+    executar(cenario_relatorios, TESTE_ARMAZENAMENTO=armazenamento, RELATORIO_CACHE_TAMANHO='0')
+    with open(tmp_path / f'{armazenamento}.json') as arquivo:
+        relatorios[armazenamento] = json.load(arquivo)
+    assert all(outro == relatorios[armazenamento] for outro in relatorios.values())
+
+
+# O sufixo 'Z' é aceito em qualquer versão do Python (fromisoformat só o aceita a partir da 3.11)
+def test_periodo_com_sufixo_z():
+    from relatorio import ler_periodo
+    desde, ate = ler_periodo({'desde': '2024-03-05T12:30:00Z', 'ate': '2024-03-05T09:30:00.500-03:00'})
+    assert (desde.isoformat(), ate.isoformat()) == ('2024-03-05T12:30:00', '2024-03-05T12:30:00.500000')
+    assert ler_periodo({'desde': '2024-03-05', 'ate': '2024-03-05'})[1].isoformat() == '2024-03-06T00:00:00'